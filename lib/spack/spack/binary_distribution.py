@@ -3,29 +3,39 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import gzip
+import io
 import os
 import re
+import socket
 import tarfile
+import zlib
 import shutil
 import platform
 import tempfile
+import time
 import hashlib
 from contextlib import closing
+from multiprocessing.pool import ThreadPool
 
 import json
 
 from six.moves.urllib.error import URLError
 
 import llnl.util.tty as tty
-from llnl.util.filesystem import mkdirp, install_tree, get_filetype
+from llnl.util.filesystem import mkdirp
 
+import spack.caches
 import spack.cmd
 import spack.fetch_strategy as fs
 import spack.util.gpg as gpg_util
 import spack.relocate as relocate
+import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
+import spack.util.web as web_util
 from spack.spec import Spec
 from spack.stage import Stage
+from spack.util.compression import ParallelGzipWriter
 from spack.util.gpg import Gpg
 from spack.util.web import spider, read_from_url
 from spack.util.executable import ProcessError
@@ -33,6 +43,16 @@ from spack.util.executable import ProcessError
 
 _build_cache_relative_path = 'build_cache'
 
+#: Name of the file indexing all the specs of a build cache
+_index_file_name = 'index.json.gz'
+
+#: Version of the format of index files
+_index_version = 1
+
+#: Number of spec.yaml files fetched at the same time from mirrors that
+#: have no index file
+_fetch_jobs = 16
+
 
 class NoOverwriteException(Exception):
     """
@@ -89,6 +109,13 @@ class NewLayoutException(spack.error.SpackError):
     pass
 
 
+class UnsafeTarballException(spack.error.SpackError):
+    """
+    Raised if a tarball member would be extracted outside its directory.
+    """
+    pass
+
+
 def has_gnupg2():
     try:
         gpg_util.Gpg.gpg()('--version', output=os.devnull)
@@ -130,6 +157,7 @@ def write_buildinfo_file(prefix, workdir, rel=False):
     required for the relocation
     """
     text_to_relocate = []
+    text_offsets = {}
     binary_to_relocate = []
     link_to_relocate = []
     blacklist = (".spack", "man")
@@ -158,13 +186,17 @@ def write_buildinfo_file(prefix, workdir, rel=False):
             #  of files potentially needing relocation
             elif relocate.strings_contains_installroot(
                     path_name, spack.store.layout.root):
-                filetype = get_filetype(path_name)
+                filetype = relocate.get_filetype(path_name)
                 if relocate.needs_binary_relocation(filetype, os_id):
                     rel_path_name = os.path.relpath(path_name, prefix)
                     binary_to_relocate.append(rel_path_name)
                 elif relocate.needs_text_relocation(filetype):
                     rel_path_name = os.path.relpath(path_name, prefix)
                     text_to_relocate.append(rel_path_name)
+                    # Lets installs patch text files in place
+                    text_offsets[rel_path_name] = \
+                        relocate.find_installroot_offsets(
+                            path_name, spack.store.layout.root)
 
     # Create buildinfo data and write it to disk
     buildinfo = {}
@@ -173,6 +205,7 @@ def write_buildinfo_file(prefix, workdir, rel=False):
     buildinfo['relative_prefix'] = os.path.relpath(
         prefix, spack.store.layout.root)
     buildinfo['relocate_textfiles'] = text_to_relocate
+    buildinfo['relocate_offsets'] = text_offsets
     buildinfo['relocate_binaries'] = binary_to_relocate
     buildinfo['relocate_links'] = link_to_relocate
     filename = buildinfo_file_name(workdir)
@@ -264,7 +297,59 @@ def _generate_html_index(path_list, output_path):
     f.close()
 
 
+def _read_index(text):
+    """Spec dictionaries by spec.yaml file name, from the text of an
+    index file. Return None if it is not an index this Spack can read."""
+    try:
+        index = sjson.load(text)['buildcache_index']
+        if index['version'] != _index_version:
+            return None
+        return index['specs']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _read_index_file(path):
+    """Like _read_index, from a compressed index file."""
+    try:
+        with closing(gzip.GzipFile(path, 'rb')) as f:
+            return _read_index(f.read().decode('utf-8'))
+    except (IOError, OSError, EOFError, zlib.error):
+        return None
+
+
+def _index_specs(build_cache_dir, file_list):
+    """
+    Spec dictionaries by name for the spec.yaml files in file_list. The
+    ones the index file of build_cache_dir has and that did not change
+    since it was written are not read again.
+    """
+    index_path = os.path.join(build_cache_dir, _index_file_name)
+    indexed, index_mtime = None, 0
+    if os.path.exists(index_path):
+        index_mtime = os.stat(index_path).st_mtime
+        indexed = _read_index_file(index_path)
+    indexed = indexed or {}
+
+    specs = {}
+    for name in file_list:
+        if not name.endswith('.spec.yaml'):
+            continue
+        path = os.path.join(build_cache_dir, name)
+        if name in indexed and os.stat(path).st_mtime < index_mtime:
+            specs[name] = indexed[name]
+        else:
+            with open(path) as f:
+                specs[name] = syaml.load(f)
+    return specs
+
+
 def generate_package_index(build_cache_dir):
+    """
+    Write the index.html listing the files in build_cache_dir and the
+    index file with all its specs, which clients read instead of fetching
+    every spec.yaml.
+    """
     yaml_list = os.listdir(build_cache_dir)
     path_list = [os.path.join(build_cache_dir, l) for l in yaml_list]
 
@@ -274,12 +359,117 @@ def generate_package_index(build_cache_dir):
     _generate_html_index(path_list, index_html_path_tmp)
     shutil.move(index_html_path_tmp, index_html_path)
 
+    index = {'buildcache_index': {
+        'version': _index_version,
+        'specs': _index_specs(build_cache_dir, yaml_list),
+    }}
+    index_path = os.path.join(build_cache_dir, _index_file_name)
+    with closing(gzip.GzipFile(index_path + '.tmp', 'wb')) as f:
+        f.write(json.dumps(index, separators=(',', ':')).encode('utf-8'))
+    shutil.move(index_path + '.tmp', index_path)
+
+
+def prepare_package_copy(prefix, workdir, rel, allow_root):
+    """
+    Copy the files of prefix that change in the tarball to workdir and
+    change them: the buildinfo file, binaries and absolute links.
+    Return their paths relative to workdir.
+    """
+    mkdirp(os.path.join(workdir, '.spack'))
+    write_buildinfo_file(prefix, workdir, rel=rel)
+    buildinfo = read_buildinfo_file(workdir)
+
+    changed = [os.path.relpath(buildinfo_file_name(workdir), workdir)]
+    for filename in (buildinfo['relocate_binaries'] +
+                     buildinfo['relocate_links']):
+        src = os.path.join(prefix, filename)
+        dest = os.path.join(workdir, filename)
+        mkdirp(os.path.dirname(dest))
+        if os.path.islink(src):
+            # like install_tree, point links into prefix into workdir
+            target = os.readlink(src)
+            if target.startswith(prefix + os.sep):
+                target = workdir + target[len(prefix):]
+            os.symlink(target, dest)
+        else:
+            shutil.copy2(src, dest)
+        changed.append(filename)
+
+    # optinally make the paths in the binaries relative to each other
+    # in the spack install tree before creating tarball
+    if rel:
+        make_package_relative(workdir, prefix, allow_root)
+    else:
+        make_package_placeholder(workdir, prefix, allow_root)
+    return changed
+
+
+class _HashingWriter(object):
+    """Write-only file object computing the sha256 of what goes through."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        self.fileobj.write(data)
+
+
+def write_tarball_member(spackfile_path, tarfile_name, prefix, workdir,
+                         changed, jobs=1):
+    """
+    Write the .tar.gz of prefix as the first member of a new .spack
+    archive, taking the files in changed from workdir instead of prefix.
+    The tarball is compressed with jobs threads and never written
+    anywhere else. Return its sha256 checksum.
+    """
+    arcname = os.path.basename(prefix)
+    replaced = set(os.path.join(arcname, f) for f in changed)
+
+    def skip_replaced(tarinfo):
+        return None if tarinfo.name in replaced else tarinfo
+
+    info = tarfile.TarInfo(tarfile_name)
+    info.mode = 0o644
+    info.mtime = int(time.time())
+    # A GNU header stores sizes of 8 GiB and more in the same 512 bytes,
+    # where a PAX header would need extra blocks once the size is known
+    header_size = len(info.tobuf(format=tarfile.GNU_FORMAT))
+
+    with open(spackfile_path, 'wb') as spackfile:
+        # leave room for the header, which needs the size of the tarball
+        spackfile.seek(header_size)
+        tarball = _HashingWriter(spackfile)
+        with ParallelGzipWriter(tarball, jobs=jobs) as gz:
+            with closing(tarfile.open(fileobj=gz, mode='w|')) as tar:
+                tar.add(name=prefix, arcname=arcname, filter=skip_replaced)
+                for filename in changed:
+                    tar.add(name=os.path.join(workdir, filename),
+                            arcname=os.path.join(arcname, filename),
+                            recursive=False)
+
+        # pad the tarball and end the archive, so that more can be added
+        padding = -tarball.size % tarfile.BLOCKSIZE
+        spackfile.write(b'\0' * (padding + 2 * tarfile.BLOCKSIZE))
+        info.size = tarball.size
+        header = info.tobuf(format=tarfile.GNU_FORMAT)
+        assert len(header) == header_size
+        spackfile.seek(0)
+        spackfile.write(header)
+
+    return tarball.hasher.hexdigest()
+
 
 def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
-                  allow_root=False, key=None, regenerate_index=False):
+                  allow_root=False, key=None, regenerate_index=False, jobs=1):
     """
     Build a tarball from given spec and put it into the directory structure
     used at the mirror (following <tarball_directory_name>).
+
+    The tarball is compressed with ``jobs`` threads.
     """
     if not spec.concrete:
         raise ValueError('spec must be concrete to build tarball')
@@ -290,7 +480,6 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     tarfile_name = tarball_name(spec, '.tar.gz')
     tarfile_dir = os.path.join(build_cache_dir,
                                tarball_directory_name(spec))
-    tarfile_path = os.path.join(tarfile_dir, tarfile_name)
     mkdirp(tarfile_dir)
     spackfile_path = os.path.join(
         build_cache_dir, tarball_path_name(spec, '.spack'))
@@ -312,38 +501,28 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
             os.remove(specfile_path)
         else:
             raise NoOverwriteException(str(specfile_path))
-    # make a copy of the install directory to work with
-    workdir = os.path.join(tempfile.mkdtemp(), os.path.basename(spec.prefix))
-    install_tree(spec.prefix, workdir, symlinks=True)
-
-    # create info for later relocation and create tar
-    write_buildinfo_file(spec.prefix, workdir, rel=rel)
+    # Binaries and links are changed in a copy of the prefix holding just
+    # them; everything else goes from the prefix straight to the tarball
+    tmpdir = tempfile.mkdtemp()
+    workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
+    try:
+        changed = prepare_package_copy(spec.prefix, workdir, rel, allow_root)
+    except Exception as e:
+        shutil.rmtree(tmpdir)
+        shutil.rmtree(tarfile_dir)
+        tty.die(str(e))
 
-    # optinally make the paths in the binaries relative to each other
-    # in the spack install tree before creating tarball
-    if rel:
-        try:
-            make_package_relative(workdir, spec.prefix, allow_root)
-        except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
-            tty.die(str(e))
-    else:
-        try:
-            make_package_placeholder(workdir, spec.prefix, allow_root)
-        except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
-            tty.die(str(e))
-    # create compressed tarball of the install prefix
-    with closing(tarfile.open(tarfile_path, 'w:gz')) as tar:
-        tar.add(name='%s' % workdir,
-                arcname='%s' % os.path.basename(spec.prefix))
-    # remove copy of install directory
-    shutil.rmtree(workdir)
-
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
+    # create compressed tarball of the install prefix, right in the .spack
+    # archive, and get its sha256 checksum on the way
+    try:
+        checksum = write_tarball_member(
+            spackfile_path, tarfile_name, spec.prefix, workdir, changed, jobs)
+    except BaseException:
+        if os.path.exists(spackfile_path):
+            os.remove(spackfile_path)
+        raise
+    finally:
+        shutil.rmtree(tmpdir)
 
     # add sha256 checksum to spec.yaml
     spec_dict = {}
@@ -372,16 +551,14 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     # sign the tarball and spec file with gpg
     if not unsigned:
         sign_tarball(key, force, specfile_path)
-    # put tarball, spec and signature files in .spack archive
-    with closing(tarfile.open(spackfile_path, 'w')) as tar:
-        tar.add(name='%s' % tarfile_path, arcname='%s' % tarfile_name)
+    # put spec and signature files in .spack archive, after the tarball
+    with closing(tarfile.open(spackfile_path, 'a')) as tar:
         tar.add(name='%s' % specfile_path, arcname='%s' % specfile_name)
         if not unsigned:
             tar.add(name='%s.asc' % specfile_path,
                     arcname='%s.asc' % specfile_name)
 
     # cleanup file moved to archive
-    os.remove(tarfile_path)
     if not unsigned:
         os.remove('%s.asc' % specfile_path)
 
@@ -463,15 +640,22 @@ def relocate_package(workdir, allow_root):
     if rel:
         return
 
-    tty.msg("Relocating package from",
-            "%s to %s." % (old_path, new_path))
-    path_names = set()
-    for filename in buildinfo['relocate_textfiles']:
-        path_name = os.path.join(workdir, filename)
-        # Don't add backup files generated by filter_file during install step.
-        if not path_name.endswith('~'):
-            path_names.add(path_name)
-    relocate.relocate_text(path_names, old_path, new_path)
+    # Text files hold the old install root, and need nothing if it did not
+    # change. Binaries and links hold placeholders, which are replaced below.
+    if old_path != new_path:
+        tty.msg("Relocating package from",
+                "%s to %s." % (old_path, new_path))
+        path_names = set()
+        offsets = {}
+        for filename in buildinfo['relocate_textfiles']:
+            path_name = os.path.join(workdir, filename)
+            # Don't add backup files generated by filter_file during install.
+            if not path_name.endswith('~'):
+                path_names.add(path_name)
+        for filename, file_offsets in buildinfo.get(
+                'relocate_offsets', {}).items():
+            offsets[os.path.join(workdir, filename)] = file_offsets
+        relocate.relocate_text(path_names, old_path, new_path, offsets)
     # If the binary files in the package were not edited to use
     # relative RPATHs, then the RPATHs need to be relocated
     if not rel:
@@ -488,10 +672,65 @@ def relocate_package(workdir, allow_root):
         relocate.relocate_links(path_names, old_path, new_path)
 
 
+class _HashingReader(object):
+    """Read-only file object computing the sha256 of what goes through."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.hasher.update(data)
+        return data
+
+    def hexdigest(self):
+        # what the tar reader did not need still counts
+        for block in iter(lambda: self.read(65536), b''):
+            pass
+        return self.hasher.hexdigest()
+
+
+def _is_inside(root, name):
+    """Whether name resolves to a path inside the real path root."""
+    if os.path.isabs(name) or '..' in name.split('/'):
+        return False
+    path = os.path.realpath(os.path.join(root, name))
+    return path == root or path.startswith(root + os.sep)
+
+
+def _owned_by_user(tar, path):
+    """Members of tar, changed to be extracted as the current user.
+
+    Members are checked as they are extracted, since the tarball is not
+    verified yet: absolute names, names with ``..``, hard links to files
+    outside of path and anything written through a symbolic link leading
+    out of path raise an UnsafeTarballException.
+    """
+    root = os.path.realpath(path)
+    for member in tar:
+        names = [os.path.dirname(member.name)]
+        if not member.issym():
+            names.append(member.name)
+        if member.islnk():
+            names.append(member.linkname)
+        if not all(_is_inside(root, name) for name in names):
+            raise UnsafeTarballException(
+                "Package tarball member {0} would be extracted outside "
+                "of {1}.\nIt cannot be installed.".format(member.name, path))
+        member.uid, member.gid = os.getuid(), os.getgid()
+        member.uname = member.gname = ''
+        yield member
+
+
 def extract_tarball(spec, filename, allow_root=False, unsigned=False,
                     force=False):
     """
     extract binary tarball for given package into install area
+
+    The tarball is extracted straight from the .spack archive into a
+    staging directory next to the prefix, checksummed on the way. It is
+    relocated there and renamed to the prefix once everything succeeded.
     """
     if os.path.exists(spec.prefix):
         if force:
@@ -499,93 +738,176 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
         else:
             raise NoOverwriteException(str(spec.prefix))
 
-    tmpdir = tempfile.mkdtemp()
+    parent = os.path.dirname(spec.prefix)
+    mkdirp(parent)
+    tmpdir = tempfile.mkdtemp(
+        prefix='.%s-' % os.path.basename(spec.prefix), dir=parent)
+    try:
+        _extract_tarball(spec, filename, tmpdir, allow_root, unsigned)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _extract_tarball(spec, filename, tmpdir, allow_root, unsigned):
     stagepath = os.path.dirname(filename)
     spackfile_name = tarball_name(spec, '.spack')
     spackfile_path = os.path.join(stagepath, spackfile_name)
     tarfile_name = tarball_name(spec, '.tar.gz')
-    tarfile_path = os.path.join(tmpdir, tarfile_name)
     specfile_name = tarball_name(spec, '.spec.yaml')
     specfile_path = os.path.join(tmpdir, specfile_name)
 
-    with closing(tarfile.open(spackfile_path, 'r')) as tar:
-        tar.extractall(tmpdir)
-    if not unsigned:
-        if os.path.exists('%s.asc' % specfile_path):
-            try:
-                Gpg.verify('%s.asc' % specfile_path, specfile_path)
-            except Exception as e:
-                shutil.rmtree(tmpdir)
-                tty.die(str(e))
-        else:
-            shutil.rmtree(tmpdir)
-            raise NoVerifyException(
-                "Package spec file failed signature verification.\n"
-                "Use spack buildcache keys to download "
-                "and install a key for verification from the mirror.")
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
-
-    # get the sha256 checksum recorded at creation
-    spec_dict = {}
-    with open(specfile_path, 'r') as inputfile:
-        content = inputfile.read()
-        spec_dict = syaml.load(content)
-    bchecksum = spec_dict['binary_cache_checksum']
+    with closing(tarfile.open(spackfile_path, 'r')) as spackfile:
+        names = spackfile.getnames()
+        for name in (specfile_name, '%s.asc' % specfile_name):
+            if name in names:
+                spackfile.extract(name, tmpdir)
+
+        if not unsigned:
+            if os.path.exists('%s.asc' % specfile_path):
+                try:
+                    Gpg.verify('%s.asc' % specfile_path, specfile_path)
+                except Exception as e:
+                    tty.die(str(e))
+            else:
+                raise NoVerifyException(
+                    "Package spec file failed signature verification.\n"
+                    "Use spack buildcache keys to download "
+                    "and install a key for verification from the mirror.")
+
+        # get the sha256 checksum recorded at creation
+        spec_dict = {}
+        with open(specfile_path, 'r') as inputfile:
+            content = inputfile.read()
+            spec_dict = syaml.load(content)
+        bchecksum = spec_dict['binary_cache_checksum']
+
+        new_relative_prefix = str(os.path.relpath(spec.prefix,
+                                                  spack.store.layout.root))
+        # if the original relative prefix is in the spec file use it
+        buildinfo = spec_dict.get('buildinfo', {})
+        old_relative_prefix = buildinfo.get('relative_prefix',
+                                            new_relative_prefix)
+        # if the original relative prefix and new relative prefix differ the
+        # directory layout has changed and the  buildcache cannot be installed
+        if old_relative_prefix != new_relative_prefix:
+            msg = "Package tarball was created from an install "
+            msg += "prefix with a different directory layout.\n"
+            msg += "It cannot be relocated."
+            raise NewLayoutException(msg)
+
+        # extract the tarball in the staging directory, getting its sha256
+        # checksum on the way; nothing of it leaves the staging directory
+        # (which is removed by the caller) before the checksum matches
+        tarball = _HashingReader(spackfile.extractfile(tarfile_name))
+        try:
+            with closing(tarfile.open(fileobj=tarball, mode='r|*')) as tar:
+                tar.extractall(
+                    path=tmpdir, members=_owned_by_user(tar, tmpdir))
+            checksum = tarball.hexdigest()
+        except (tarfile.TarError, EOFError):
+            # a corrupted tarball may not make it to the checksum test
+            checksum = None
 
     # if the checksums don't match don't install
     if bchecksum['hash'] != checksum:
-        shutil.rmtree(tmpdir)
         raise NoChecksumException(
             "Package tarball failed checksum verification.\n"
             "It cannot be installed.")
 
-    new_relative_prefix = str(os.path.relpath(spec.prefix,
-                                              spack.store.layout.root))
-    # if the original relative prefix is in the spec file use it
-    buildinfo = spec_dict.get('buildinfo', {})
-    old_relative_prefix = buildinfo.get('relative_prefix', new_relative_prefix)
-    # if the original relative prefix and new relative prefix differ the
-    # directory layout has changed and the  buildcache cannot be installed
-    if old_relative_prefix != new_relative_prefix:
-        shutil.rmtree(tmpdir)
-        msg = "Package tarball was created from an install "
-        msg += "prefix with a different directory layout.\n"
-        msg += "It cannot be relocated."
-        raise NewLayoutException(msg)
-
-    # extract the tarball in a temp directory
-    with closing(tarfile.open(tarfile_path, 'r')) as tar:
-        tar.extractall(path=tmpdir)
     # the base of the install prefix is used when creating the tarball
     # so the pathname should be the same now that the directory layout
     # is confirmed
     workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
 
-    # cleanup
-    os.remove(tarfile_path)
-    os.remove(specfile_path)
-
     try:
         relocate_package(workdir, allow_root)
     except Exception as e:
-        shutil.rmtree(workdir)
         tty.die(str(e))
+
     # Delay creating spec.prefix until verification is complete
     # and any relocation has been done.
-    else:
-        install_tree(workdir, spec.prefix, symlinks=True)
-    finally:
-        shutil.rmtree(tmpdir)
+    os.rename(workdir, spec.prefix)
 
 
 #: Internal cache for get_specs
 _cached_specs = None
 
 
+def _specs_from_dicts(spec_dicts):
+    specs = []
+    for spec_dict in spec_dicts:
+        # All specs in build caches are concrete (as they are built) so
+        # we need to mark this spec concrete on read-in.
+        spec = Spec.from_dict(spec_dict)
+        spec._mark_concrete()
+        specs.append(spec)
+    return specs
+
+
+def _fetch_index(url, force=False):
+    """
+    Return the text of the index file at url, or None if there is none.
+    The index is cached in the misc_cache and only downloaded again if
+    the server says it changed, unless force is True.
+    """
+    cache = spack.caches.misc_cache
+    key = os.path.join(
+        'build_cache', hashlib.sha256(url.encode('utf-8')).hexdigest())
+    meta_key = key + '.meta'
+
+    cached = {}
+    if not force and cache.init_entry(key) and cache.init_entry(meta_key):
+        with cache.read_transaction(meta_key) as f:
+            cached = sjson.load(f)
+
+    try:
+        response = web_util.read_from_url_if_modified(
+            url, cached.get('etag'), cached.get('last_modified'))
+    except (URLError, socket.error) as e:
+        tty.debug('No build cache index at {0}: {1}'.format(url, e))
+        return None
+
+    if response is None:
+        tty.debug('Using cached build cache index from {0}'.format(url))
+        with cache.read_transaction(key) as f:
+            return f.read()
+
+    data, headers = response
+    try:
+        with closing(gzip.GzipFile(fileobj=io.BytesIO(data))) as f:
+            text = f.read().decode('utf-8')
+    except (IOError, OSError, EOFError, zlib.error, UnicodeDecodeError):
+        tty.warn('Cannot read the build cache index at {0}'.format(url))
+        return None
+
+    with cache.write_transaction(key) as (old, new):
+        new.write(text)
+    with cache.write_transaction(meta_key) as (old, new):
+        sjson.dump(headers, new)
+    return text
+
+
+def _fetch_spec_dict(link, force):
+    """Fetch and read a spec.yaml file, or return None if it fails."""
+    with Stage(link, name="build_cache", keep=True, lock=False) as stage:
+        if force and os.path.exists(stage.save_filename):
+            os.remove(stage.save_filename)
+        if not os.path.exists(stage.save_filename):
+            try:
+                stage.fetch()
+            except fs.FetchError:
+                return None
+        with open(stage.save_filename, 'r') as f:
+            return syaml.load(f)
+
+
 def get_specs(force=False):
     """
     Get spec.yaml's for build caches available on mirror
+
+    Mirrors are read through the index file created by
+    generate_package_index. For mirrors without one, the spec.yaml files
+    are fetched a few at a time.
     """
     global _cached_specs
 
@@ -599,42 +921,43 @@ def get_specs(force=False):
         return {}
 
     path = str(spack.architecture.sys_type())
-    urls = set()
+    spec_dicts = []
     for mirror_name, mirror_url in mirrors.items():
         if mirror_url.startswith('file'):
             mirror = mirror_url.replace('file://', '') + "/" + _build_cache_relative_path
             tty.msg("Finding buildcaches in %s" % mirror)
             if os.path.exists(mirror):
-                files = os.listdir(mirror)
-                for file in files:
-                    if re.search('spec.yaml', file):
-                        link = 'file://' + mirror + '/' + file
-                        urls.add(link)
-        else:
-            tty.msg("Finding buildcaches on %s" % mirror_url)
-            p, links = spider(mirror_url + "/" + _build_cache_relative_path)
-            for link in links:
-                if re.search("spec.yaml", link) and re.search(path, link):
-                    urls.add(link)
-
-    _cached_specs = []
-    for link in urls:
-        with Stage(link, name="build_cache", keep=True) as stage:
-            if force and os.path.exists(stage.save_filename):
-                os.remove(stage.save_filename)
-            if not os.path.exists(stage.save_filename):
-                try:
-                    stage.fetch()
-                except fs.FetchError:
-                    continue
-            with open(stage.save_filename, 'r') as f:
-                # read the spec from the build cache file. All specs
-                # in build caches are concrete (as they are built) so
-                # we need to mark this spec concrete on read-in.
-                spec = Spec.from_yaml(f)
-                spec._mark_concrete()
-                _cached_specs.append(spec)
+                specs = _index_specs(mirror, os.listdir(mirror))
+                spec_dicts.extend(specs.values())
+            continue
+
+        tty.msg("Finding buildcaches on %s" % mirror_url)
+        cache_url = mirror_url + "/" + _build_cache_relative_path
+        index = _fetch_index(cache_url + "/" + _index_file_name, force)
+        specs = _read_index(index) if index else None
+        if specs is not None:
+            spec_dicts.extend(d for name, d in specs.items()
+                              if re.search(path, name))
+            continue
+
+        p, links = spider(cache_url)
+        links = [link for link in links
+                 if re.search("spec.yaml", link) and re.search(path, link)]
+        if links:
+            # All the files go to the same stage: create it only once
+            Stage(links[0], name="build_cache", keep=True, lock=False).create()
+
+            def fetch(link):
+                return _fetch_spec_dict(link, force)
 
+            pool = ThreadPool(min(_fetch_jobs, len(links)))
+            try:
+                fetched = pool.map(fetch, links)
+            finally:
+                pool.terminate()
+            spec_dicts.extend(d for d in fetched if d is not None)
+
+    _cached_specs = _specs_from_dicts(spec_dicts)
     return _cached_specs
 
 
@@ -724,7 +1047,13 @@ def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
         tty.warn(result_of_error)
         return rebuild_on_errors
 
-    spec_yaml = syaml.load(yaml_contents)
+    return _full_hash_changed(spec, syaml.load(yaml_contents))
+
+
+def _full_hash_changed(spec, spec_yaml):
+    """Whether the remote spec.yaml contents of spec mean it must be
+    rebuilt."""
+    pkg_full_hash = spec.full_hash()
 
     # If either the full_hash didn't exist in the .spec.yaml file, or it
     # did, but didn't match the one we computed locally, then we should
@@ -745,8 +1074,62 @@ def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
     return False
 
 
+def specs_needing_rebuild(specs, mirror_url, rebuild_on_errors=False,
+                          jobs=_fetch_jobs):
+    """Return the specs that need to be rebuilt for the given mirror.
+
+    The index file of the mirror is fetched once and the full hashes of
+    all the specs it lists are compared with the local ones. Specs that
+    are not in the index, or all of them if the mirror has no index, are
+    checked with needs_rebuild, up to jobs at a time.
+
+    Arguments:
+        specs (list): concrete specs to check
+        mirror_url (str): url of the mirror
+        rebuild_on_errors (bool): whether specs that cannot be checked
+            need to be rebuilt
+        jobs (int): number of spec.yaml files to fetch at the same time
+
+    Returns: the specs that need to be rebuilt, in the order given.
+    """
+    specs = list(specs)
+    for spec in specs:
+        if not spec.concrete:
+            raise ValueError('spec must be concrete to check against mirror')
+        # Compute the hashes here rather than in the threads below
+        spec.full_hash()
+
+    build_cache_dir = build_cache_directory(mirror_url)
+    index = _fetch_index(build_cache_dir + '/' + _index_file_name)
+    indexed = (_read_index(index) if index else None) or {}
+
+    rebuild, unchecked = set(), []
+    for spec in specs:
+        spec_yaml = indexed.get(tarball_name(spec, '.spec.yaml'))
+        if spec_yaml is None:
+            unchecked.append(spec)
+        elif _full_hash_changed(spec, spec_yaml):
+            rebuild.add(id(spec))
+
+    if unchecked:
+        tty.debug('Checking {0} specs not in the index of {1}'.format(
+            len(unchecked), mirror_url))
+
+        def check(spec):
+            return needs_rebuild(spec, mirror_url, rebuild_on_errors)
+
+        pool = ThreadPool(max(1, min(jobs, len(unchecked))))
+        try:
+            results = pool.map(check, unchecked)
+        finally:
+            pool.terminate()
+        rebuild.update(id(s) for s, r in zip(unchecked, results) if r)
+
+    return [spec for spec in specs if id(spec) in rebuild]
+
+
 def check_specs_against_mirrors(mirrors, specs, output_file=None,
-                                rebuild_on_errors=False):
+                                rebuild_on_errors=False, jobs=_fetch_jobs):
     """Check all the given specs against buildcaches on the given mirrors and
     determine if any of the specs need to be rebuilt.  Reasons for needing to
     rebuild include binary cache for spec isn't present on a mirror, or it is
@@ -760,6 +1143,8 @@ def check_specs_against_mirrors(mirrors, specs, output_file=None,
             JSON object and written to this file.
         rebuild_on_errors (boolean): Treat any errors encountered while
             checking specs as a signal to rebuild package.
+        jobs (int): Number of spec.yaml files to fetch at the same time
+            from mirrors that have no index file.
 
     Returns: 1 if any spec was out-of-date on any mirror, 0 otherwise.
 
@@ -768,14 +1153,11 @@ def check_specs_against_mirrors(mirrors, specs, output_file=None,
     for mirror_name, mirror_url in mirrors.items():
         tty.msg('Checking for built specs at %s' % mirror_url)
 
-        rebuild_list = []
-
-        for spec in specs:
-            if needs_rebuild(spec, mirror_url, rebuild_on_errors):
-                rebuild_list.append({
-                    'short_spec': spec.short_spec,
-                    'hash': spec.dag_hash()
-                })
+        rebuild_list = [{
+            'short_spec': spec.short_spec,
+            'hash': spec.dag_hash()
+        } for spec in specs_needing_rebuild(
+            specs, mirror_url, rebuild_on_errors, jobs)]
 
         if rebuild_list:
             rebuilds[mirror_url] = {
@@ -5,6 +5,7 @@
 
 """Caches used by Spack to store data"""
 import os
+import re
 
 import llnl.util.lang
 from llnl.util.filesystem import mkdirp
@@ -20,7 +21,8 @@ def _misc_cache():
     """The ``misc_cache`` is Spack's cache for small data.
 
     Currently the ``misc_cache`` stores indexes for virtual dependency
-    providers and for which packages provide which tags.
+    providers and for which packages provide which tags, and the compiled
+    code of package modules.
     """
     path = spack.config.get('config:misc_cache')
     if not path:
@@ -34,6 +36,23 @@ def _misc_cache():
 misc_cache = llnl.util.lang.Singleton(_misc_cache)
 
 
+#: Multipliers of the suffixes of sizes in the configuration
+_size_units = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3,
+               't': 1024 ** 4}
+
+
+def parse_size(size):
+    """Number of bytes in a size from the configuration, like ``20G``."""
+    if not size:
+        return 0
+    if isinstance(size, int):
+        return size
+    match = re.match(r'^(\d+)\s*([kmgt]?)$', size.strip().lower())
+    if not match:
+        raise ValueError('Invalid size: {0}'.format(size))
+    return int(match.group(1)) * _size_units[match.group(2)]
+
+
 def _fetch_cache():
     """Filesystem cache of downloaded archives.
 
@@ -44,15 +63,18 @@ def _fetch_cache():
     if not path:
         path = os.path.join(spack.paths.var_path, "cache")
     path = canonicalize_path(path)
+    limit = parse_size(spack.config.get('config:source_cache_limit'))
 
-    return spack.fetch_strategy.FsCache(path)
+    return spack.fetch_strategy.FsCache(path, limit)
 
 
 class MirrorCache(object):
-    def __init__(self, root):
+    def __init__(self, root, manifest=None):
         self.root = os.path.abspath(root)
         self.new_resources = set()
         self.existing_resources = set()
+        #: spack.mirror.MirrorManifest where archives are recorded
+        self.manifest = manifest
 
     def store(self, fetcher, relative_dest):
         # Note this will archive package sources even if they would not
@@ -61,11 +83,16 @@ class MirrorCache(object):
         dst = os.path.join(self.root, relative_dest)
         if os.path.exists(dst):
             self.existing_resources.add(relative_dest)
+            if self.manifest and self.manifest.unchanged(relative_dest):
+                return
         else:
             self.new_resources.add(relative_dest)
             mkdirp(os.path.dirname(dst))
             fetcher.archive(dst)
 
+        if self.manifest:
+            self.manifest.record(relative_dest)
+
 
 #: Spack's local cache for downloaded source archives
 fetch_cache = llnl.util.lang.Singleton(_fetch_cache)
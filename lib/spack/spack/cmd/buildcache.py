@@ -4,13 +4,16 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import argparse
+import multiprocessing
 import os
 import sys
+from multiprocessing.pool import ThreadPool
 
 import llnl.util.tty as tty
 
 import spack.cmd
 import spack.environment as ev
+import spack.error
 from spack.error import SpecError
 import spack.config
 import spack.repo
@@ -55,6 +58,10 @@ def setup_parser(subparser):
                                             "building package(s)")
     create.add_argument('-y', '--spec-yaml', default=None,
                         help='Create buildcache entry for spec from yaml file')
+    create.add_argument('-j', '--jobs', action='store', type=int,
+                        dest='jobs',
+                        help="number of threads creating and compressing "
+                             "tarballs. default is #cpus")
     create.add_argument(
         'packages', nargs=argparse.REMAINDER,
         help="specs of packages to create buildcache for")
@@ -132,6 +139,11 @@ def setup_parser(subparser):
         help="Default to rebuilding packages if errors are encountered " +
              "during the process of checking whether rebuilding is needed")
 
+    check.add_argument(
+        '-j', '--jobs', type=int, default=bindist._fetch_jobs,
+        help="number of spec.yaml files to fetch at the same time from "
+             "mirrors without an index (default %(default)s)")
+
     check.set_defaults(func=check_binaries)
 
     # Download tarball and spec.yaml
@@ -281,6 +293,12 @@ def createtarball(args):
         tty.die("build cache file creation requires at least one" +
                 " installed package argument or else path to a" +
                 " yaml file containing a spec to install")
+    jobs = args.jobs
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    elif jobs <= 0:
+        tty.die("The -j option must be a positive integer!")
+
     pkgs = set(packages)
     specs = set()
     outdir = '.'
@@ -319,11 +337,38 @@ def createtarball(args):
 
     tty.msg('writing tarballs to %s/build_cache' % outdir)
 
-    for spec in specs:
+    # Tarballs are created side by side, and the threads left over
+    # compress each of them in parallel
+    concurrent = max(1, min(jobs, len(specs)))
+    compress_jobs = max(1, jobs // concurrent)
+
+    def create(spec):
         tty.msg('creating binary cache file for package %s ' % spec.format())
         bindist.build_tarball(spec, outdir, args.force, args.rel,
                               args.unsigned, args.allow_root, signkey,
-                              not args.no_rebuild_index)
+                              regenerate_index=False, jobs=compress_jobs)
+
+    def create_in_thread(spec):
+        try:
+            create(spec)
+        except SystemExit:
+            # build_tarball already said why; exiting would hang the pool
+            raise spack.error.SpackError(
+                'could not create binary cache file for %s' % spec.format())
+
+    if concurrent == 1:
+        for spec in specs:
+            create(spec)
+    else:
+        pool = ThreadPool(concurrent)
+        try:
+            pool.map(create_in_thread, specs)
+        finally:
+            pool.terminate()
+
+    # create an index.html for the build_cache directory so specs can be found
+    if specs and not args.no_rebuild_index:
+        bindist.generate_package_index(bindist.build_cache_directory(outdir))
 
 
 def installtarball(args):
@@ -411,7 +456,8 @@ def check_binaries(args):
         sys.exit(0)
 
     sys.exit(bindist.check_specs_against_mirrors(
-        configured_mirrors, specs, args.output_file, args.rebuild_on_error))
+        configured_mirrors, specs, args.output_file, args.rebuild_on_error,
+        args.jobs))
 
 
 def get_tarball(args):
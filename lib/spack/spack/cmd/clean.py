@@ -3,6 +3,8 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+from __future__ import print_function
+
 import argparse
 import os
 import shutil
@@ -43,6 +45,9 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-a', '--all', action=AllClean, help="equivalent to -sdmp", nargs=0
     )
+    subparser.add_argument(
+        '--cache-stats', action='store_true',
+        help="show the size and hit rate of the download cache")
     subparser.add_argument(
         'specs',
         nargs=argparse.REMAINDER,
@@ -53,9 +58,12 @@ def setup_parser(subparser):
 def clean(parser, args):
     # If nothing was set, activate the default
     if not any([args.specs, args.stage, args.downloads, args.misc_cache,
-                args.python_cache]):
+                args.python_cache, args.cache_stats]):
         args.stage = True
 
+    if args.cache_stats:
+        show_cache_stats()
+
     # Then do the cleaning falling through the cases
     if args.specs:
         specs = spack.cmd.parse_specs(args.specs, concretize=True)
@@ -91,3 +99,33 @@ def clean(parser, args):
                         dname = os.path.join(root, d)
                         tty.debug('Removing {0}'.format(dname))
                         shutil.rmtree(dname)
+
+
+def format_bytes(size):
+    """Human readable size, e.g. ``1.5 GiB``."""
+    if size < 1024:
+        return '{0} B'.format(size)
+    for unit in ('KiB', 'MiB', 'GiB', 'TiB'):
+        size /= 1024.0
+        if size < 1024 or unit == 'TiB':
+            return '{0:.1f} {1}'.format(size, unit)
+
+
+def show_cache_stats():
+    stats = spack.caches.fetch_cache.stats()
+    requests = stats['hits'] + stats['misses']
+    hit_rate = 100.0 * stats['hits'] / requests if requests else 0
+    limit = format_bytes(stats['limit']) if stats['limit'] else 'none'
+    saved = stats['bytes_reused'] + stats['bytes_deduplicated']
+
+    tty.msg('Download cache in {0}'.format(spack.caches.fetch_cache.root))
+    print('  Archives:       {0} ({1} paths)'.format(
+        stats['archives'], stats['paths']))
+    print('  Size:           {0} (limit: {1})'.format(
+        format_bytes(stats['size']), limit))
+    print('  Hits:           {0} of {1} ({2:.1f}%)'.format(
+        stats['hits'], requests, hit_rate))
+    print('  Bytes saved:    {0} ({1} reused, {2} deduplicated)'.format(
+        format_bytes(saved), format_bytes(stats['bytes_reused']),
+        format_bytes(stats['bytes_deduplicated'])))
+    print('  Evictions:      {0}'.format(stats['evictions']))
@@ -3,6 +3,11 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import multiprocessing
+
+import llnl.util.tty as tty
+
+import spack.config
 import spack.environment as ev
 
 description = 'concretize an environment and write a lockfile'
@@ -14,9 +19,25 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-f', '--force', action='store_true',
         help="Re-concretize even if already concretized.")
+    subparser.add_argument(
+        '--no-cache', action='store_false', dest='cache',
+        help="Don't reuse specs from the concretization cache.")
+    subparser.add_argument(
+        '-j', '--jobs', action='store', type=int, dest='jobs',
+        help="number of processes concretizing the user specs. "
+             "default is #cpus")
 
 
 def concretize(parser, args):
+    jobs = args.jobs
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    elif jobs <= 0:
+        tty.die("The -j option must be a positive integer!")
+
     env = ev.get_env(args, 'concretize', required=True)
-    env.concretize(force=args.force)
+    if not args.cache:
+        spack.config.set('config:concretization_cache', False,
+                         scope='command_line')
+    env.concretize(force=args.force, jobs=jobs)
     env.write()
@@ -37,16 +37,24 @@ def inverted_dependencies():
        Virtual packages are included as sources, so that you can query
        dependents of, e.g., `mpi`, but virtuals are not included as
        actual dependents.
+
+       Dependencies come from the package metadata index, so no package
+       is loaded.
     """
     dag = {}
-    for pkg in spack.repo.path.all_packages():
+    providers = {}
+    for name in spack.repo.path.all_package_names():
+        pkg = spack.repo.path.get_pkg_descriptor(name)
         dag.setdefault(pkg.name, set())
-        for dep in pkg.dependencies:
+        for dep in pkg.dependency_names():
             deps = [dep]
 
             # expand virtuals if necessary
             if spack.repo.path.is_virtual(dep):
-                deps += [s.name for s in spack.repo.path.providers_for(dep)]
+                if dep not in providers:
+                    providers[dep] = [
+                        s.name for s in spack.repo.path.providers_for(dep)]
+                deps += providers[dep]
 
             for d in deps:
                 dag.setdefault(d, set()).add(pkg.name)
@@ -9,8 +9,10 @@ import llnl.util.tty as tty
 
 import spack.cmd
 import spack.config
+import spack.environment as ev
 import spack.repo
 import spack.cmd.common.arguments as arguments
+from spack.fetch_scheduler import FetchScheduler
 
 description = "fetch archives for packages"
 section = "build"
@@ -25,21 +27,32 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-D', '--dependencies', action='store_true',
         help="also fetch all dependencies")
+    subparser.add_argument(
+        '-j', '--jobs', action='store', type=int, default=1,
+        help="number of archives to download at the same time")
     subparser.add_argument(
         'packages', nargs=argparse.REMAINDER,
         help="specs of packages to fetch")
 
 
 def fetch(parser, args):
-    if not args.packages:
-        tty.die("fetch requires at least one package argument")
-
     if args.no_checksum:
         spack.config.set('config:checksum', False, scope='command_line')
 
-    specs = spack.cmd.parse_specs(args.packages, concretize=True)
+    if args.packages:
+        specs = spack.cmd.parse_specs(args.packages, concretize=True)
+        recurse = args.missing or args.dependencies
+    else:
+        # Without packages, fetch everything an environment needs
+        env = ev.get_env(args, 'fetch')
+        if not env:
+            tty.die("fetch requires at least one package argument")
+        specs = [concrete for _, concrete in env.concretized_specs()]
+        recurse = True
+
+    to_fetch = []
     for spec in specs:
-        if args.missing or args.dependencies:
+        if recurse:
             for s in spec.traverse():
                 package = spack.repo.get(s)
 
@@ -51,7 +64,8 @@ def fetch(parser, args):
                 if package.spec.external:
                     continue
 
-                package.do_fetch()
+                to_fetch.append(s)
+
+        to_fetch.append(spec)
 
-        package = spack.repo.get(spec)
-        package.do_fetch()
+    FetchScheduler(to_fetch, jobs=args.jobs).run()
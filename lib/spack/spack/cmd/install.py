@@ -36,6 +36,8 @@ def update_kwargs_from_args(args, kwargs):
         'restage': not args.dont_restage,
         'install_source': args.install_source,
         'make_jobs': args.jobs,
+        'concurrent_builds': args.concurrent_builds,
+        'cooperative': args.cooperative,
         'verbose': args.verbose,
         'fake': args.fake,
         'dirty': args.dirty,
@@ -62,6 +64,19 @@ alternatively one can decide to install only the package or only
 the dependencies"""
     )
     arguments.add_common_arguments(subparser, ['jobs', 'install_status'])
+    subparser.add_argument(
+        '--jobs-per-build', action='store', type=int, dest='jobs',
+        help="same as -j: number of make jobs used by each build")
+    subparser.add_argument(
+        '--concurrent-builds', action='store', type=int, default=None,
+        help="number of dependencies to build at the same time. default is "
+             "config:concurrent_builds. unless -j is given, the build jobs "
+             "are shared among the concurrent builds")
+    subparser.add_argument(
+        '--cooperative', action='store_true',
+        help="share the installation of dependencies with other spack "
+             "processes using the same install tree. dependencies they "
+             "are building are skipped and checked again later")
     subparser.add_argument(
         '--overwrite', action='store_true',
         help="reinstall an existing spec, even if it has dependents")
@@ -227,6 +242,11 @@ def install(parser, args, **kwargs):
         if args.jobs <= 0:
             tty.die("The -j option must be a positive integer!")
 
+    if args.concurrent_builds is not None:
+        if args.concurrent_builds <= 0:
+            tty.die("The --concurrent-builds option must be a positive "
+                    "integer!")
+
     if args.no_checksum:
         spack.config.set('config:checksum', False, scope='command_line')
 
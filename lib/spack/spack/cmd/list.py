@@ -77,9 +77,9 @@ def filter_by_name(pkgs, args):
                 if f.match(p):
                     return True
 
-                pkg = spack.repo.get(p)
-                if pkg.__doc__:
-                    return f.match(pkg.__doc__)
+                pkg = spack.repo.path.get_pkg_descriptor(p)
+                if pkg.description:
+                    return f.match(pkg.description)
                 return False
         else:
             def match(p, f):
@@ -47,6 +47,9 @@ def setup_parser(subparser):
         '-n', '--versions-per-spec', type=int,
         default=1,
         help="the number of versions to fetch for each spec")
+    create_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help="number of archives to fetch at the same time")
 
     # used to construct scope arguments below
     scopes = spack.config.scopes()
@@ -192,7 +195,8 @@ def mirror_create(args):
 
         # Actually do the work to create the mirror
         present, mirrored, error = spack.mirror.create(
-            directory, specs, num_versions=args.versions_per_spec)
+            directory, specs, num_versions=args.versions_per_spec,
+            jobs=args.jobs)
         p, m, e = len(present), len(mirrored), len(error)
 
         verb = "updated" if existed else "created"
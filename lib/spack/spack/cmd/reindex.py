@@ -3,6 +3,10 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import multiprocessing
+
+import llnl.util.tty as tty
+
 import spack.store
 
 description = "rebuild Spack's package database"
@@ -10,5 +14,18 @@ section = "admin"
 level = "long"
 
 
+def setup_parser(subparser):
+    subparser.add_argument(
+        '-j', '--jobs', action='store', type=int, dest='jobs',
+        help="number of processes reading the installed prefixes. "
+             "default is #cpus")
+
+
 def reindex(parser, args):
-    spack.store.store.reindex()
+    jobs = args.jobs
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    elif jobs <= 0:
+        tty.die("The -j option must be a positive integer!")
+
+    spack.store.store.reindex(jobs=jobs, progress=True)
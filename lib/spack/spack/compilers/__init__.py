@@ -28,6 +28,9 @@ _cache_config_file = []
 #: cache of compilers constructed from config data, keyed by config entry id.
 _compiler_cache = {}
 
+#: cache of compiler specs parsed from config data, keyed by spec string.
+_compiler_spec_cache = {}
+
 
 def _auto_compiler_spec(function):
     def converter(cspec_like, *args, **kwargs):
@@ -160,9 +163,19 @@ def all_compilers_config(scope=None, init_config=True):
 
 
 def all_compiler_specs(scope=None, init_config=True):
-    # Return compiler specs from the merged config.
-    return [spack.spec.CompilerSpec(s['compiler']['spec'])
-            for s in all_compilers_config(scope, init_config)]
+    """Return compiler specs from the merged config.
+
+    The specs are parsed once; callers get copies, which they may change.
+    """
+    specs = []
+    for s in all_compilers_config(scope, init_config):
+        spec_string = s['compiler']['spec']
+        cspec = _compiler_spec_cache.get(spec_string)
+        if cspec is None:
+            cspec = spack.spec.CompilerSpec(spec_string)
+            _compiler_spec_cache[spec_string] = cspec
+        specs.append(cspec.copy())
+    return specs
 
 
 def find_compilers(*paths):
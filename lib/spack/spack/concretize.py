@@ -15,19 +15,32 @@ TODO: make this customizable and allow users to configure
       concretization  policies.
 """
 from __future__ import print_function
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import sys
 from itertools import chain
 from functools_backport import reverse_order
 from contextlib import contextmanager
 from six import iteritems
 
 import llnl.util.lang
+import llnl.util.tty as tty
 
+import spack
 import spack.repo
 import spack.abi
 import spack.spec
+import spack.caches
 import spack.compilers
+import spack.config
 import spack.architecture
+import spack.paths
 import spack.error
+import spack.util.spack_json as sjson
+from spack.util.crypto import checksum
 from spack.version import ver, Version, VersionList, VersionRange
 from spack.package_prefs import PackagePrefs, spec_externals, is_spec_buildable
 
@@ -39,6 +52,23 @@ concretizer = llnl.util.lang.Singleton(lambda: Concretizer())
 #: impements rudimentary logic for ABI compatibility
 _abi = llnl.util.lang.Singleton(lambda: spack.abi.ABI())
 
+#: Format of the entries of the concretization cache
+_cache_version = 1
+
+#: Configuration sections that concretization depends on
+_cache_config_sections = ('packages', 'compilers', 'repos')
+
+#: Modules of Spack, relative to ``spack.paths.module_path``, whose code
+#: decides what specs concretize to
+_cache_code_modules = (
+    'architecture.py', 'concretize.py', 'package_prefs.py', 'spec.py',
+    'variant.py', 'version.py', os.path.join('compilers', '__init__.py'))
+
+#: Number of entries the concretization cache is pruned to when it grows
+#: past ``_cache_max_entries``; the least recently used ones are removed
+_cache_max_entries = 2000
+_cache_pruned_entries = 1500
+
 
 class Concretizer(object):
     """You can subclass this class to override some of the default
@@ -442,6 +472,279 @@ def find_spec(spec, condition, default=None):
     return default   # Nothing matched the condition; return default.
 
 
+class ConcretizationCache(object):
+    """Concrete specs stored on disk, keyed by the abstract spec.
+
+    An entry is found by hashing the abstract spec together with the
+    inputs of concretization that are cheap to collect: the ``packages``,
+    ``compilers`` and ``repos`` configuration, the package repositories,
+    the default architecture, the version of Spack and the code of the
+    modules of Spack that concretization depends on.
+
+    Each entry also records content hashes of the directories of the
+    packages the concrete spec was built from, including the packages
+    they inherit from, and the providers of the virtual packages they
+    use.  An entry is only used while all of those are unchanged.
+
+    The cache keeps the ``_cache_max_entries`` most recently used entries.
+    """
+
+    def __init__(self, file_cache):
+        self.file_cache = file_cache
+
+    def key(self, spec, tests=False):
+        """Key of the entry for ``spec`` concretized with ``tests``.
+
+        Returns None for specs that refer to installed specs by hash,
+        which are not cached.
+        """
+        if any(s.concrete for s in spec.traverse()):
+            return None
+
+        inputs = {
+            'version': _cache_version,
+            'spack': spack.spack_version,
+            'code': _spack_code_hash(),
+            'spec': str(spec),
+            'namespaces': sorted(s.fullname for s in spec.traverse()),
+            'tests': tests if isinstance(tests, bool) else sorted(tests),
+            'arch': str(spack.architecture.sys_type()),
+            'repos': [repo.root for repo in spack.repo.path.repos],
+            'config': dict((section, spack.config.get(section))
+                           for section in _cache_config_sections),
+        }
+        text = json.dumps(inputs, sort_keys=True, default=str)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return 'concretization/{0}.json'.format(digest)
+
+    def fetch(self, key):
+        """Concrete spec stored under ``key``, or None if there is no
+        valid entry."""
+        try:
+            if not self.file_cache.init_entry(key):
+                return None
+            with self.file_cache.read_transaction(key) as f:
+                entry = sjson.load(f)
+
+            for path, digest in entry['packages'].items():
+                if _package_dir_hash(path) != digest:
+                    tty.debug('Concretization cache: {0} changed'.format(path))
+                    return None
+            if _providers(entry['providers']) != entry['providers']:
+                tty.debug('Concretization cache: providers changed')
+                return None
+
+            spec = spack.spec.Spec.from_dict(entry['spec'])
+        except (spack.error.SpackError, EnvironmentError, KeyError,
+                ValueError) as e:
+            tty.debug('Concretization cache: cannot read {0}: {1}'.format(
+                key, str(e)))
+            return None
+
+        # The modification time tells which entries were used last
+        try:
+            os.utime(self.file_cache.cache_path(key), None)
+        except OSError:
+            pass
+
+        spec._mark_concrete()
+        return spec
+
+    def store(self, key, spec):
+        """Store the concrete ``spec`` under ``key``."""
+        virtuals = set()
+        for node in spec.traverse(deptype=all):
+            pkg_class = node.package_class
+            virtuals.update(v.name for v in pkg_class.provided)
+            virtuals.update(name for name in pkg_class.dependencies
+                            if spack.repo.path.is_virtual(name))
+
+        entry = {
+            'version': _cache_version,
+            'spec': spec.to_dict(all_deps=True),
+            'packages': dict((path, _package_dir_hash(path))
+                             for path in _package_dirs(spec)),
+            'providers': _providers(virtuals),
+        }
+        try:
+            self.file_cache.init_entry(key)
+            with self.file_cache.write_transaction(key) as (old, new):
+                sjson.dump(entry, new)
+        except (spack.error.SpackError, EnvironmentError) as e:
+            tty.debug('Concretization cache: cannot write {0}: {1}'.format(
+                key, str(e)))
+        self.prune()
+
+    def prune(self):
+        """Remove the least recently used entries if there are more than
+        ``_cache_max_entries``."""
+        directory = self.file_cache.cache_path('concretization')
+        try:
+            names = [n for n in os.listdir(directory) if n.endswith('.json')]
+        except OSError:
+            return
+        if len(names) <= _cache_max_entries:
+            return
+
+        def mtime(name):
+            try:
+                return os.path.getmtime(os.path.join(directory, name))
+            except OSError:
+                return 0
+
+        names.sort(key=mtime)
+        for name in names[:len(names) - _cache_pruned_entries]:
+            try:
+                self.file_cache.remove('concretization/' + name)
+            except (spack.error.SpackError, EnvironmentError):
+                pass
+
+
+def concretize_specs(specs, tests=False, jobs=1):
+    """Concretize many abstract specs at once, e.g. the roots of an
+    environment.
+
+    Work that does not depend on a particular spec is done once for the
+    whole batch: equal specs are concretized only once, specs already in
+    the concretization cache are taken from it, and the provider index
+    and the compilers configuration are loaded before the remaining specs
+    are concretized.  With more than one job, those specs are shared
+    among forked processes, which inherit everything loaded so far.
+
+    Args:
+        specs (list of Spec): abstract specs to be concretized
+        tests (list or bool): list of packages that will need test
+            dependencies, or True/False for test all/none
+        jobs (int): number of processes concretizing specs
+
+    Returns:
+        (list of Spec) concrete specs, in the same order as ``specs``
+    """
+    unique = list(llnl.util.lang.dedupe(specs))
+    concrete = {}
+
+    cache = concretization_cache()
+    if cache:
+        for spec in unique:
+            key = cache.key(spec, tests)
+            cached = cache.fetch(key) if key else None
+            if cached is not None:
+                concrete[spec] = cached
+
+    missing = [spec for spec in unique if spec not in concrete]
+    jobs = min(jobs, len(missing))
+    if jobs > 1:
+        # Load what every worker needs once, before forking
+        spack.repo.path.provider_index
+        spack.compilers.all_compiler_specs()
+
+        pool = multiprocessing.Pool(processes=jobs)
+        try:
+            results = pool.map(
+                _concretize_worker, [(s, tests) for s in missing], 1)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        for spec, result in zip(missing, results):
+            if isinstance(result, BaseException):
+                raise result
+            concrete[spec] = spack.spec.Spec.from_dict(result)
+            concrete[spec]._mark_concrete()
+    else:
+        for spec in missing:
+            concrete[spec] = _concretized(spec, tests)
+
+    return [concrete[spec] for spec in specs]
+
+
+def _concretized(spec, tests):
+    clone = spec.copy(caches=False)
+    clone.concretize(tests=tests)
+    return clone
+
+
+def _concretize_worker(args):
+    """Concretize a spec in a worker process of ``concretize_specs``.
+
+    Returns the concrete spec as a dictionary, or the error raised.
+    """
+    spec, tests = args
+    try:
+        return _concretized(spec, tests).to_dict(all_deps=True)
+    except Exception as e:
+        try:
+            # The error is raised again by the parent, it must survive
+            pickle.loads(pickle.dumps(e))
+            return e
+        except Exception:
+            return spack.error.SpackError(
+                '{0}: {1}'.format(type(e).__name__, str(e)))
+
+
+def concretization_cache():
+    """The concretization cache, or None if ``config:concretization_cache``
+    is disabled."""
+    if not spack.config.get('config:concretization_cache'):
+        return None
+    return ConcretizationCache(spack.caches.misc_cache)
+
+
+@llnl.util.lang.memoized
+def _spack_code_hash():
+    """Hash of the code of the modules concretization depends on.
+
+    The version of Spack is not enough: it does not change between commits
+    of a development branch.
+    """
+    hasher = hashlib.sha256()
+    for name in _cache_code_modules:
+        path = os.path.join(spack.paths.module_path, name)
+        hasher.update(name.encode('utf-8'))
+        hasher.update(checksum(hashlib.sha256, path).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def _package_dirs(spec):
+    """Directories of the packages of a concrete spec and of the packages
+    they inherit from."""
+    dirs = set()
+    for node in spec.traverse(deptype=all):
+        for cls in node.package_class.__mro__:
+            module = sys.modules.get(cls.__module__)
+            if module and module.__name__.startswith(
+                    spack.repo.repo_namespace + '.'):
+                dirs.add(os.path.dirname(module.__file__))
+    return dirs
+
+
+def _package_dir_hash(path):
+    """Hash of the files in a package directory, None if it is missing."""
+    if not os.path.isdir(path):
+        return None
+
+    hasher = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        filename = os.path.join(path, name)
+        if name.endswith('.pyc') or not os.path.isfile(filename):
+            continue
+        hasher.update(name.encode('utf-8'))
+        hasher.update(checksum(hashlib.sha256, filename).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def _providers(virtuals):
+    """Providers of each virtual package, as sorted lists of strings."""
+    providers = {}
+    for name in virtuals:
+        try:
+            specs = spack.repo.path.providers_for(name)
+        except spack.repo.UnknownPackageError:
+            specs = []
+        providers[name] = sorted(str(p) for p in specs)
+    return providers
+
+
 def _compiler_concretization_failure(compiler_spec, arch):
     # Distinguish between the case that there are compilers for
     # the arch but not with the given compiler spec and the case that
@@ -464,8 +767,9 @@ class NoCompilersForArchError(spack.error.SpackError):
                    (arch.platform_os, arch.target))
 
         available_os_target_strs = list()
-        for os, t in available_os_targets:
-            os_target_str = "%s-%s" % (os, t) if t else os
+        for operating_system, t in available_os_targets:
+            os_target_str = ("%s-%s" % (operating_system, t) if t
+                             else operating_system)
             available_os_target_strs.append(os_target_str)
         err_msg += (
             "\nCompilers are defined for the following"
@@ -30,6 +30,7 @@ schemas are in submodules of :py:mod:`spack.schema`.
 
 """
 
+import collections
 import copy
 import os
 import sys
@@ -131,6 +132,10 @@ class ConfigScope(object):
         _validate_section_name(section)
         return os.path.join(self.path, "%s.yaml" % section)
 
+    def section_files(self, section):
+        """Files a section is read from, to know when it may change."""
+        return [self.get_section_filename(section)]
+
     def get_section(self, section):
         if section not in self.sections:
             path   = self.get_section_filename(section)
@@ -183,6 +188,11 @@ class SingleFileScope(ConfigScope):
     def get_section_filename(self, section):
         return self.path
 
+    def clear(self):
+        """Empty cached config information."""
+        super(SingleFileScope, self).clear()
+        self._raw_data = None
+
     def get_section(self, section):
         # read raw data from the file, which looks like:
         # {
@@ -285,6 +295,9 @@ class InternalConfigScope(ConfigScope):
         raise NotImplementedError(
             "Cannot get filename for InternalConfigScope.")
 
+    def section_files(self, section):
+        return []
+
     def get_section(self, section):
         """Just reads from an internal dictionary."""
         if section not in self.sections:
@@ -317,11 +330,32 @@ class Configuration(object):
 
         """
         self.scopes = OrderedDict()
+
+        #: merged sections of all scopes by name, with the files they were
+        #: read from and the modification times and sizes of those files
+        self._merged_sections = {}
+
+        #: number of times each section was read, and was merged again
+        self.section_reads = collections.defaultdict(int)
+        self.section_merges = collections.defaultdict(int)
+
         for scope in scopes:
             self.push_scope(scope)
 
+    def read_stats(self):
+        """How often sections of this configuration were read.
+
+        Returns:
+            (dict): maps section names to tuples of the number of times
+                they were read, and the number of times they were merged
+                again from their scopes
+        """
+        return dict((section, (reads, self.section_merges[section]))
+                    for section, reads in self.section_reads.items())
+
     def push_scope(self, scope):
         """Add a higher precedence scope to the Configuration."""
+        self._merged_sections.clear()
         cmd_line_scope = None
         if self.scopes:
             highest_precedence_scope = list(self.scopes.values())[-1]
@@ -336,10 +370,12 @@ class Configuration(object):
 
     def pop_scope(self):
         """Remove the highest precedence scope and return it."""
+        self._merged_sections.clear()
         name, scope = self.scopes.popitem(last=True)
         return scope
 
     def remove_scope(self, scope_name):
+        self._merged_sections.clear()
         return self.scopes.pop(scope_name)
 
     @property
@@ -385,6 +421,7 @@ class Configuration(object):
         """Clears the caches for configuration files,
 
         This will cause files to be re-read upon the next request."""
+        self._merged_sections.clear()
         for scope in self.scopes.values():
             scope.clear()
 
@@ -400,6 +437,7 @@ class Configuration(object):
         """
         _validate_section_name(section)  # validate section name
         scope = self._validate_scope(scope)  # get ConfigScope object
+        self._merged_sections.pop(section, None)
 
         # read only the requested section's data.
         scope.sections[section] = {section: update_data}
@@ -428,14 +466,45 @@ class Configuration(object):
              }
            }
 
+        The merged contents of all scopes are cached until scopes are
+        added or removed, the section is updated, or one of the files it
+        was read from is modified.
+
         """
         _validate_section_name(section)
-
-        if scope is None:
-            scopes = self.scopes.values()
-        else:
-            scopes = [self._validate_scope(scope)]
-
+        self.section_reads[section] += 1
+
+        if scope is not None:
+            return self._merge_section(
+                section, [self._validate_scope(scope)])
+
+        cached = self._merged_sections.get(section)
+        changed = _changed_files(cached[1]) if cached else []
+        if cached is None or changed:
+            # Read the section again from the scopes whose files changed
+            for changed_scope, _, _ in changed:
+                changed_scope.clear()
+
+            files = [(s, path, _file_stamp(path))
+                     for s in self.scopes.values()
+                     for path in s.section_files(section)]
+            self.section_merges[section] += 1
+            cached = (self._merge_section(section, self.scopes.values()),
+                      files)
+            self._merged_sections[section] = cached
+
+        # Callers may modify what they get, but not the cached section:
+        # like merging did, copy the section and each of its values
+        section_data = copy.copy(cached[0])
+        if isinstance(section_data, dict):
+            for key in list(section_data):
+                section_data[key] = copy.copy(section_data[key])
+        elif isinstance(section_data, list):
+            section_data[:] = [copy.copy(x) for x in section_data]
+        return section_data
+
+    def _merge_section(self, section, scopes):
+        """Merge a section of some scopes, without its top-level key."""
         merged_section = syaml.syaml_dict()
         for scope in scopes:
             # read potentially cached data from the scope.
@@ -638,6 +707,20 @@ def scopes():
     return config.scopes
 
 
+def _file_stamp(path):
+    """Modification time and size of a file, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def _changed_files(files):
+    """Files in a list of (scope, path, stamp) tuples that were modified."""
+    return [f for f in files if _file_stamp(f[1]) != f[2]]
+
+
 def _validate_section_name(section):
     """Exit if the section is not a valid section."""
     if section not in section_schemas:
@@ -19,17 +19,45 @@ as the authoritative database of packages in Spack.  This module
 provides a cache and a sanity checking mechanism for what is in the
 filesystem.
 
+The database is stored in ``index.records``, a text file with a header
+line followed by one line per install record::
+
+    spack-db<TAB><version><TAB><generation>
+    <dag hash><TAB><package name><TAB><install record as JSON>
+    ...
+    commit
+
+Reading the index only splits it into lines: a record is parsed, and its
+spec built, the first time it is accessed.
+
+Write transactions append the records they added, changed or removed
+(removals have an empty name and record), followed by a ``commit`` line,
+so their cost does not depend on the size of the database.  Lines of an
+unfinished transaction are ignored.  When the appended lines outnumber
+the records in the database, the whole index is rewritten (compacted)
+under a new generation.  Readers that already know a generation only
+read the transactions appended since they last looked at the file.
+
+Older databases stored in a single JSON (``index.json``) or YAML
+(``index.yaml``) document are converted to this format the first time
+they are read.
+
 """
+import collections
 import datetime
+import itertools
+import json
+import multiprocessing
 import time
 import os
 import sys
 import socket
 import contextlib
+import uuid
 from six import string_types
 from six import iteritems
 
-from ruamel.yaml.error import MarkedYAMLError, YAMLError
+from ruamel.yaml.error import MarkedYAMLError
 
 import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp
@@ -51,7 +79,25 @@ from spack.util.lock import Lock, WriteTransaction, ReadTransaction, LockError
 _db_dirname = '.spack-db'
 
 # DB version.  This is stuck in the DB file to track changes in format.
-_db_version = Version('0.9.3')
+_db_version = Version('0.9.4')
+
+# Last version of the DB stored as a single JSON or YAML document.
+_monolithic_db_version = Version('0.9.3')
+
+# First field of the header line of the records index
+_records_header = 'spack-db'
+
+# Line ending the records written by a transaction
+_commit_line = 'commit\n'
+
+# Spec files a reindex worker reads before sending them back
+_reindex_batch_size = 64
+
+# Seconds between two checks of the reindex workers
+_reindex_poll_interval = 0.05
+
+# Seconds between two progress reports of a reindex
+_reindex_report_interval = 5.0
 
 # Timeout for spack database locks in seconds
 _db_lock_timeout = 120
@@ -134,6 +180,289 @@ class InstallRecord(object):
         d.pop('spec', None)
         return InstallRecord(spec, **d)
 
+    def update(self, dictionary):
+        """Update the fields of the record, except its spec."""
+        for key, value in dictionary.items():
+            if key != 'spec':
+                setattr(self, key, value)
+
+    def state(self):
+        """Tuple of the fields that can change once a record exists."""
+        return (self.path, self.installed, self.ref_count, self.explicit,
+                self.installation_time)
+
+
+class _RecordMap(collections.MutableMapping):
+    """Install records keyed by DAG hash, built when first accessed.
+
+    Records read from the index are kept in serialized form until they
+    are accessed.  The first access parses a record and builds its spec,
+    after building the records of its dependencies, so all the specs in
+    the map share their dependency nodes, as in a Merkle DAG.
+
+    Specs only know about the dependents that have been built already.
+    Callers that need the dependents of a spec must call :meth:`hydrate`
+    first.
+
+    The map also keeps track of the records that changed since it was
+    last saved, see :meth:`changes`.
+
+    Hashes are indexed by package name, and then by compiler name and by
+    architecture, so queries can look at a few candidates instead of
+    building every record, see :meth:`select`.
+    """
+
+    def __init__(self, serialized=None, index_path=None):
+        #: hash -> (package name, record as a JSON string)
+        self._serialized = serialized or {}
+        #: hash -> InstallRecord, for the records built so far
+        self._records = {}
+        self._index_path = index_path
+
+        #: hash -> state of the built records, as saved in the index
+        self._saved = {}
+        #: hashes of the records removed since the map was saved
+        self._removed = set()
+
+        #: package name -> hashes of its records
+        self._by_name = collections.defaultdict(set)
+        for key, (name, _) in self._serialized.items():
+            self._by_name[name].add(key)
+        #: package name -> (compiler name -> hashes, arch -> hashes),
+        #: computed when first needed
+        self._buckets = {}
+
+    def __getitem__(self, key):
+        record = self._records.get(key)
+        if record is None:
+            if key not in self._serialized:
+                raise KeyError(key)
+            record = self._build(key)
+        return record
+
+    def __setitem__(self, key, record):
+        self._serialized.pop(key, None)
+        self._saved.pop(key, None)
+        self._removed.discard(key)
+        self._records[key] = record
+        self._index(key, record.spec.name)
+
+    def __delitem__(self, key):
+        name = self.name(key)
+        if key in self._records:
+            del self._records[key]
+            self._saved.pop(key, None)
+        else:
+            del self._serialized[key]
+        self._removed.add(key)
+        self._unindex(key, name)
+
+    def __contains__(self, key):
+        return key in self._records or key in self._serialized
+
+    def __iter__(self):
+        return itertools.chain(list(self._records), list(self._serialized))
+
+    def __len__(self):
+        return len(self._records) + len(self._serialized)
+
+    def name(self, key):
+        """Name of the package of a record, without building it."""
+        if key in self._serialized:
+            return self._serialized[key][0]
+        return self._records[key].spec.name
+
+    def serialized(self, key):
+        """JSON string of a record, reusing the one read if not built."""
+        if key in self._serialized:
+            return self._serialized[key][1]
+        return json.dumps(self._records[key].to_dict(), separators=(',', ':'))
+
+    def select(self, name=None, compiler=None, arch=None):
+        """Hashes of the records that may match a query, without building
+        any record.
+
+        Records with no compiler or no architecture are always selected,
+        as they satisfy any compiler or architecture constraint.
+
+        Args:
+            name (str): package name, or None for all packages
+            compiler (str): compiler name, or None for any compiler
+            arch (tuple): platform, operating system and target, any of
+                which may be None, or None for any architecture
+
+        Returns:
+            (set) hashes of the candidate records
+        """
+        if name is None:
+            keys = set()
+            for name in list(self._by_name):
+                keys |= self.select(name, compiler, arch)
+            return keys
+
+        keys = self._by_name.get(name)
+        if not keys:
+            return set()
+
+        keys = set(keys)
+        if compiler is None and arch is None:
+            return keys
+
+        by_compiler, by_arch = self._bucket(name)
+        if compiler is not None:
+            keys &= by_compiler.get(compiler, set()) | by_compiler.get(
+                None, set())
+        if arch is not None:
+            matching = set()
+            for node_arch, arch_keys in by_arch.items():
+                if node_arch is None or all(
+                        a is None or b is None or a == b
+                        for a, b in zip(arch, node_arch)):
+                    matching |= arch_keys
+            keys &= matching
+        return keys
+
+    def hydrate(self):
+        """Build all the records, linking every spec to its dependents."""
+        for key in list(self._serialized):
+            if key in self._serialized:
+                self._build(key)
+
+    def changes(self):
+        """Records added, changed or removed since the map was saved.
+
+        Returns:
+            list of (hash, record) tuples, where record is None for the
+            records that were removed
+        """
+        changed = [(key, None) for key in self._removed]
+        changed.extend((key, record) for key, record in self._records.items()
+                       if self._saved.get(key) != record.state())
+        return sorted(changed, key=lambda c: c[0])
+
+    def mark_saved(self):
+        """Record that the map is now the same as the index."""
+        self._saved = dict(
+            (key, record.state()) for key, record in self._records.items())
+        self._removed.clear()
+
+    def load(self, key, name, serialized):
+        """Load one record from the index, replacing the current one."""
+        self._removed.discard(key)
+        record = self._records.get(key)
+        if record is not None:
+            # Keep the spec, which may be shared with other records
+            record.update(sjson.load(serialized))
+            self._saved[key] = record.state()
+        else:
+            self._serialized[key] = (name, serialized)
+            self._index(key, name)
+
+    def unload(self, key):
+        """Remove a record deleted from the index."""
+        if key in self:
+            self._unindex(key, self.name(key))
+        self._serialized.pop(key, None)
+        self._records.pop(key, None)
+        self._saved.pop(key, None)
+        self._removed.discard(key)
+
+    def _index(self, key, name):
+        if key not in self._by_name[name]:
+            self._by_name[name].add(key)
+            self._buckets.pop(name, None)
+
+    def _unindex(self, key, name):
+        keys = self._by_name.get(name)
+        if keys is not None and key in keys:
+            keys.discard(key)
+            if not keys:
+                del self._by_name[name]
+            self._buckets.pop(name, None)
+
+    def _bucket(self, name):
+        """Hashes of the records of a package by compiler and by arch."""
+        if name not in self._buckets:
+            by_compiler = collections.defaultdict(set)
+            by_arch = collections.defaultdict(set)
+            for key in self._by_name[name]:
+                compiler, arch = self._peek(key)
+                by_compiler[compiler].add(key)
+                by_arch[arch].add(key)
+            self._buckets[name] = (by_compiler, by_arch)
+        return self._buckets[name]
+
+    def _peek(self, key):
+        """Compiler name and architecture of a record, without building it.
+
+        The architecture is a (platform, operating system, target) tuple.
+        """
+        record = self._records.get(key)
+        if record is not None:
+            spec = record.spec
+            compiler = spec.compiler.name if spec.compiler else None
+            node_arch = spec.architecture
+        else:
+            name, serialized = self._serialized[key]
+            try:
+                node = sjson.load(serialized)['spec'][name]
+                compiler = node.get('compiler', {}).get('name')
+                node_arch = None
+                if 'arch' in node:
+                    node_arch = spack.spec.ArchSpec.from_dict(node)
+            except Exception as e:
+                msg = ("Invalid record in Spack database: "
+                       "hash: %s, cause: %s: %s")
+                msg %= (key, type(e).__name__, str(e))
+                raise CorruptDatabaseError(msg, self._index_path)
+
+        arch = None
+        if node_arch:
+            arch = (node_arch.platform, node_arch.platform_os,
+                    node_arch.target)
+        return compiler, arch
+
+    def _build(self, key):
+        try:
+            record_dict = sjson.load(self._serialized[key][1])
+
+            # Install records don't include hash with spec, so we add it
+            # in here to ensure it is read properly.
+            spec_dict = record_dict['spec']
+            for name in spec_dict:
+                spec_dict[name]['hash'] = key
+            spec = spack.spec.Spec.from_node_dict(spec_dict)
+
+            dependencies = []
+            yaml_deps = spec_dict[spec.name].get('dependencies', {})
+            for dname, dhash, dtypes in spack.spec.Spec.read_yaml_dep_specs(
+                    yaml_deps):
+                if dhash not in self:
+                    tty.warn("Missing dependency not in database: ",
+                             "%s needs %s-%s" % (
+                                 spec.cformat('$_$/'), dname, dhash[:7]))
+                    continue
+                dependencies.append((self[dhash].spec, dtypes))
+
+        except Exception as e:
+            msg = ("Invalid record in Spack database: "
+                   "hash: %s, cause: %s: %s")
+            msg %= (key, type(e).__name__, str(e))
+            raise CorruptDatabaseError(msg, self._index_path)
+
+        for child, dtypes in dependencies:
+            spec._add_dependency(child, dtypes)
+
+        # Mark concrete only once dependencies are connected, so hashes
+        # are not cached prematurely.
+        spec._mark_concrete()
+
+        record = InstallRecord.from_dict(spec, record_dict)
+        del self._serialized[key]
+        self._records[key] = record
+        self._saved[key] = record.state()
+        return record
+
 
 class Database(object):
 
@@ -150,12 +479,12 @@ class Database(object):
         under ``root/.spack-db``, which is created if it does not
         exist.  This is the ``db_dir``.
 
-        The Database will attempt to read an ``index.json`` file in
+        The Database will attempt to read an ``index.records`` file in
         ``db_dir``.  If it does not find one, it will fall back to read
-        an ``index.yaml`` if one is present.  If that does not exist, it
-        will create a database when needed by scanning the entire
-        Database root for ``spec.yaml`` files according to Spack's
-        ``DirectoryLayout``.
+        an ``index.json`` or an ``index.yaml`` if one is present, and
+        convert it.  If none exists, it will create a database when
+        needed by scanning the entire Database root for ``spec.yaml``
+        files according to Spack's ``DirectoryLayout``.
 
         Caller may optionally provide a custom ``db_dir`` parameter
         where data will be stored.  This is intended to be used for
@@ -173,7 +502,8 @@ class Database(object):
 
         # Set up layout of database files within the db dir
         self._old_yaml_index_path = os.path.join(self._db_dir, 'index.yaml')
-        self._index_path = os.path.join(self._db_dir, 'index.json')
+        self._old_json_index_path = os.path.join(self._db_dir, 'index.json')
+        self._index_path = os.path.join(self._db_dir, 'index.records')
         self._lock_path = os.path.join(self._db_dir, 'lock')
 
         # This is for other classes to use to lock prefix directories.
@@ -196,7 +526,17 @@ class Database(object):
                   str(timeout_format_str)))
         self.lock = Lock(self._lock_path,
                          default_timeout=self.db_lock_timeout)
-        self._data = {}
+        self._data = _RecordMap(index_path=self._index_path)
+
+        # (inode, mtime, size) of the index when last read or written. The
+        # in-memory records are reused while the index file is unchanged.
+        self._index_stamp = None
+        # generation of the index, changed each time it is rewritten
+        self._index_generation = None
+        # offset in the index after the last committed transaction
+        self._index_offset = 0
+        # number of records appended to the index since it was rewritten
+        self._journal_length = 0
 
         # whether there was an error at the start of a read transaction
         self._error = None
@@ -235,9 +575,9 @@ class Database(object):
         return self._prefix_locks[prefix]
 
     @contextlib.contextmanager
-    def prefix_read_lock(self, spec):
+    def prefix_read_lock(self, spec, timeout=None):
         prefix_lock = self.prefix_lock(spec)
-        prefix_lock.acquire_read()
+        prefix_lock.acquire_read(timeout)
 
         try:
             yield self
@@ -252,9 +592,9 @@ class Database(object):
             prefix_lock.release_read()
 
     @contextlib.contextmanager
-    def prefix_write_lock(self, spec):
+    def prefix_write_lock(self, spec, timeout=None):
         prefix_lock = self.prefix_lock(spec)
-        prefix_lock.acquire_write()
+        prefix_lock.acquire_write(timeout)
 
         try:
             yield self
@@ -269,31 +609,113 @@ class Database(object):
             prefix_lock.release_write()
 
     def _write_to_file(self, stream):
-        """Write out the databsae to a JSON file.
+        """Write out the whole database to a records file.
+
+        Records that were never accessed are written back exactly as they
+        were read.
 
         This function does not do any locking or transactions.
         """
-        # map from per-spec hash code to installation record.
-        installs = dict((k, v.to_dict()) for k, v in self._data.items())
-
-        # database includes installation list and version.
-
         # NOTE: this DB version does not handle multiple installs of
         # the same spec well.  If there are 2 identical specs with
         # different paths, it can't differentiate.
         # TODO: fix this before we support multiple install locations.
-        database = {
-            'database': {
-                'installs': installs,
-                'version': str(_db_version)
-            }
-        }
+        self._index_generation = uuid.uuid4().hex
+        stream.write('%s\t%s\t%s\n' % (
+            _records_header, _db_version, self._index_generation))
+        for key in sorted(self._data):
+            stream.write(_record_line(
+                key, self._data.name(key), self._data.serialized(key)))
+        stream.write(_commit_line)
 
-        try:
-            sjson.dump(database, stream)
-        except YAMLError as e:
-            raise syaml.SpackYAMLError(
-                "error writing YAML database:", str(e))
+    def _append_to_file(self, stream, changes):
+        """Append the records changed by a transaction to a records file.
+
+        This function does not do any locking or transactions.
+        """
+        lines = []
+        for key, record in changes:
+            if record is None:
+                lines.append(_record_line(key, '', ''))
+            else:
+                lines.append(_record_line(
+                    key, record.spec.name, self._data.serialized(key)))
+        lines.append(_commit_line)
+
+        # One write, so that a failure is unlikely to leave half a line
+        stream.write(''.join(lines))
+
+    def _read_from_records(self, path):
+        """Fill the database from a records file, without building specs.
+
+        If the file is the one read last time, only the transactions
+        committed since then are read.
+
+        Does not do any locking.
+        """
+        with open(path) as f:
+            # Opening the file makes sure its attributes are up to date,
+            # even on network filesystems with attribute caching.
+            stamp = _file_stamp(f)
+            if stamp == self._index_stamp:
+                return
+
+            header = f.readline().rstrip('\n').split('\t')
+            if len(header) < 2 or header[0] != _records_header:
+                raise CorruptDatabaseError(
+                    "Spack database is corrupt: invalid header", path)
+
+            version = Version(header[1])
+            if version > _db_version:
+                raise InvalidDatabaseVersionError(_db_version, version)
+
+            if len(header) != 3:
+                raise CorruptDatabaseError(
+                    "Spack database is corrupt: invalid header", path)
+
+            generation = header[2]
+            if (self._index_stamp is not None and
+                    generation == self._index_generation and
+                    stamp[0] == self._index_stamp[0] and
+                    stamp[2] >= self._index_offset):
+                # Same file, with more transactions appended to it
+                data = self._data
+                offset = self._index_offset
+                f.seek(offset)
+                snapshot = False
+            else:
+                # The first transaction is the snapshot written last time
+                # the index was compacted.
+                data = _RecordMap(index_path=self._index_path)
+                offset = f.tell()
+                self._journal_length = 0
+                snapshot = True
+
+            committed = []
+            for line in f.read().splitlines(True):
+                if line == _commit_line:
+                    for key, name, serialized, _ in committed:
+                        if name:
+                            data.load(key, name, serialized)
+                        else:
+                            data.unload(key)
+                    if not snapshot:
+                        self._journal_length += len(committed)
+                    snapshot = False
+                    offset += sum(len(c[3]) for c in committed) + len(line)
+                    committed = []
+                    continue
+
+                fields = line.rstrip('\n').split('\t', 2)
+                if len(fields) != 3 or not line.endswith('\n'):
+                    # Unfinished transaction at the end of the file
+                    break
+                committed.append(tuple(fields) + (line,))
+
+        self._data = data
+        self._index_generation = generation
+        self._index_offset = offset
+        self._index_stamp = stamp
 
     def _read_spec_from_dict(self, hash_key, installs):
         """Recursively construct a spec from a hash in a YAML database.
@@ -374,9 +796,9 @@ class Database(object):
 
         # TODO: better version checking semantics.
         version = Version(db['version'])
-        if version > _db_version:
+        if version > _monolithic_db_version:
             raise InvalidDatabaseVersionError(_db_version, version)
-        elif version < _db_version:
+        elif version < _monolithic_db_version:
             self.reindex(spack.store.layout)
             installs = dict((k, v.to_dict()) for k, v in self._data.items())
 
@@ -426,28 +848,39 @@ class Database(object):
         for hash_key, rec in data.items():
             rec.spec._mark_concrete()
 
-        self._data = data
+        self._data = _RecordMap(index_path=self._index_path)
+        self._data.update(data)
 
-    def reindex(self, directory_layout):
+    def reindex(self, directory_layout, jobs=1, progress=False):
         """Build database index from scratch based on a directory layout.
 
         Locks the DB if it isn't locked already.
 
+        Args:
+            directory_layout: layout of the install prefixes
+            jobs (int): number of processes reading the spec files of the
+                prefixes
+            progress (bool): report progress and throughput while reading
+                the spec files
         """
         # Special transaction to avoid recursive reindex calls and to
         # ignore errors if we need to rebuild a corrupt database.
         def _read_suppress_error():
             try:
                 if os.path.isfile(self._index_path):
-                    self._read_from_file(self._index_path)
+                    self._read_from_records(self._index_path)
+                    self._data.hydrate()
+                elif os.path.isfile(self._old_json_index_path):
+                    self._read_from_file(self._old_json_index_path)
             except CorruptDatabaseError as e:
                 self._error = e
-                self._data = {}
+                self._data = _RecordMap(index_path=self._index_path)
 
         transaction = WriteTransaction(
             self.lock, _read_suppress_error, self._write
         )
 
+        start = time.time()
         with transaction:
             if self._error:
                 tty.warn(
@@ -463,14 +896,34 @@ class Database(object):
             # instead, we would perpetuate errors over a reindex.
 
             old_data = self._data
+            # The index will be written again from scratch
+            self._index_stamp = None
             try:
                 # Initialize data in the reconstructed DB
-                self._data = {}
+                self._data = _RecordMap(index_path=self._index_path)
 
                 # Start inspecting the installed prefixes
                 processed_specs = set()
 
-                for spec in directory_layout.all_specs():
+                spec_files = directory_layout.all_spec_files()
+                installs = []
+                last_report = time.time()
+                for batch in _read_spec_files(
+                        directory_layout, spec_files, jobs):
+                    installs.extend(batch)
+                    now = time.time()
+                    if progress and now - last_report >= \
+                            _reindex_report_interval:
+                        tty.msg('Read {0} of {1} spec files [{2:.0f}/s]'
+                                .format(len(installs), len(spec_files),
+                                        len(installs) / (now - start)))
+                        last_report = now
+
+                # Prefixes holding their own spec file need no other check
+                checked = set(spec.dag_hash()
+                              for spec, _, in_place in installs if in_place)
+
+                for spec, inst_time, _ in installs:
                     # Try to recover explicit value from old DB, but
                     # default it to True if DB was corrupt. This is
                     # just to be conservative in case a command like
@@ -478,7 +931,6 @@ class Database(object):
                     tty.debug(
                         'RECONSTRUCTING FROM SPEC.YAML: {0}'.format(spec))
                     explicit = True
-                    inst_time = os.stat(spec.prefix).st_ctime
                     if old_data is not None:
                         old_info = old_data.get(spec.dag_hash())
                         if old_info is not None:
@@ -487,7 +939,8 @@ class Database(object):
 
                     extra_args = {
                         'explicit': explicit,
-                        'installation_time': inst_time
+                        'installation_time': inst_time,
+                        'checked': checked
                     }
                     self._add(spec, directory_layout, **extra_args)
 
@@ -539,6 +992,11 @@ class Database(object):
                 self._data = old_data
                 raise
 
+        if progress:
+            elapsed = max(time.time() - start, 1e-6)
+            tty.msg('Reindexed {0} prefixes in {1:.2f}s [{2:.0f}/s]'.format(
+                len(spec_files), elapsed, len(spec_files) / elapsed))
+
     def _check_ref_counts(self):
         """Ensure consistency of reference counts in the DB.
 
@@ -572,13 +1030,31 @@ class Database(object):
         database *may* be left in an inconsistent state.  It will be consistent
         after the start of the next transaction, when it read from disk again.
 
+        Changes are appended to the index read at the start of the
+        transaction, unless the journal of appended records grew larger
+        than the database: then the whole index is written again.
+
         This routine does no locking.
 
         """
-        # Do not write if exceptions were raised
+        # Do not write if exceptions were raised, and make sure that the
+        # in-memory records are read again by the next transaction.
         if type is not None:
+            self._index_stamp = None
             return
 
+        can_append = (
+            self._index_stamp is not None and
+            self._index_stamp[2] == self._index_offset and
+            os.path.isfile(self._index_path))
+        if can_append:
+            changes = self._data.changes()
+            if not changes:
+                return
+            if self._journal_length + len(changes) <= len(self._data):
+                self._append(changes)
+                return
+
         temp_file = self._index_path + (
             '.%s.%s.temp' % (socket.getfqdn(), os.getpid()))
 
@@ -586,34 +1062,71 @@ class Database(object):
         try:
             with open(temp_file, 'w') as f:
                 self._write_to_file(f)
+                f.flush()
+                self._index_stamp = _file_stamp(f)
             os.rename(temp_file, self._index_path)
         except BaseException:
             # Clean up temp file if something goes wrong.
+            self._index_stamp = None
             if os.path.exists(temp_file):
                 os.remove(temp_file)
             raise
 
+        self._index_offset = self._index_stamp[2]
+        self._journal_length = 0
+        self._data.mark_saved()
+
+    def _append(self, changes):
+        """Append the changes of a transaction to the index.
+
+        This routine does no locking.
+        """
+        try:
+            with open(self._index_path, 'a') as f:
+                self._append_to_file(f, changes)
+                f.flush()
+                self._index_stamp = _file_stamp(f)
+        except BaseException:
+            # The index may end with an unfinished transaction now
+            self._index_stamp = None
+            raise
+
+        self._index_offset = self._index_stamp[2]
+        self._journal_length += len(changes)
+        self._data.mark_saved()
+
     def _read(self):
         """Re-read Database from the data in the set location.
 
+        Records already in memory are kept if the index did not change
+        since it was last read or written by this process.
+
         This does no locking, with one exception: it will automatically
-        migrate an index.yaml to an index.json if possible. This requires
-        taking a write lock.
+        migrate an index.json, an index.yaml or an older index.records to
+        the current format if possible. This requires taking a write lock.
 
         """
         if os.path.isfile(self._index_path):
-            # Read from JSON file if a JSON database exists
-            self._read_from_file(self._index_path, format='json')
+            self._read_from_records(self._index_path)
 
-        elif os.path.isfile(self._old_yaml_index_path):
-            if os.access(self._db_dir, os.R_OK | os.W_OK):
-                # if we can write, then read AND write a JSON file.
-                self._read_from_file(self._old_yaml_index_path, format='yaml')
+            # if we can write, then convert older records to the new format.
+            if (self._index_stamp is None and
+                    os.access(self._db_dir, os.R_OK | os.W_OK)):
                 with WriteTransaction(self.lock):
                     self._write(None, None, None)
+
+        elif (os.path.isfile(self._old_json_index_path) or
+              os.path.isfile(self._old_yaml_index_path)):
+            if os.path.isfile(self._old_json_index_path):
+                self._read_from_file(self._old_json_index_path, format='json')
             else:
-                # Read chck for a YAML file if we can't find JSON.
                 self._read_from_file(self._old_yaml_index_path, format='yaml')
+            self._index_stamp = None
+
+            # if we can write, then convert to the records format.
+            if os.access(self._db_dir, os.R_OK | os.W_OK):
+                with WriteTransaction(self.lock):
+                    self._write(None, None, None)
 
         else:
             # The file doesn't exist, try to traverse the directory.
@@ -627,7 +1140,8 @@ class Database(object):
             spec,
             directory_layout=None,
             explicit=False,
-            installation_time=None
+            installation_time=None,
+            checked=()
     ):
         """Add an install record for this spec to the database.
 
@@ -652,6 +1166,11 @@ class Database(object):
                 installation_time
                     Date and time of installation
 
+                checked
+                    Hashes of specs known to be installed in
+                    ``directory_layout``, whose prefixes are not checked
+                    again
+
         """
         if not spec.concrete:
             raise NonConcreteSpecAddError(
@@ -665,7 +1184,8 @@ class Database(object):
             if dkey not in self._data:
                 extra_args = {
                     'explicit': False,
-                    'installation_time': installation_time
+                    'installation_time': installation_time,
+                    'checked': checked
                 }
                 self._add(dep, directory_layout, **extra_args)
 
@@ -676,7 +1196,8 @@ class Database(object):
             if not spec.external and directory_layout:
                 path = directory_layout.path_for_spec(spec)
                 try:
-                    directory_layout.check_installed(spec)
+                    if key not in checked:
+                        directory_layout.check_installed(spec)
                     installed = True
                 except DirectoryLayoutError as e:
                     tty.warn(
@@ -793,6 +1314,10 @@ class Database(object):
         if direction not in ('parents', 'children'):
             raise ValueError("Invalid direction: %s" % direction)
 
+        if direction == 'parents':
+            # Dependents are only linked to specs that have been built
+            self._data.hydrate()
+
         relatives = set()
         for spec in self.query(spec):
             if transitive:
@@ -910,15 +1435,36 @@ class Database(object):
                 else:
                     return []
 
-            # Abstract specs require more work -- currently we test
-            # against everything.
+            # Abstract specs require more work -- the records that cannot
+            # match the name, compiler or architecture of the query are
+            # left out with the indexes of the database, and the remaining
+            # ones are tested one by one.
+            if isinstance(query_spec, string_types):
+                query_spec = spack.spec.Spec(query_spec)
+
+            if query_spec is any or query_spec.virtual:
+                keys = list(self._data)
+            else:
+                compiler, arch = None, None
+                if query_spec.compiler:
+                    compiler = query_spec.compiler.name
+                if query_spec.architecture:
+                    arch = (query_spec.architecture.platform,
+                            query_spec.architecture.platform_os,
+                            query_spec.architecture.target)
+                    if not any(arch):
+                        arch = None
+                keys = self._data.select(query_spec.name, compiler, arch)
+
+            if hashes is not None:
+                keys = [key for key in keys if key in hashes]
+
             results = []
             start_date = start_date or datetime.datetime.min
             end_date = end_date or datetime.datetime.max
 
-            for key, rec in self._data.items():
-                if hashes is not None and rec.spec.dag_hash() not in hashes:
-                    continue
+            for key in keys:
+                rec = self._data[key]
 
                 if installed is not any and rec.installed != installed:
                     continue
@@ -959,6 +1505,96 @@ class Database(object):
             return key in self._data and not self._data[key].installed
 
 
+def _read_spec_files(directory_layout, paths, jobs):
+    """Read the spec files of install prefixes, for a reindex.
+
+    With more than one job, the files are shared among forked processes
+    that send the specs back in batches.
+
+    Yields:
+        lists of (spec, installation time, in_place) tuples, where
+        ``in_place`` is True if the spec file is in the prefix that
+        ``directory_layout`` gives to the spec
+    """
+    if jobs <= 1 or len(paths) <= _reindex_batch_size:
+        for i in range(0, len(paths), _reindex_batch_size):
+            yield [_read_spec_file(directory_layout, path)
+                   for path in paths[i:i + _reindex_batch_size]]
+        return
+
+    workers = []
+    try:
+        for i in range(jobs):
+            parent_pipe, child_pipe = multiprocessing.Pipe(False)
+            process = multiprocessing.Process(
+                target=_reindex_worker,
+                args=(directory_layout, paths[i::jobs], child_pipe))
+            process.start()
+            child_pipe.close()
+            workers.append((process, parent_pipe))
+
+        while workers:
+            received = False
+            for process, pipe in list(workers):
+                if pipe.poll():
+                    message = pipe.recv()
+                elif not process.is_alive():
+                    message = SpackError(
+                        'Reindex worker exited with code {0}'.format(
+                            process.exitcode))
+                else:
+                    continue
+
+                received = True
+                if isinstance(message, BaseException):
+                    raise message
+                elif message is None:
+                    process.join()
+                    pipe.close()
+                    workers.remove((process, pipe))
+                else:
+                    yield message
+
+            if not received:
+                time.sleep(_reindex_poll_interval)
+    finally:
+        for process, pipe in workers:
+            process.terminate()
+            process.join()
+
+
+def _read_spec_file(directory_layout, path):
+    spec = directory_layout.read_spec(path)
+    inst_time = os.stat(directory_layout.path_for_spec(spec)).st_ctime
+    in_place = directory_layout.spec_file_path(spec) == path
+    return spec, inst_time, in_place
+
+
+def _reindex_worker(directory_layout, paths, pipe):
+    """Body of a reindex worker: read spec files and send them back."""
+    try:
+        for i in range(0, len(paths), _reindex_batch_size):
+            pipe.send([_read_spec_file(directory_layout, path)
+                       for path in paths[i:i + _reindex_batch_size]])
+        pipe.send(None)
+    except Exception as e:
+        if not isinstance(e, SpackError):
+            e = SpackError('{0}: {1}'.format(type(e).__name__, e))
+        pipe.send(e)
+    finally:
+        pipe.close()
+
+
+def _record_line(key, name, serialized):
+    return '%s\t%s\t%s\n' % (key, name, serialized)
+
+
+def _file_stamp(f):
+    """Identify the contents of an open file by inode, mtime and size."""
+    stat = os.fstat(f.fileno())
+    return stat.st_ino, stat.st_mtime, stat.st_size
+
+
 class CorruptDatabaseError(SpackError):
     """Raised when errors are found while reading the database."""
 
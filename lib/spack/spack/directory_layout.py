@@ -52,6 +52,12 @@ class DirectoryLayout(object):
         """
         raise NotImplementedError()
 
+    def all_spec_files(self):
+        """To be implemented by subclasses to list the spec files of all the
+           directories within the root.
+        """
+        raise NotImplementedError()
+
     def relative_path_for_spec(self, spec):
         """Implemented by subclasses to return a relative path from the install
            root to a unique location for the provided spec."""
@@ -289,15 +295,18 @@ class YamlDirectoryLayout(DirectoryLayout):
             raise InconsistentInstallDirectoryError(
                 'Spec file in %s does not match hash!' % spec_file_path)
 
-    def all_specs(self):
+    def all_spec_files(self):
+        """Paths of the spec files of all the prefixes under the root."""
         if not os.path.isdir(self.root):
             return []
 
         path_elems = ["*"] * len(self.path_scheme.split(os.sep))
         path_elems += [self.metadata_dir, self.spec_file_name]
         pattern = os.path.join(self.root, *path_elems)
-        spec_files = glob.glob(pattern)
-        return [self.read_spec(s) for s in spec_files]
+        return glob.glob(pattern)
+
+    def all_specs(self):
+        return [self.read_spec(s) for s in self.all_spec_files()]
 
     def specs_by_hash(self):
         by_hash = {}
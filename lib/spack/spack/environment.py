@@ -13,6 +13,7 @@ import ruamel.yaml
 import llnl.util.filesystem as fs
 import llnl.util.tty as tty
 
+import spack.concretize
 import spack.error
 import spack.repo
 import spack.schema.env
@@ -553,7 +554,7 @@ class Environment(object):
                 del self.concretized_order[i]
                 del self.specs_by_hash[dag_hash]
 
-    def concretize(self, force=False):
+    def concretize(self, force=False, jobs=1):
         """Concretize user_specs in this environment.
 
         Only concretizes specs that haven't been concretized yet unless
@@ -565,6 +566,7 @@ class Environment(object):
         Arguments:
             force (bool): re-concretize ALL specs, even those that were
                already concretized
+            jobs (int): number of processes concretizing the user specs
         """
         if force:
             # Clear previously concretized specs
@@ -587,16 +589,20 @@ class Environment(object):
                 self._add_concrete_spec(s, concrete, new=False)
 
         # concretize any new user specs that we haven't concretized yet
-        for uspec in self.user_specs:
-            if uspec not in old_concretized_user_specs:
-                tty.msg('Concretizing %s' % uspec)
-                concrete = uspec.concretized()
-                self._add_concrete_spec(uspec, concrete)
-
-                # Display concretized spec to the user
-                sys.stdout.write(concrete.tree(
-                    recurse_dependencies=True, install_status=True,
-                    hashlen=7, hashes=True))
+        new_user_specs = [s for s in self.user_specs
+                          if s not in old_concretized_user_specs]
+        for uspec in new_user_specs:
+            tty.msg('Concretizing %s' % uspec)
+
+        concrete_specs = spack.concretize.concretize_specs(
+            new_user_specs, jobs=jobs)
+        for uspec, concrete in zip(new_user_specs, concrete_specs):
+            self._add_concrete_spec(uspec, concrete)
+
+            # Display concretized spec to the user
+            sys.stdout.write(concrete.tree(
+                recurse_dependencies=True, install_status=True,
+                hashlen=7, hashes=True))
 
     def install(self, user_spec, concrete_spec=None, **install_args):
         """Install a single spec into an environment.
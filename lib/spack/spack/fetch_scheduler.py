@@ -0,0 +1,227 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Concurrent fetching of the sources of many packages.
+
+The :class:`FetchScheduler` downloads the sources of a list of concrete
+specs, several at a time.  Fetching is mostly waiting for ``curl`` and the
+network, so downloads of URLs run in threads of the main Spack process.
+No more than ``connections_per_host`` downloads go to the same host at
+once, so that large DAGs do not hammer a single server.
+
+Version control fetchers change the working directory of the whole
+process to run ``git``, ``hg`` or ``svn``, so packages that need them
+are fetched in the main thread, while no other download is running.
+
+Downloads that fail are tried again a few times, waiting longer after
+each attempt.  Archives that were only partly downloaded stay in their
+``.part`` file and are resumed.  Every download goes through
+``PackageBase.do_fetch``, which checks the archive against its checksum
+as soon as it is complete and puts it in the fetch cache.
+"""
+import threading
+import time
+
+from six.moves import queue
+from six.moves.urllib.parse import urlparse
+
+import llnl.util.tty as tty
+
+import spack.config
+import spack.error
+import spack.fetch_strategy as fs
+
+
+#: Maximum number of downloads from the same host at the same time
+connections_per_host = 4
+
+#: Number of times a failed download is tried again
+retries = 3
+
+#: Seconds to wait before the first retry, doubled after every attempt
+retry_delay = 2.0
+
+#: Seconds to wait for a download to finish before looking for work
+_poll_interval = 0.1
+
+
+def _host(pkg):
+    """Host the sources of a package are normally downloaded from."""
+    try:
+        url = getattr(next(iter(pkg.fetcher)), 'url', None)
+    except (StopIteration, ValueError, spack.error.SpackError):
+        return None
+    return urlparse(url).netloc if url else None
+
+
+def _concurrent(pkg):
+    """Whether the sources of a package can be downloaded in a thread."""
+    try:
+        fetchers = list(pkg.fetcher)
+    except (ValueError, spack.error.SpackError):
+        return False
+    for resources in pkg.resources.values():
+        fetchers.extend(r.fetcher for r in resources)
+    return all(isinstance(f, fs.URLFetchStrategy) for f in fetchers)
+
+
+class FetchTask(object):
+    """The sources of a package to be downloaded."""
+
+    def __init__(self, pkg):
+        self.pkg = pkg
+        self.host = _host(pkg)
+        #: whether the package can be fetched while others are
+        self.concurrent = _concurrent(pkg)
+        #: number of times the download was started
+        self.attempts = 0
+        #: time before which the download must not be retried
+        self.not_before = 0
+
+
+class FetchScheduler(object):
+    """Download the sources of specs concurrently.
+
+    Args:
+        specs (list): concrete specs to fetch; the same spec is only
+            fetched once
+        jobs (int): maximum number of downloads at the same time
+        per_host (int): maximum number of downloads from one host, by
+            default ``connections_per_host``
+    """
+
+    def __init__(self, specs, jobs=1, per_host=None):
+        self.jobs = max(1, jobs or 1)
+        self.per_host = per_host or connections_per_host
+
+        self.tasks, seen = [], set()
+        for spec in specs:
+            if not spec.concrete:
+                raise ValueError("Can only fetch concrete packages.")
+            if spec.dag_hash() not in seen:
+                seen.add(spec.dag_hash())
+                self.tasks.append(FetchTask(spec.package))
+
+    def _ready(self, pending, hosts, running):
+        """First pending task that can start now, if any."""
+        now = time.time()
+        for task in pending:
+            if (task.not_before <= now and
+                    hosts.get(task.host, 0) < self.per_host and
+                    (task.concurrent or not running)):
+                return task
+
+    def _retry(self, task, error):
+        """Whether a failed download should be tried again."""
+        # Checksum problems will not go away by downloading again
+        if (not isinstance(error, fs.FetchError) or
+                isinstance(error, (fs.ChecksumError, fs.NoDigestError)) or
+                task.attempts > retries):
+            return False
+
+        delay = retry_delay * 2 ** (task.attempts - 1)
+        task.not_before = time.time() + delay
+        tty.msg('Fetching {0} failed, retrying in {1:g}s'.format(
+            task.pkg.spec.format('$_$@'), delay))
+        return True
+
+    def run(self, fetch=None, raise_errors=True):
+        """Fetch all the packages.
+
+        Downloads go on when one of them fails for good, so that as much
+        as possible is fetched.  The errors are raised at the end.
+
+        Args:
+            fetch (callable): called with the package of each task,
+                ``PackageBase.do_fetch`` by default
+            raise_errors (bool): if False, return the errors instead of
+                raising them
+
+        Returns:
+            (list) tuples of (spec, error) for the packages that could
+            not be fetched, if ``raise_errors`` is False
+        """
+        fetch = fetch or (lambda pkg: pkg.do_fetch())
+
+        # Packages without a known checksum may ask the user whether to
+        # fetch them anyway: fetch those first, one at a time.
+        checksum = spack.config.get('config:checksum')
+        pending, errors = [], []
+        for task in self.tasks:
+            if checksum and task.pkg.version not in task.pkg.versions:
+                try:
+                    fetch(task.pkg)
+                except Exception as e:
+                    if raise_errors:
+                        raise
+                    errors.append((task, e))
+            else:
+                pending.append(task)
+
+        # Progress bars of concurrent downloads would overwrite each other
+        show_progress = fs.show_progress
+        fs.show_progress = show_progress and self.jobs == 1
+
+        results = queue.Queue()
+        running, hosts = 0, {}
+        try:
+            while pending or running:
+                while running < self.jobs:
+                    task = self._ready(pending, hosts, running)
+                    if task is None:
+                        break
+                    pending.remove(task)
+                    hosts[task.host] = hosts.get(task.host, 0) + 1
+                    running += 1
+                    task.attempts += 1
+
+                    if not task.concurrent:
+                        # Nothing else is running: fetch it right here
+                        _worker(fetch, task, results)
+                        break
+
+                    thread = threading.Thread(
+                        target=_worker, args=(fetch, task, results))
+                    thread.daemon = True
+                    thread.start()
+
+                try:
+                    task, error = results.get(timeout=_poll_interval)
+                except queue.Empty:
+                    continue
+
+                running -= 1
+                hosts[task.host] -= 1
+                if error is None:
+                    continue
+                if self._retry(task, error):
+                    pending.append(task)
+                else:
+                    errors.append((task, error))
+        finally:
+            fs.show_progress = show_progress
+
+        if not raise_errors:
+            return [(t.pkg.spec, e) for t, e in errors]
+        elif len(errors) == 1:
+            raise errors[0][1]
+        elif errors:
+            raise fs.FetchError(
+                'Failed to fetch {0} packages'.format(len(errors)),
+                '\n'.join('{0}: {1}'.format(t.pkg.spec.format('$_$@'), e)
+                          for t, e in errors))
+
+
+def _worker(fetch, task, results):
+    """Fetch the package of a task, and report how it went."""
+    try:
+        fetch(task.pkg)
+        results.put((task, None))
+    except KeyboardInterrupt:
+        # Only raised in the main thread, where it must stop everything
+        raise
+    except BaseException as e:
+        # tty.die raises SystemExit, which would be lost with the thread
+        results.put((task, e))
@@ -26,6 +26,11 @@ import sys
 import re
 import shutil
 import copy
+import contextlib
+import hashlib
+import tempfile
+import threading
+import time
 from functools import wraps
 from six import string_types, with_metaclass
 
@@ -35,7 +40,9 @@ from llnl.util.filesystem import working_dir, mkdirp
 import spack.config
 import spack.error
 import spack.util.crypto as crypto
+import spack.util.file_cache
 import spack.util.pattern as pattern
+import spack.util.spack_json as sjson
 from spack.util.executable import which
 from spack.util.string import comma_and, quote
 from spack.version import Version, ver
@@ -45,6 +52,13 @@ from spack.util.compression import decompressor_for, extension
 #: List of all fetch strategies, created by FetchStrategy metaclass.
 all_strategies = []
 
+#: Whether curl shows a progress bar when Spack runs in a terminal
+show_progress = True
+
+#: Curl errors after which a partial download cannot be resumed: HTTP
+#: errors, servers that cannot resume and bad certificates
+_curl_restart_errors = (22, 33, 36, 60)
+
 
 def _needs_stage(fun):
     """Many methods on fetch strategies require a stage to be set
@@ -238,24 +252,30 @@ class URLFetchStrategy(FetchStrategy):
         if not spack.config.get('config:verify_ssl'):
             curl_args.append('-k')
 
-        if sys.stdout.isatty() and tty.msg_enabled():
+        if sys.stdout.isatty() and tty.msg_enabled() and show_progress:
             curl_args.append('-#')  # status bar when using a tty
         else:
             curl_args.append('-sS')  # just errors when not.
 
         curl_args += self.extra_curl_options
 
-        # Run curl but grab the mime type from the http headers
+        # Run curl but grab the mime type from the http headers.  Curl runs
+        # in the stage without changing the working directory of Spack, so
+        # that URLs can be fetched in threads.
         curl = self.curl
-        with working_dir(self.stage.path):
-            headers = curl(*curl_args, output=str, fail_on_error=False)
+        headers = curl(*curl_args, output=str, fail_on_error=False,
+                       cwd=self.stage.path)
 
         if curl.returncode != 0:
             # clean up archive on failure.
             if self.archive_file:
                 os.remove(self.archive_file)
 
-            if partial_file and os.path.exists(partial_file):
+            # Keep a partial download of a checksummed archive, so that
+            # the next attempt resumes it
+            if (partial_file and os.path.exists(partial_file) and
+                    (not self.digest or
+                     curl.returncode in _curl_restart_errors)):
                 os.remove(partial_file)
 
             if curl.returncode == 22:
@@ -412,6 +432,9 @@ class URLFetchStrategy(FetchStrategy):
 class CacheURLFetchStrategy(URLFetchStrategy):
     """The resource associated with a cache URL may be out of date."""
 
+    #: FsCache the archive is in, which is told when it is used
+    cache = None
+
     @_needs_stage
     def fetch(self):
         path = re.sub('^file://', '', self.url)
@@ -437,6 +460,9 @@ class CacheURLFetchStrategy(URLFetchStrategy):
                 os.remove(self.archive_file)
                 raise
 
+        if self.cache:
+            self.cache.record_hit(path)
+
         # Notify the user how we fetched.
         tty.msg('Using cached archive: %s' % path)
 
@@ -1093,10 +1119,90 @@ def from_list_url(pkg):
             tty.msg("Could not determine url from list_url.")
 
 
+#: Name of the index of an FsCache, in its root directory
+_cache_index_name = 'index.json'
+
+#: Version of the format of the index of an FsCache
+_cache_index_version = 1
+
+
+def _read_cache_index(stream):
+    """Contents of the index of an FsCache, or an empty index."""
+    index = {
+        'version': _cache_index_version,
+        'objects': {},
+        'stats': {'hits': 0, 'misses': 0, 'bytes_reused': 0,
+                  'bytes_deduplicated': 0, 'evictions': 0},
+    }
+    if stream:
+        try:
+            data = sjson.load(stream)['source_cache']
+            if data['version'] == _cache_index_version:
+                index['objects'] = data['objects']
+                index['stats'].update(data['stats'])
+        except (ValueError, KeyError, TypeError):
+            pass
+    return index
+
+
 class FsCache(object):
+    """Cache of downloaded archives, shared by all packages.
+
+    Each archive is stored once, under ``.objects`` and the sha256 of its
+    contents, and hard linked to the paths it has in a mirror, where the
+    cache fetchers look for it.  Identical archives of different packages
+    or versions take space only once.
 
-    def __init__(self, root):
+    An index in the root of the cache records the size of every archive,
+    the paths linked to it and when it was last used, along with hit and
+    miss counts.  When the cache grows over its size limit, the archives
+    used least recently are removed.
+
+    Args:
+        root (str): root directory of the cache
+        limit (int): maximum size of the cache in bytes, 0 for no limit
+    """
+
+    def __init__(self, root, limit=0):
         self.root = os.path.abspath(root)
+        self.limit = limit
+        self._file_cache = None
+        # Locks on files do not keep threads of the same process apart
+        self._lock = threading.Lock()
+
+    @property
+    def objects_path(self):
+        return os.path.join(self.root, '.objects')
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_path, digest[:2], digest)
+
+    @contextlib.contextmanager
+    def _index(self, write=False):
+        """Lock the index and yield its contents.
+
+        With ``write``, the changes made to the contents are saved.
+        """
+        mkdirp(self.root)
+        if self._file_cache is None:
+            self._file_cache = spack.util.file_cache.FileCache(self.root)
+        cache = self._file_cache
+
+        with self._lock:
+            cache.init_entry(_cache_index_name)
+            if write:
+                transaction = cache.write_transaction(_cache_index_name)
+                with transaction as (old, new):
+                    index = _read_cache_index(old)
+                    yield index
+                    sjson.dump({'source_cache': index}, new)
+            else:
+                if not os.path.exists(cache.cache_path(_cache_index_name)):
+                    yield _read_cache_index(None)
+                    return
+                transaction = cache.read_transaction(_cache_index_name)
+                with transaction as f:
+                    yield _read_cache_index(f)
 
     def store(self, fetcher, relative_dest):
         # skip fetchers that aren't cachable
@@ -1107,16 +1213,129 @@ class FsCache(object):
         if isinstance(fetcher, CacheURLFetchStrategy):
             return
 
-        dst = os.path.join(self.root, relative_dest)
-        mkdirp(os.path.dirname(dst))
-        fetcher.archive(dst)
+        # Archive next to the objects, so it can be moved among them
+        mkdirp(self.objects_path)
+        fd, tmp = tempfile.mkstemp(
+            dir=self.objects_path, prefix='.tmp-',
+            suffix='-' + os.path.basename(relative_dest))
+        os.close(fd)
+        try:
+            fetcher.archive(tmp)
+            digest = crypto.checksum(hashlib.sha256, tmp)
+            size = os.path.getsize(tmp)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        obj = self._object_path(digest)
+        with self._index(write=True) as index:
+            stats = index['stats']
+            stats['misses'] += 1
+
+            entry = index['objects'].get(digest)
+            if entry and os.path.exists(obj):
+                os.remove(tmp)
+                if relative_dest not in entry['paths']:
+                    stats['bytes_deduplicated'] += size
+            else:
+                mkdirp(os.path.dirname(obj))
+                os.rename(tmp, obj)
+                entry = {'size': size, 'paths': []}
+                index['objects'][digest] = entry
+            entry['atime'] = time.time()
+
+            self._unlink(index, relative_dest, digest)
+            dst = os.path.join(self.root, relative_dest)
+            mkdirp(os.path.dirname(dst))
+            try:
+                os.link(obj, dst)
+            except OSError:
+                shutil.copyfile(obj, dst)
+            entry['paths'].append(relative_dest)
+
+            self._evict(index, digest)
+
+    def _unlink(self, index, relative_path, keep):
+        """Remove a path of the cache, and the archives other than
+        ``keep`` that no path links to anymore."""
+        path = os.path.join(self.root, relative_path)
+        if os.path.lexists(path):
+            os.remove(path)
+
+        for digest, entry in list(index['objects'].items()):
+            if relative_path in entry['paths']:
+                entry['paths'].remove(relative_path)
+                if not entry['paths'] and digest != keep:
+                    self._remove_object(index, digest)
+
+    def _remove_object(self, index, digest):
+        entry = index['objects'].pop(digest)
+        for relative_path in entry['paths']:
+            path = os.path.join(self.root, relative_path)
+            if os.path.lexists(path):
+                os.remove(path)
+        obj = self._object_path(digest)
+        if os.path.exists(obj):
+            os.remove(obj)
+
+    def _evict(self, index, keep):
+        """Remove the archives used least recently, but not ``keep``,
+        until the cache fits in its size limit."""
+        if not self.limit:
+            return
+
+        objects = index['objects']
+        size = sum(e['size'] for e in objects.values())
+        by_atime = sorted(objects, key=lambda d: objects[d]['atime'])
+        for digest in by_atime:
+            if size <= self.limit:
+                break
+            if digest == keep:
+                continue
+            size -= objects[digest]['size']
+            self._remove_object(index, digest)
+            index['stats']['evictions'] += 1
+            tty.debug('Evicted {0} from the source cache'.format(digest))
+
+    def record_hit(self, path):
+        """Note that the archive at ``path`` was fetched from the cache."""
+        relative_path = os.path.relpath(path, self.root)
+        with self._index(write=True) as index:
+            index['stats']['hits'] += 1
+            for entry in index['objects'].values():
+                if relative_path in entry['paths']:
+                    entry['atime'] = time.time()
+                    index['stats']['bytes_reused'] += entry['size']
+                    break
+            else:
+                # Archives cached before there was an index
+                index['stats']['bytes_reused'] += os.path.getsize(path)
+
+    def stats(self):
+        """Statistics on the contents and use of the cache.
+
+        Returns:
+            (dict): the counters of the index, and the number of
+            ``archives``, ``paths`` and ``size`` of the cache
+        """
+        with self._index() as index:
+            objects = index['objects'].values()
+            stats = dict(index['stats'])
+            stats['archives'] = len(objects)
+            stats['paths'] = sum(len(e['paths']) for e in objects)
+            stats['size'] = sum(e['size'] for e in objects)
+            stats['limit'] = self.limit
+        return stats
 
     def fetcher(self, target_path, digest, **kwargs):
         path = os.path.join(self.root, target_path)
-        return CacheURLFetchStrategy(path, digest, **kwargs)
+        fetcher = CacheURLFetchStrategy(path, digest, **kwargs)
+        fetcher.cache = self
+        return fetcher
 
     def destroy(self):
         shutil.rmtree(self.root, ignore_errors=True)
+        self._file_cache = None
 
 
 class FetchError(spack.error.SpackError):
@@ -0,0 +1,291 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Concurrent installation of the nodes of a spec DAG.
+
+The :class:`BuildScheduler` keeps, for every node it has to install, the
+number of its dependencies that are still waiting to be installed (its
+in-degree).  Nodes whose in-degree drops to zero are ready, and are handed
+to worker processes until the requested number of concurrent builds is
+reached.  Each worker is forked from the main Spack process and installs
+exactly one node, usually through ``PackageBase.do_install`` with
+``install_deps=False``.  Prefixes are protected from other Spack instances
+by the usual per-prefix locks of the install database.
+
+In cooperative mode, several Spack processes (possibly on different nodes
+sharing the same install tree) can work on overlapping DAGs at the same
+time.  Before installing a node, a worker tries to claim it by taking the
+write lock on its prefix without waiting.  If another process holds the
+lock, the node is put aside and retried later, while the worker slot goes
+to some other ready node.  No coordinator is needed: the byte-range
+prefix locks of the install database are the only shared state.
+"""
+import multiprocessing
+import pickle
+import time
+
+import llnl.util.tty as tty
+
+import spack.config
+import spack.error
+import spack.store
+from spack.build_environment import InstallError
+from spack.util.lock import LockTimeoutError
+
+
+#: Seconds to wait between two checks of the running workers
+_poll_interval = 0.1
+
+#: Seconds to wait for a prefix lock when claiming a node
+_claim_timeout = 1e-3
+
+#: Seconds before claiming again a node that another process was building
+_claim_retry_interval = 5.0
+
+#: Sent back by a worker that could not claim its node
+_busy = 'busy'
+
+
+def concurrent_builds():
+    """Number of builds to run at once, from ``config:concurrent_builds``."""
+    return spack.config.get('config:concurrent_builds') or 1
+
+
+def jobs_per_build(concurrent):
+    """Share the build jobs from ``config:build_jobs`` among builds.
+
+    Args:
+        concurrent (int): number of builds running at the same time
+
+    Returns:
+        (int) number of make jobs each of the builds should use
+    """
+    jobs = spack.config.get('config:build_jobs') or multiprocessing.cpu_count()
+    return max(1, jobs // max(1, concurrent))
+
+
+class BuildTask(object):
+    """A node of the DAG to be installed, and its pending dependencies."""
+
+    def __init__(self, spec, dependencies, position):
+        self.spec = spec
+        self.key = spec.dag_hash()
+        #: hashes of the dependencies that are not installed yet
+        self.dependencies = set(dependencies)
+        #: hashes of the nodes waiting for this one
+        self.dependents = set()
+        #: position in the post-order traversal, used to break ties
+        self.position = position
+
+    @property
+    def in_degree(self):
+        return len(self.dependencies)
+
+
+class BuildScheduler(object):
+    """Installs the nodes of a DAG with a bounded number of workers.
+
+    Only the edges between the nodes passed to the scheduler are taken into
+    account: dependencies that are not in ``specs`` are assumed to be
+    already installed.
+    """
+
+    def __init__(self, specs, concurrent_builds=1, cooperative=False):
+        """Create a scheduler for the nodes in ``specs``.
+
+        Args:
+            specs (list of Spec): concrete nodes to be installed
+            concurrent_builds (int): maximum number of workers running at
+                the same time
+            cooperative (bool): if True, workers claim their node with a
+                non-blocking prefix lock, and nodes claimed by other
+                processes are retried later instead of waited for
+        """
+        self.concurrent_builds = max(1, concurrent_builds)
+        self.cooperative = cooperative
+
+        self.tasks = {}
+        for spec in specs:
+            key = spec.dag_hash()
+            if key not in self.tasks:
+                self.tasks[key] = BuildTask(spec, (), len(self.tasks))
+
+        for task in self.tasks.values():
+            for dep in task.spec.dependencies():
+                dkey = dep.dag_hash()
+                if dkey in self.tasks:
+                    task.dependencies.add(dkey)
+                    self.tasks[dkey].dependents.add(task.key)
+
+        #: hashes of the nodes that have been installed
+        self.installed = set()
+
+        #: hashes of nodes claimed by other processes -> time of next claim
+        self.deferred = {}
+
+    def _ready(self, running):
+        """Tasks with no pending dependencies that are not running yet.
+
+        Nodes that unblock the largest number of other nodes come first.
+        Nodes that were claimed by other processes are left out until it
+        is time to try them again.
+        """
+        now = time.time()
+        ready = [t for t in self.tasks.values()
+                 if t.in_degree == 0 and t.key not in running and
+                 t.key not in self.installed and
+                 self.deferred.get(t.key, 0) <= now]
+        return sorted(ready, key=lambda t: (-len(t.dependents), t.position))
+
+    def _defer(self, task):
+        """Put aside a task that another process is working on."""
+        tty.msg('{0} is being installed by another process, '
+                'will check again later'.format(task.spec.cformat('$_$/')))
+        self.deferred[task.key] = time.time() + _claim_retry_interval
+
+    def _complete(self, task):
+        """Mark ``task`` as installed and update its dependents."""
+        self.installed.add(task.key)
+        for key in task.dependents:
+            self.tasks[key].dependencies.discard(task.key)
+
+    def _start(self, task, install):
+        parent_pipe, child_pipe = multiprocessing.Pipe(False)
+        target = _cooperative_worker if self.cooperative else _worker
+        process = multiprocessing.Process(
+            target=target, args=(install, task.spec, child_pipe))
+        process.start()
+        child_pipe.close()
+        tty.debug('Started build of {0} [pid {1}]'.format(
+            task.spec.cformat('$_$/'), process.pid))
+        return process, parent_pipe
+
+    def _collect(self, running):
+        """Wait until at least one of the ``running`` workers is done.
+
+        Returns:
+            list of (key, result) tuples, where result is None on
+            success, ``_busy`` if the node was claimed by another process
+            or the exception raised by the worker
+        """
+        while True:
+            finished = []
+            for key, (process, pipe) in list(running.items()):
+                if pipe.poll():
+                    try:
+                        result = pipe.recv()
+                    except EOFError:
+                        result = None
+                elif not process.is_alive():
+                    result = InstallError(
+                        'Build of {0} exited with code {1}'.format(
+                            self.tasks[key].spec.name, process.exitcode))
+                else:
+                    continue
+
+                process.join()
+                pipe.close()
+                del running[key]
+                finished.append((key, result))
+
+            if finished:
+                return finished
+            time.sleep(_poll_interval)
+
+    def run(self, install):
+        """Install all the nodes, calling ``install(spec)`` in a worker.
+
+        Once a build fails no new build is started, but the ones that are
+        already running are allowed to finish. The first error is then
+        raised again in the calling process.
+
+        Args:
+            install (callable): function that installs a single node
+        """
+        running = {}
+        errors = []
+        try:
+            while len(self.installed) + len(errors) < len(self.tasks):
+                if not errors:
+                    free = self.concurrent_builds - len(running)
+                    for task in self._ready(running)[:free]:
+                        running[task.key] = self._start(task, install)
+
+                if not running:
+                    if errors or not self.deferred:
+                        # Nothing can make progress anymore.
+                        break
+                    # Only nodes claimed by others are left: wait for them
+                    time.sleep(max(_poll_interval,
+                                   min(self.deferred.values()) - time.time()))
+                    continue
+
+                for key, result in self._collect(running):
+                    task = self.tasks[key]
+                    if result == _busy:
+                        self._defer(task)
+                    elif isinstance(result, BaseException):
+                        if isinstance(result, InstallError):
+                            result.pkg = task.spec.package
+                        errors.append(result)
+                    else:
+                        self.deferred.pop(key, None)
+                        self._complete(task)
+        finally:
+            for process, pipe in running.values():
+                process.terminate()
+                process.join()
+
+        if errors:
+            raise errors[0]
+
+        pending = [t.spec.name for t in self.tasks.values()
+                   if t.key not in self.installed]
+        if pending:
+            raise InstallError(
+                'Could not schedule the build of: ' + ', '.join(pending))
+
+
+def _worker(install, spec, pipe):
+    """Body of a worker process: install one node, report the outcome."""
+    try:
+        install(spec)
+        pipe.send(None)
+    except BaseException as e:
+        pipe.send(_portable_error(e))
+    finally:
+        pipe.close()
+
+
+def _cooperative_worker(install, spec, pipe):
+    """Like ``_worker``, but claims the node's prefix first.
+
+    The claim is a write lock on the prefix, held during the whole
+    install.  Locks taken again on the same prefix by the install itself
+    nest into it.  If the lock is held by another process the worker
+    gives up immediately and reports the node as busy.
+    """
+    try:
+        with spack.store.db.prefix_write_lock(spec, timeout=_claim_timeout):
+            _worker(install, spec, pipe)
+    except LockTimeoutError:
+        pipe.send(_busy)
+        pipe.close()
+
+
+def _portable_error(error):
+    """Make ``error`` fit to be sent back to the scheduler."""
+    # Packages don't survive pickling, the scheduler sets this again
+    if hasattr(error, 'pkg'):
+        error.pkg = None
+
+    try:
+        pickle.dumps(error)
+    except Exception:
+        error = InstallError('{0}: {1}'.format(type(error).__name__, error))
+
+    if not isinstance(error, spack.error.SpackError):
+        error = InstallError('{0}: {1}'.format(type(error).__name__, error))
+    return error
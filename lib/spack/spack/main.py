@@ -22,17 +22,11 @@ import llnl.util.tty as tty
 import llnl.util.tty.color as color
 from llnl.util.tty.log import log_output
 
+# Most of Spack is imported only when it is needed, so that commands
+# that do little, like ``spack --version``, start quickly.  The budget of
+# modules imported at startup is checked in ``spack.test.main``.
 import spack
-import spack.architecture
-import spack.config
-import spack.cmd
-import spack.environment as ev
-import spack.hooks
 import spack.paths
-import spack.repo
-import spack.store
-import spack.util.debug
-import spack.util.path
 from spack.error import SpackError
 
 
@@ -101,13 +95,47 @@ def set_working_dir():
 
 def add_all_commands(parser):
     """Add all spack subcommands to the parser."""
+    import spack.cmd
     for cmd in spack.cmd.all_commands():
         parser.add_command(cmd)
 
 
-def index_commands():
-    """create an index of commands by section for this help level"""
-    index = {}
+def command_summaries():
+    """Get the required properties of all commands, by command name.
+
+    Reading the properties imports every command module, which takes
+    about a second, so they are cached in the misc cache and read again
+    only when a command module changes.  The misc cache may be shared by
+    several Spack instances, so each command directory has its own entry.
+
+    Returns:
+        (dict): maps command names to dicts with the ``level``,
+            ``section`` and ``description`` of the command
+    """
+    import hashlib
+    import spack.caches
+    import spack.cmd
+    import spack.util.spack_json as sjson
+
+    misc_cache = spack.caches.misc_cache
+    path_hash = hashlib.sha1(spack.paths.command_path.encode('utf-8'))
+    cache_filename = 'commands/%s-index.json' % path_hash.hexdigest()
+
+    # Commands are added and removed by changing the command directory,
+    # and changed by changing their file
+    command_mtime = max(
+        os.path.getmtime(os.path.join(spack.paths.command_path, f))
+        for f in os.listdir(spack.paths.command_path) + ['.']
+        if f.endswith('.py') or f == '.')
+
+    if misc_cache.mtime(cache_filename) > command_mtime:
+        with misc_cache.read_transaction(cache_filename) as f:
+            try:
+                return sjson.load(f)['commands']
+            except (ValueError, KeyError, TypeError):
+                pass
+
+    summaries = {}
     for command in spack.cmd.all_commands():
         cmd_module = spack.cmd.get_module(command)
 
@@ -118,12 +146,24 @@ def index_commands():
                 tty.die("Command doesn't define a property '%s': %s"
                         % (p, command))
 
+        summaries[command] = dict(
+            (p, getattr(cmd_module, p)) for p in required_command_properties)
+
+    with misc_cache.write_transaction(cache_filename) as (old, new):
+        sjson.dump({'commands': summaries}, new)
+    return summaries
+
+
+def index_commands():
+    """create an index of commands by section for this help level"""
+    index = {}
+    for command, summary in command_summaries().items():
         # add commands to lists for their level and higher levels
         for level in reversed(levels):
             level_sections = index.setdefault(level, {})
-            commands = level_sections.setdefault(cmd_module.section, [])
+            commands = level_sections.setdefault(summary['section'], [])
             commands.append(command)
-            if level == cmd_module.level:
+            if level == summary['level']:
                 break
 
     return index
@@ -155,8 +195,11 @@ class SpackArgumentParser(argparse.ArgumentParser):
         if level not in levels:
             raise ValueError("level must be one of: %s" % levels)
 
-        # lazily add all commands to the parser when needed.
-        add_all_commands(self)
+        # lazily add all commands to the parser when needed.  Only their
+        # summaries are needed here, so the command modules aren't loaded.
+        summaries = command_summaries()
+        for cmd_name in sorted(summaries):
+            self.add_command_summary(cmd_name, summaries[cmd_name])
 
         """Print help on subcommands in neatly formatted sections."""
         formatter = self._get_formatter()
@@ -167,7 +210,7 @@ class SpackArgumentParser(argparse.ArgumentParser):
             self.actions = self._subparsers._actions[-1]._get_subactions()
 
         # make a set of commands not yet added.
-        remaining = set(spack.cmd.all_commands())
+        remaining = set(summaries)
 
         def add_group(group):
             formatter.start_section(group.title)
@@ -264,8 +307,8 @@ class SpackArgumentParser(argparse.ArgumentParser):
         sp.add_parser = add_parser
         return sp
 
-    def add_command(self, cmd_name):
-        """Add one subcommand to this parser."""
+    def _add_subparser(self, cmd_name, description):
+        """Add the subparser of a subcommand, without its arguments."""
         # lazily initialize any subparsers
         if not hasattr(self, 'subparsers'):
             # remove the dummy "command" argument.
@@ -274,16 +317,32 @@ class SpackArgumentParser(argparse.ArgumentParser):
             self.subparsers = self.add_subparsers(metavar='COMMAND',
                                                   dest="command")
 
-        # each command module implements a parser() function, to which we
-        # pass its subparser for setup.
-        module = spack.cmd.get_module(cmd_name)
-
         # build a list of aliases
         alias_list = [k for k, v in aliases.items() if v == cmd_name]
 
-        subparser = self.subparsers.add_parser(
+        return self.subparsers.add_parser(
             cmd_name, aliases=alias_list,
-            help=module.description, description=module.description)
+            help=description, description=description)
+
+    def add_command_summary(self, cmd_name, summary):
+        """Add one subcommand to this parser, for help on subcommands only.
+
+        Args:
+            cmd_name (str): name of the subcommand
+            summary (dict): properties of the subcommand, as returned by
+                ``command_summaries()``
+        """
+        self._add_subparser(cmd_name, summary['description'])
+
+    def add_command(self, cmd_name):
+        """Add one subcommand to this parser."""
+        import spack.cmd
+
+        # each command module implements a parser() function, to which we
+        # pass its subparser for setup.
+        module = spack.cmd.get_module(cmd_name)
+
+        subparser = self._add_subparser(cmd_name, module.description)
         module.setup_parser(subparser)
 
         # return the callable function for the command
@@ -390,6 +449,11 @@ def make_argument_parser(**kwargs):
 
 def setup_main_options(args):
     """Configure spack globals based on the basic options."""
+    import spack.config
+    import spack.repo
+    import spack.util.debug
+    import spack.util.lock
+
     # Set up environment based on args.
     tty.set_verbose(args.verbose)
     tty.set_debug(args.debug)
@@ -562,6 +626,11 @@ def print_setup_info(*info):
     invoke spack in login scripts, and it needs to be quick.
 
     """
+    import spack.architecture
+    import spack.config
+    import spack.store
+    import spack.util.path
+
     shell = 'csh' if 'csh' in info else 'sh'
 
     def shell_set(var, value):
@@ -606,35 +675,46 @@ def main(argv=None):
     parser.add_argument('command', nargs=argparse.REMAINDER)
     args, unknown = parser.parse_known_args(argv)
 
-    # activate an environment if one was specified on the command line
-    if not args.no_env:
-        env = ev.find_environment(args)
-        if env:
-            ev.activate(env, args.use_env_repo)
+    # -V is special as it does not require a command, nor anything else
+    # from Spack.
+    if args.version and not args.print_shell_vars:
+        import spack
+        print(spack.spack_version)
+        return 0
+
+    import spack.config
 
     # make spack.config aware of any command line configuration scopes
     if args.config_scopes:
         spack.config.command_line_scopes = args.config_scopes
 
-    if args.print_shell_vars:
-        print_setup_info(*args.print_shell_vars.split(','))
-        return 0
-
     # Just print help and exit if run with no arguments at all
     no_args = (len(sys.argv) == 1) if argv is None else (len(argv) == 0)
     if no_args:
         parser.print_help()
         return 1
 
-    # -h, -H, and -V are special as they do not require a command, but
-    # all the other options do nothing without a command.
-    if args.version:
-        print(spack.spack_version)
-        return 0
-    elif args.help:
+    # -h and -H are special as they do not require a command, nor an
+    # environment.
+    if args.help:
         sys.stdout.write(parser.format_help(level=args.help))
         return 0
-    elif not args.command:
+
+    import spack.environment as ev
+    import spack.hooks
+
+    # activate an environment if one was specified on the command line
+    if not args.no_env:
+        env = ev.find_environment(args)
+        if env:
+            ev.activate(env, args.use_env_repo)
+
+    if args.print_shell_vars:
+        print_setup_info(*args.print_shell_vars.split(','))
+        return 0
+
+    # all the other options do nothing without a command.
+    if not args.command:
         parser.print_help()
         return 1
 
@@ -689,6 +769,17 @@ def main(argv=None):
     except SystemExit as e:
         return e.code
 
+    finally:
+        _debug_config_reads()
+
+
+def _debug_config_reads():
+    """Print how often each configuration section was read, with -d."""
+    stats = spack.config.config.read_stats()
+    for section, (reads, merges) in sorted(stats.items()):
+        tty.debug('Read config section %s %d times, merged it %d times'
+                  % (section, reads, merges))
+
 
 class SpackCommandError(Exception):
     """Raised when SpackCommand execution fails."""
@@ -11,8 +11,10 @@ the main server for a particular package is down.  Or, if the computer
 where spack is run is not connected to the internet, it allows spack
 to download packages directly from a mirror (e.g., on an intranet).
 """
-import sys
+import hashlib
 import os
+import threading
+
 import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp
 
@@ -20,9 +22,18 @@ import spack.config
 import spack.error
 import spack.url as url
 import spack.fetch_strategy as fs
+import spack.util.spack_json as sjson
+from spack.fetch_scheduler import FetchScheduler
 from spack.spec import Spec
 from spack.version import VersionList
 from spack.util.compression import allowed_archive
+from spack.util.crypto import checksum
+
+#: Name of the file at the root of a mirror that lists its archives
+manifest_name = 'manifest.json'
+
+#: Version of the manifest format
+_manifest_version = 1
 
 
 def mirror_archive_filename(spec, fetcher, resource_id=None):
@@ -141,6 +152,82 @@ def suggest_archive_basename(resource):
     return basename
 
 
+def mirror_entries(spec):
+    """Paths of the archives of a concrete spec within a mirror.
+
+    These are the archives of the sources and resources of the package
+    and of the patches it downloads.
+    """
+    stage = spec.package.stage
+    paths = [s.mirror_path for s in stage]
+    for patch in spec.patches:
+        patch_url = getattr(patch, 'url', None)
+        if patch_url:
+            paths.append(os.path.join(
+                os.path.dirname(stage.mirror_path),
+                os.path.basename(patch_url)))
+    return paths
+
+
+class MirrorManifest(object):
+    """Checksum, size and modification time of the archives in a mirror.
+
+    The manifest is kept in a JSON file at the root of the mirror.  An
+    archive whose size and modification time match its entry is taken to
+    be unchanged, without reading it.
+
+    Args:
+        root (str): root directory of the mirror
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, manifest_name)
+        #: entries by path relative to the root of the mirror
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        try:
+            with open(self.path) as f:
+                manifest = sjson.load(f)['mirror_manifest']
+            if manifest['version'] == _manifest_version:
+                self.entries = manifest['entries']
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def unchanged(self, relative_path):
+        """Whether an archive is in the manifest and did not change."""
+        entry = self.entries.get(relative_path)
+        if not entry:
+            return False
+        try:
+            st = os.stat(os.path.join(self.root, relative_path))
+        except OSError:
+            return False
+        return entry['size'] == st.st_size and entry['mtime'] == st.st_mtime
+
+    def record(self, relative_path):
+        """Add an archive of the mirror to the manifest."""
+        path = os.path.join(self.root, relative_path)
+        st = os.stat(path)
+        entry = {
+            'sha256': checksum(hashlib.sha256, path),
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+        }
+        with self._lock:
+            self.entries[relative_path] = entry
+
+    def write(self):
+        """Write the manifest to the root of the mirror."""
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            sjson.dump({'mirror_manifest': {
+                'version': _manifest_version,
+                'entries': self.entries}}, f)
+        os.rename(tmp, self.path)
+
+
 def create(path, specs, **kwargs):
     """Create a directory to be used as a spack mirror, and fill it with
     package archives.
@@ -153,6 +240,7 @@ def create(path, specs, **kwargs):
     Keyword args:
         num_versions: Max number of versions to fetch per spec, \
             (default is 1 each spec)
+        jobs: Number of archives to fetch at the same time (default 1)
 
     Return Value:
         Returns a tuple of lists: (present, mirrored, error)
@@ -164,6 +252,9 @@ def create(path, specs, **kwargs):
     This routine iterates through all known package versions, and
     it creates specs for those versions.  If the version satisfies any spec
     in the specs list, it is downloaded and added to the mirror.
+
+    Specs whose archives are all listed, unchanged, in the manifest of the
+    mirror are not fetched again.
     """
     # Make sure nothing is in the way.
     if os.path.isfile(path):
@@ -187,41 +278,47 @@ def create(path, specs, **kwargs):
             raise MirrorError(
                 "Cannot create directory '%s':" % mirror_root, str(e))
 
-    # Things to keep track of while parsing specs.
-    categories = {
-        'present': [],
-        'mirrored': [],
-        'error': []
-    }
+    manifest = MirrorManifest(mirror_root)
+    mirror_cache = spack.caches.MirrorCache(mirror_root, manifest)
+
+    to_fetch = []
+    for spec in version_specs:
+        try:
+            entries = mirror_entries(spec)
+        except spack.error.SpackError:
+            entries = None
+        if entries and all(manifest.unchanged(p) for p in entries):
+            tty.debug("Skipping {0}, already in the mirror".format(
+                spec.format("$_$@")))
+            mirror_cache.existing_resources.update(entries)
+        else:
+            to_fetch.append(spec)
 
-    mirror_cache = spack.caches.MirrorCache(mirror_root)
     try:
         spack.caches.mirror_cache = mirror_cache
-        # Iterate through packages and download all safe tarballs for each
-        for spec in version_specs:
-            add_single_spec(spec, mirror_root, categories, **kwargs)
+        # Download all safe tarballs for each package
+        scheduler = FetchScheduler(to_fetch, jobs=kwargs.get('jobs', 1))
+        errors = scheduler.run(_add_to_mirror, raise_errors=False)
     finally:
         spack.caches.mirror_cache = None
+        manifest.write()
 
-    categories['mirrored'] = list(mirror_cache.new_resources)
-    categories['present'] = list(mirror_cache.existing_resources)
-
-    return categories['present'], categories['mirrored'], categories['error']
+    for spec, e in errors:
+        tty.warn("Error while fetching %s" % spec.cformat('$_$@'), str(e))
 
+    present = list(mirror_cache.existing_resources)
+    mirrored = list(mirror_cache.new_resources)
+    return present, mirrored, [spec for spec, _ in errors]
 
-def add_single_spec(spec, mirror_root, categories, **kwargs):
-    tty.msg("Adding package {pkg} to mirror".format(pkg=spec.format("$_$@")))
-    try:
-        spec.package.do_fetch()
-        spec.package.do_clean()
 
-    except Exception as e:
-        if spack.config.get('config:debug'):
-            sys.excepthook(*sys.exc_info())
-        else:
-            tty.warn(
-                "Error while fetching %s" % spec.cformat('$_$@'), e.message)
-        categories['error'].append(spec)
+def _add_to_mirror(pkg):
+    # The FetchScheduler calls this in threads only for packages fetched
+    # from URLs; the others, which change the working directory, are
+    # mirrored one at a time in the main thread.
+    tty.msg("Adding package {pkg} to mirror".format(
+        pkg=pkg.spec.format("$_$@")))
+    pkg.do_fetch()
+    pkg.do_clean()
 
 
 class MirrorError(spack.error.SpackError):
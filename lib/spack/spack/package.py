@@ -549,7 +549,8 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
                 if dep_name not in visited:
                     visited.add(dep_name)
                     if transitive:
-                        pkg = spack.repo.get(dep_name)
+                        # Dependencies do not need to be loaded
+                        pkg = spack.repo.path.get_pkg_descriptor(dep_name)
                         pkg.possible_dependencies(
                             transitive, expand_virtuals, visited)
 
@@ -1364,6 +1365,15 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
                 all packages, or a list of package names to run tests for some
             dirty (bool): Don't clean the build environment before installing.
             force (bool): Install again, even if already installed.
+            concurrent_builds (int): Number of dependencies that can be
+                built at the same time. Default is the value of
+                ``config:concurrent_builds``, or 1 if not set. When
+                greater than 1 and ``make_jobs`` is not given, the build
+                jobs are shared among the concurrent builds.
+            cooperative (bool): Share the installation of the dependencies
+                with other Spack processes installing into the same store.
+                Dependencies whose prefix is locked by another process are
+                skipped and checked again later, instead of waited for.
         """
         if not self.spec.concrete:
             raise ValueError("Can only install concrete packages: %s."
@@ -1399,7 +1409,16 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
         # First, install dependencies recursively.
         if install_deps:
             tty.debug('Installing {0} dependencies'.format(self.name))
-            for dep in self.spec.traverse(order='post', root=False):
+            # spack.installer imports this module through build_environment
+            import spack.installer as installer
+            concurrent_builds = (kwargs.pop('concurrent_builds', None) or
+                                 installer.concurrent_builds())
+            cooperative = kwargs.pop('cooperative', False)
+            dep_jobs = make_jobs
+            if concurrent_builds > 1 and dep_jobs is None:
+                dep_jobs = installer.jobs_per_build(concurrent_builds)
+
+            def install_dependency(dep):
                 dep.package.do_install(
                     install_deps=False,
                     explicit=False,
@@ -1409,11 +1428,23 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
                     fake=fake,
                     skip_patch=skip_patch,
                     verbose=verbose,
-                    make_jobs=make_jobs,
+                    make_jobs=dep_jobs,
                     tests=tests,
                     dirty=dirty,
                     **kwargs)
 
+            deps = list(self.spec.traverse(order='post', root=False))
+            if concurrent_builds > 1 or cooperative:
+                with spack.store.db.read_transaction():
+                    deps = [d for d in deps
+                            if d.external or not d.package.installed]
+                scheduler = installer.BuildScheduler(
+                    deps, concurrent_builds, cooperative=cooperative)
+                scheduler.run(install_dependency)
+            else:
+                for dep in deps:
+                    install_dependency(dep)
+
         tty.msg(colorize('@*{Installing} @*g{%s}' % self.name))
 
         if kwargs.get('use_cache', True):
@@ -0,0 +1,275 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Metadata of packages that can be used without loading their code.
+
+Many commands only need what the directives of a package declare: its
+versions, variants, dependencies and so on.  Importing thousands of
+``package.py`` files to find out is slow, so the ``RepoIndex`` of each
+repository keeps a :class:`MetadataIndex` with the declarations of all
+its packages.  :class:`PackageDescriptor` objects give access to one
+package of the index with the same attribute names as package classes.
+"""
+from six import string_types
+
+import spack.error
+import spack.spec
+import spack.util.spack_json as sjson
+from spack.version import Version
+
+
+def _plain(value):
+    """Whether a value can be stored in the index as it is."""
+    if isinstance(value, (list, tuple)):
+        return all(_plain(v) for v in value)
+    return value is None or isinstance(
+        value, string_types + (bool, int, float))
+
+
+def _plain_kwargs(kwargs):
+    return dict((k, v) for k, v in kwargs.items() if _plain(v))
+
+
+def package_metadata(pkg_class):
+    """Extract the metadata declared by the directives of a package.
+
+    Args:
+        pkg_class (type): class of the package
+
+    Returns:
+        (dict): metadata that can be written to JSON
+    """
+    variants = {}
+    for name, variant in pkg_class.variants.items():
+        values = variant.values
+        variants[name] = {
+            'default': variant.default,
+            'description': variant.description,
+            'values': list(values) if isinstance(values, (list, tuple))
+            else None,
+            'multi': variant.multi,
+        }
+
+    dependencies = {}
+    for name, conditions in pkg_class.dependencies.items():
+        dependencies[name] = [
+            {'when': str(when), 'spec': str(dep.spec),
+             'type': sorted(dep.type)}
+            for when, dep in conditions.items()]
+
+    return {
+        'name': pkg_class.name,
+        'namespace': pkg_class.namespace,
+        'description': pkg_class.__doc__,
+        'homepage': getattr(pkg_class, 'homepage', None),
+        'tags': list(getattr(pkg_class, 'tags', [])),
+        'versions': dict(
+            (str(v), _plain_kwargs(kwargs))
+            for v, kwargs in pkg_class.versions.items()),
+        'variants': variants,
+        'dependencies': dependencies,
+        'provided': dict(
+            (str(vspec), sorted(str(w) for w in whens))
+            for vspec, whens in pkg_class.provided.items()),
+        'conflicts': dict(
+            (str(trigger), [[str(when), msg] for when, msg in conflicts])
+            for trigger, conflicts in pkg_class.conflicts.items()),
+        'extendees': dict(
+            (name, [str(spec), _plain_kwargs(kwargs)])
+            for name, (spec, kwargs) in pkg_class.extendees.items()),
+        'patches': dict(
+            (str(when), [p.to_dict() for p in patches])
+            for when, patches in pkg_class.patches.items()),
+    }
+
+
+class MetadataIndex(object):
+    """Index of the metadata of the packages of a repository.
+
+    The index is stored in JSON like this::
+
+        packages:
+            package1:
+                <metadata of package1>
+            package2:
+                <metadata of package2>
+            ... etc. ...
+    """
+
+    def __init__(self, packages=None):
+        self.packages = packages or {}
+
+    @staticmethod
+    def from_json(stream):
+        data = sjson.load(stream)
+        if 'packages' not in data:
+            raise MetadataIndexError(
+                'invalid package metadata index; try `spack clean -m`')
+        return MetadataIndex(data['packages'])
+
+    def to_json(self, stream):
+        sjson.dump({'packages': self.packages}, stream)
+
+    def update_package(self, pkg_fullname):
+        """Extract the metadata of a package into the index."""
+        import spack.repo
+        pkg_name = pkg_fullname.rpartition('.')[2]
+        try:
+            pkg_class = spack.repo.path.get_pkg_class(pkg_fullname)
+        except spack.repo.UnknownPackageError:
+            # The package was removed from the repository
+            self.remove_package(pkg_fullname)
+            return
+        self.packages[pkg_name] = package_metadata(pkg_class)
+
+    def remove_package(self, pkg_fullname):
+        """Remove the metadata of a package from the index."""
+        self.packages.pop(pkg_fullname.rpartition('.')[2], None)
+
+    def merge(self, other):
+        """Merge another metadata index into this one."""
+        self.packages.update(other.packages)
+
+    def __contains__(self, pkg_name):
+        return pkg_name in self.packages
+
+    def __getitem__(self, pkg_name):
+        return PackageDescriptor(self.packages[pkg_name])
+
+
+class PackageDescriptor(object):
+    """Metadata of a package, read from a :class:`MetadataIndex`.
+
+    Descriptors have the attributes of package classes that directives
+    set, so they can stand in for package classes wherever only those
+    are needed.  Specs in them are only parsed when they are used.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._parsed = {}
+
+    @property
+    def name(self):
+        return self._data['name']
+
+    @property
+    def namespace(self):
+        return self._data['namespace']
+
+    @property
+    def fullname(self):
+        return '%s.%s' % (self.namespace, self.name)
+
+    @property
+    def description(self):
+        """Docstring of the package class."""
+        return self._data['description']
+
+    @property
+    def homepage(self):
+        return self._data['homepage']
+
+    @property
+    def tags(self):
+        return self._data['tags']
+
+    def _parse(self, key, parse):
+        if key not in self._parsed:
+            self._parsed[key] = parse(self._data[key])
+        return self._parsed[key]
+
+    @property
+    def versions(self):
+        return self._parse('versions', lambda versions: dict(
+            (Version(v), kwargs) for v, kwargs in versions.items()))
+
+    @property
+    def variants(self):
+        """Maps variant names to dicts of their ``default``,
+        ``description``, allowed ``values`` and ``multi``."""
+        return self._data['variants']
+
+    def dependency_names(self):
+        """Names of the packages this package may depend on."""
+        return list(self._data['dependencies'])
+
+    @property
+    def dependencies(self):
+        # spack.dependency can only be imported after spack.spec
+        import spack.dependency
+
+        def parse(dependencies):
+            result = {}
+            for name, conditions in dependencies.items():
+                result[name] = dict(
+                    (spack.spec.Spec(d['when']), spack.dependency.Dependency(
+                        self, spack.spec.Spec(d['spec']), d['type']))
+                    for d in conditions)
+            return result
+        return self._parse('dependencies', parse)
+
+    @property
+    def provided(self):
+        return self._parse('provided', lambda provided: dict(
+            (spack.spec.Spec(vspec), set(spack.spec.Spec(w) for w in whens))
+            for vspec, whens in provided.items()))
+
+    @property
+    def conflicts(self):
+        return self._parse('conflicts', lambda conflicts: dict(
+            (trigger, [(spack.spec.Spec(when), msg) for when, msg in c])
+            for trigger, c in conflicts.items()))
+
+    @property
+    def extendees(self):
+        return self._parse('extendees', lambda extendees: dict(
+            (name, (spack.spec.Spec(spec), kwargs))
+            for name, (spec, kwargs) in extendees.items()))
+
+    @property
+    def patches(self):
+        """Maps conditions to lists of dictionaries describing patches."""
+        return self._parse('patches', lambda patches: dict(
+            (spack.spec.Spec(when), p) for when, p in patches.items()))
+
+    def possible_dependencies(
+            self, transitive=True, expand_virtuals=True, visited=None):
+        """Return set of possible dependencies of this package.
+
+        This is ``PackageBase.possible_dependencies``, without loading
+        any package.
+        """
+        import spack.repo
+        if visited is None:
+            visited = set([self.name])
+
+        for name in self.dependency_names():
+            if spack.repo.path.is_virtual(name):
+                if expand_virtuals:
+                    providers = spack.repo.path.providers_for(name)
+                    dep_names = [spec.name for spec in providers]
+                else:
+                    visited.add(name)
+                    continue
+            else:
+                dep_names = [name]
+
+            for dep_name in dep_names:
+                if dep_name not in visited:
+                    visited.add(dep_name)
+                    if transitive:
+                        pkg = spack.repo.path.get_pkg_descriptor(dep_name)
+                        pkg.possible_dependencies(
+                            transitive, expand_virtuals, visited)
+
+        return visited
+
+    def __repr__(self):
+        return 'PackageDescriptor(%s)' % self.fullname
+
+
+class MetadataIndexError(spack.error.SpackError):
+    """Raised when the package metadata index cannot be read."""
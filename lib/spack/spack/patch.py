@@ -315,6 +315,17 @@ class PatchCache(object):
 
     def update_package(self, pkg_fullname):
         # remove this package from any patch entries that reference it.
+        self.remove_package(pkg_fullname)
+
+        # update the index with per-package patch indexes
+        pkg = spack.repo.get(pkg_fullname)
+        partial_index = self._index_patches(pkg)
+        for sha256, package_to_patch in partial_index.items():
+            p2p = self.index.setdefault(sha256, {})
+            p2p.update(package_to_patch)
+
+    def remove_package(self, pkg_fullname):
+        """Remove the patches of a package from the index."""
         empty = []
         for sha256, package_to_patch in self.index.items():
             remove = []
@@ -332,13 +343,6 @@ class PatchCache(object):
         for sha256 in empty:
             del self.index[sha256]
 
-        # update the index with per-package patch indexes
-        pkg = spack.repo.get(pkg_fullname)
-        partial_index = self._index_patches(pkg)
-        for sha256, package_to_patch in partial_index.items():
-            p2p = self.index.setdefault(sha256, {})
-            p2p.update(package_to_patch)
-
     def update(self, other):
         """Update this cache with the contents of another."""
         for sha256, package_to_patch in other.index.items():
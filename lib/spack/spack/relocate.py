@@ -7,13 +7,18 @@
 import os
 import platform
 import re
+import shutil
 import spack.repo
 import spack.cmd
+import spack.util.elf as elf
 from spack.util.executable import Executable, ProcessError
-from llnl.util.filesystem import filter_file
 import llnl.util.tty as tty
 
 
+#: Size of the blocks in which text files are read to relocate them
+_block_size = 1024 * 1024
+
+
 class InstallRootStringException(spack.error.SpackError):
     """
     Raised when the relocated binary still has the install root string.
@@ -47,8 +52,15 @@ def get_existing_elf_rpaths(path_name):
     """
     Return the RPATHS returned by patchelf --print-rpath path_name
     as a list of strings.
+
+    The rpaths are read directly from the file; patchelf is only used
+    for files that spack.util.elf cannot parse.
     """
     if platform.system() == 'Linux':
+        try:
+            return elf.get_rpaths(path_name)
+        except elf.ElfParsingError as e:
+            tty.debug('Cannot read the rpath of %s: %s' % (path_name, e))
         patchelf = Executable(get_patchelf())
         try:
             output = patchelf('--print-rpath', '%s' %
@@ -241,17 +253,36 @@ def strings_contains_installroot(path_name, root_dir):
     """
     Check if the file contain the install root string.
     """
-    strings = Executable('strings')
-    output = strings('%s' % path_name,
-                     output=str, err=str)
-    return (root_dir in output)
+    if not isinstance(root_dir, bytes):
+        root_dir = root_dir.encode('utf-8')
+    with elf.mapped(path_name) as data:
+        return data.find(root_dir) != -1
+
+
+def get_filetype(path_name):
+    """
+    Return a description of the file like the one given by file -b -h,
+    without running file.
+    """
+    if os.path.islink(path_name):
+        return 'symbolic link to %s' % os.readlink(path_name)
+    with elf.mapped(path_name) as data:
+        return elf.file_type(data)
 
 
 def modify_elf_object(path_name, new_rpaths):
     """
     Replace orig_rpath with new_rpath in RPATH of elf object path_name
+
+    The rpath is rewritten in place when it fits; patchelf is used when
+    it does not or the file cannot be parsed.
     """
     if platform.system() == 'Linux':
+        try:
+            if elf.set_rpaths(path_name, new_rpaths):
+                return
+        except elf.ElfParsingError as e:
+            tty.debug('Cannot set the rpath of %s: %s' % (path_name, e))
         new_joined = ':'.join(new_rpaths)
         patchelf = Executable(get_patchelf())
         try:
@@ -462,12 +493,89 @@ def relocate_links(path_names, old_dir, new_dir):
         os.symlink(new_src, path_name)
 
 
-def relocate_text(path_names, old_dir, new_dir):
+def find_installroot_offsets(path_name, root_dir):
+    """
+    Return the byte offsets of the install root string in a file.
+    """
+    if not isinstance(root_dir, bytes):
+        root_dir = root_dir.encode('utf-8')
+    offsets = []
+    with elf.mapped(path_name) as data:
+        offset = data.find(root_dir)
+        while offset != -1:
+            offsets.append(offset)
+            offset = data.find(root_dir, offset + len(root_dir))
+    return offsets
+
+
+def _patch_text(path_name, old, new, offsets):
     """
-    Replace old path with new path in text file path_name
+    Overwrite old with new, which has the same length, at the given
+    offsets of a file. Return False if old is not at one of them; the
+    file must then be rewritten to replace the rest.
     """
-    filter_file('%s' % old_dir, '%s' % new_dir,
-                *path_names, backup=False)
+    size = len(old)
+    with elf.mapped(path_name, write=True) as data:
+        for offset in offsets:
+            if data[offset:offset + size] != old:
+                return False
+            data[offset:offset + size] = new
+    return True
+
+
+def _replace_text(path_name, old, new):
+    """
+    Replace old with new in a file, reading and writing it once.
+    """
+    tmp = path_name + '.relocate~'
+    with open(path_name, 'rb') as src:
+        with open(tmp, 'wb') as dst:
+            tail = b''
+            for block in iter(lambda: src.read(_block_size), b''):
+                data = tail + block
+                # Replace up to the end of the last match; after it, a
+                # match may only start in the last len(old) - 1 bytes and
+                # end in the next block, so they are carried over.
+                end = 0
+                offset = data.find(old)
+                while offset != -1:
+                    end = offset + len(old)
+                    offset = data.find(old, end)
+                cut = max(end, len(data) - len(old) + 1)
+                dst.write(data[:end].replace(old, new))
+                dst.write(data[end:cut])
+                tail = data[cut:]
+            dst.write(tail)
+    shutil.copymode(path_name, tmp)
+    os.rename(tmp, path_name)
+
+
+def relocate_text(path_names, old_dir, new_dir, offsets=None):
+    """
+    Replace old path with new path in text files.
+
+    If the paths have the same length, files are patched in place at the
+    ``offsets`` where the old path was found when they were packaged.
+    Other files are rewritten in a single pass.
+
+    Args:
+        path_names (list): paths of the files to relocate
+        old_dir (str): path to replace
+        new_dir (str): path to replace it with
+        offsets (dict): maps paths of files to the byte offsets of
+            old_dir in them, if they are known
+    """
+    if old_dir == new_dir:
+        return
+
+    old, new = old_dir.encode('utf-8'), new_dir.encode('utf-8')
+    offsets = offsets or {}
+    for path_name in path_names:
+        tty.debug('Relocating text in {0}'.format(path_name))
+        if (len(old) == len(new) and offsets.get(path_name) and
+                _patch_text(path_name, old, new, offsets[path_name])):
+            continue
+        _replace_text(path_name, old, new)
 
 
 def substitute_rpath(orig_rpath, topdir, new_root_path):
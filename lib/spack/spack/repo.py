@@ -9,12 +9,14 @@ import os
 import stat
 import shutil
 import errno
+import hashlib
+import multiprocessing
 import sys
 import inspect
 import re
 import traceback
 from contextlib import contextmanager
-from six import string_types, add_metaclass
+from six import StringIO, string_types, add_metaclass
 
 try:
     from collections.abc import Mapping
@@ -32,7 +34,9 @@ from llnl.util.filesystem import mkdirp, install
 import spack.config
 import spack.caches
 import spack.error
+import spack.package_metadata
 import spack.patch
+import spack.paths
 import spack.spec
 import spack.util.spack_json as sjson
 import spack.util.imp as simp
@@ -74,6 +78,11 @@ NOT_PROVIDED = object()
 _package_prepend = 'from spack.pkgkit import *'
 
 
+def _package_code_cache_dir():
+    """Directory where the compiled code of package modules is cached."""
+    return os.path.join(spack.caches.misc_cache.root, 'package-code')
+
+
 def _autospec(function):
     """Decorator that automatically converts the argument of a single-arg
        function to a Spec."""
@@ -174,6 +183,40 @@ class FastPackageChecker(Mapping):
 
         return cache
 
+    def content_hash(self, pkg_name):
+        """Hash of the contents of the ``package.py`` file of a package."""
+        pkg_file = os.path.join(
+            self.packages_path, pkg_name, package_file_name)
+        with open(pkg_file, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def fingerprints(self, known=None):
+        """Identify the contents of the package files in the repository.
+
+        Files are only read if their size or modification time differ
+        from those of the known fingerprints, so that fresh clones and
+        checkouts are recognized as unchanged without rehashing them
+        every time.
+
+        Args:
+            known (dict): fingerprints previously returned by this method
+
+        Returns:
+            (dict): maps package names to lists of the modification time,
+                size and content hash of their package file
+        """
+        known = known or {}
+        fingerprints = {}
+        for pkg_name, sinfo in self.items():
+            old = known.get(pkg_name)
+            if old and old[:2] == [sinfo.st_mtime, sinfo.st_size]:
+                fingerprints[pkg_name] = old
+            else:
+                fingerprints[pkg_name] = [
+                    sinfo.st_mtime, sinfo.st_size,
+                    self.content_hash(pkg_name)]
+        return fingerprints
+
     def __getitem__(self, item):
         return self._packages_to_stats[item]
 
@@ -223,14 +266,31 @@ class TagIndex(Mapping):
         package = path.get(pkg_name)
 
         # Remove the package from the list of packages, if present
-        for pkg_list in self._tag_dict.values():
-            if pkg_name in pkg_list:
-                pkg_list.remove(pkg_name)
+        self.remove_package(pkg_name)
 
         # Add it again under the appropriate tags
         for tag in getattr(package, 'tags', []):
             self._tag_dict[tag].append(package.name)
 
+    def remove_package(self, pkg_name):
+        """Removes a package from the tag index.
+
+        Args:
+            pkg_name (str): name of the package, with or without namespace
+        """
+        pkg_name = pkg_name.rpartition('.')[2]
+        for tag, pkg_list in list(self._tag_dict.items()):
+            if pkg_name in pkg_list:
+                pkg_list.remove(pkg_name)
+            if not pkg_list:
+                del self._tag_dict[tag]
+
+    def merge(self, other):
+        """Merge another tag index into this one."""
+        for tag, pkg_list in other.items():
+            self._tag_dict[tag].extend(
+                p for p in pkg_list if p not in self._tag_dict[tag])
+
 
 @add_metaclass(abc.ABCMeta)
 class Indexer(object):
@@ -259,6 +319,15 @@ class Indexer(object):
         """
         return False
 
+    def code_mtime(self):
+        """Latest modification time of the Spack code the index depends on.
+
+        Returns:
+            (float): the index is updated for all packages if it is older
+                than this, 0 if it only depends on package files.
+        """
+        return 0
+
     @abc.abstractmethod
     def read(self, stream):
         """Read this index from a provided file object."""
@@ -267,6 +336,18 @@ class Indexer(object):
     def update(self, pkg_fullname):
         """Update the index in memory with information about a package."""
 
+    @abc.abstractmethod
+    def remove(self, pkg_fullname):
+        """Remove everything about a package from the index in memory."""
+
+    @abc.abstractmethod
+    def merge(self, stream):
+        """Merge an index written by ``write()`` into the one in memory.
+
+        The packages in the other index must have been removed from this
+        one first.
+        """
+
     @abc.abstractmethod
     def write(self, stream):
         """Write the index to a file object."""
@@ -283,6 +364,12 @@ class TagIndexer(Indexer):
     def update(self, pkg_fullname):
         self.index.update_package(pkg_fullname)
 
+    def remove(self, pkg_fullname):
+        self.index.remove_package(pkg_fullname)
+
+    def merge(self, stream):
+        self.index.merge(TagIndex.from_json(stream))
+
     def write(self, stream):
         self.index.to_json(stream)
 
@@ -299,6 +386,12 @@ class ProviderIndexer(Indexer):
         self.index.remove_provider(pkg_fullname)
         self.index.update(pkg_fullname)
 
+    def remove(self, pkg_fullname):
+        self.index.remove_provider(pkg_fullname)
+
+    def merge(self, stream):
+        self.index.merge(ProviderIndex.from_json(stream))
+
     def write(self, stream):
         self.index.to_json(stream)
 
@@ -324,6 +417,43 @@ class PatchIndexer(Indexer):
     def update(self, pkg_fullname):
         self.index.update_package(pkg_fullname)
 
+    def remove(self, pkg_fullname):
+        self.index.remove_package(pkg_fullname)
+
+    def merge(self, stream):
+        self.index.update(spack.patch.PatchCache.from_json(stream))
+
+
+class MetadataIndexer(Indexer):
+    """Lifecycle methods for the metadata of packages."""
+    def _create(self):
+        return spack.package_metadata.MetadataIndex()
+
+    def code_mtime(self):
+        # Base classes in spack.build_systems declare directives too
+        build_systems = os.path.join(spack.paths.module_path, 'build_systems')
+        paths = [os.path.join(build_systems, f)
+                 for f in os.listdir(build_systems) if f.endswith('.py')]
+        paths.extend(os.path.join(spack.paths.module_path, f)
+                     for f in ('directives.py', 'package.py'))
+        return max(os.path.getmtime(p) for p in paths)
+
+    def read(self, stream):
+        self.index = spack.package_metadata.MetadataIndex.from_json(stream)
+
+    def update(self, pkg_fullname):
+        self.index.update_package(pkg_fullname)
+
+    def remove(self, pkg_fullname):
+        self.index.remove_package(pkg_fullname)
+
+    def merge(self, stream):
+        self.index.merge(
+            spack.package_metadata.MetadataIndex.from_json(stream))
+
+    def write(self, stream):
+        self.index.to_json(stream)
+
 
 class RepoIndex(object):
     """Container class that manages a set of Indexers for a Repo.
@@ -337,7 +467,8 @@ class RepoIndex(object):
     defined by ``Indexer``, so that the ``RepoIndex`` can read, generate,
     and update stored indices.
 
-    Generated indexes are accessed by name via ``__getitem__()``.
+    Generated indexes are accessed by name via ``__getitem__()``.  Stored
+    indexes that are up to date are only read when they are accessed.
 
     """
     def __init__(self, package_checker, namespace):
@@ -347,6 +478,7 @@ class RepoIndex(object):
 
         self.indexers = {}
         self.indexes = {}
+        self._checked = False
 
     def add_indexer(self, name, indexer):
         """Add an indexer to the repo index.
@@ -366,13 +498,16 @@ class RepoIndex(object):
         if not indexer:
             raise KeyError('no such index: %s' % name)
 
+        if name not in self.indexes and not self._checked:
+            self._update_indexes()
+
         if name not in self.indexes:
-            self._build_all_indexes()
+            self.indexes[name] = self._build_index(name, indexer, [], [], [])
 
         return self.indexes[name]
 
-    def _build_all_indexes(self):
-        """Build all the indexes at once.
+    def _update_indexes(self):
+        """Update all the indexes at once if any package changed.
 
         We regenerate *all* indexes whenever *any* index needs an update,
         because the main bottleneck here is loading all the packages.  It
@@ -380,27 +515,114 @@ class RepoIndex(object):
         rather only pay that cost once rather than on several
         invocations.
 
+        Packages whose file changed are imported once for all the
+        indexes.  When there are many of them, they are imported and
+        indexed by a pool of processes, and the partial indexes of the
+        workers are merged into the stored ones.
+
+        If no package changed, no index is read here.
+
+        """
+        misc_cache = spack.caches.misc_cache
+        fingerprints_filename = 'packages/{0}-fingerprints.json'.format(
+            self.namespace)
+
+        known = {}
+        if misc_cache.init_entry(fingerprints_filename):
+            with misc_cache.read_transaction(fingerprints_filename) as f:
+                try:
+                    known = sjson.load(f)['fingerprints']
+                except (ValueError, KeyError, TypeError):
+                    pass
+        fingerprints = self.checker.fingerprints(known)
+
+        # Compute which packages need to be updated in the indexes
+        if any(self._outdated(name, indexer)
+               for name, indexer in self.indexers.items()):
+            needs_update = sorted(fingerprints)
+        else:
+            needs_update = sorted(
+                x for x, fingerprint in fingerprints.items()
+                if known.get(x, [None] * 3)[2] != fingerprint[2])
+        removed = sorted(set(known) - set(fingerprints))
+
+        if removed or needs_update:
+            partial_indexes, in_process = {}, needs_update
+            if (len(needs_update) >= _parallel_index_threshold and
+                    _index_jobs() > 1):
+                partial_indexes, in_process = self._index_in_pool(
+                    needs_update)
+
+            for name, indexer in self.indexers.items():
+                self.indexes[name] = self._build_index(
+                    name, indexer, removed + needs_update,
+                    partial_indexes.get(name, []), in_process)
+        self._checked = True
+
+        if fingerprints != known:
+            with misc_cache.write_transaction(fingerprints_filename) as (
+                    old, new):
+                sjson.dump({'fingerprints': fingerprints}, new)
+
+    def _outdated(self, name, indexer):
+        """Whether an index must be updated for all the packages."""
+        cache_filename = '{0}/{1}-index.json'.format(name, self.namespace)
+        index_mtime = spack.caches.misc_cache.mtime(cache_filename)
+        return not index_mtime or indexer.code_mtime() > index_mtime
+
+    def _index_in_pool(self, pkg_names):
+        """Index packages in worker processes.
+
+        Returns:
+            (tuple): dict mapping indexer names to the partial indexes
+                written by the workers, and names of the packages the
+                workers could not index
         """
-        for name, indexer in self.indexers.items():
-            self.indexes[name] = self._build_index(name, indexer)
+        jobs = min(_index_jobs(), len(pkg_names))
+        chunk_size = -(-len(pkg_names) // (jobs * 4))
+        chunks = [pkg_names[i:i + chunk_size]
+                  for i in range(0, len(pkg_names), chunk_size)]
+        indexer_types = dict(
+            (name, type(indexer)) for name, indexer in self.indexers.items())
+
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(_index_packages, [
+                (indexer_types, self.namespace, chunk) for chunk in chunks])
+        finally:
+            pool.terminate()
+            pool.join()
+
+        partial_indexes, failed = {}, []
+        for chunk, result in zip(chunks, results):
+            if result is None:
+                # Index these again here, to report what went wrong
+                failed.extend(chunk)
+                continue
+            for name, text in result.items():
+                partial_indexes.setdefault(name, []).append(text)
+        return partial_indexes, failed
 
-    def _build_index(self, name, indexer):
-        """Determine which packages need an update, and update indexes."""
+    def _build_index(
+            self, name, indexer, stale, partial_indexes, needs_update):
+        """Read an index, and update it if needed.
+
+        Args:
+            name (str): name of the index
+            indexer (Indexer): indexer of the index
+            stale (list): names of the packages to remove from the index
+            partial_indexes (list): indexes of some of the stale packages,
+                written by worker processes, to merge into the index
+            needs_update (list): names of the stale packages to index in
+                this process
+        """
 
         # Filename of the provider index cache (we assume they're all json)
         cache_filename = '{0}/{1}-index.json'.format(name, self.namespace)
-
-        # Compute which packages needs to be updated in the cache
         misc_cache = spack.caches.misc_cache
-        index_mtime = misc_cache.mtime(cache_filename)
-
-        needs_update = [
-            x for x, sinfo in self.checker.items()
-            if sinfo.st_mtime > index_mtime
-        ]
 
         index_existed = misc_cache.init_entry(cache_filename)
-        if index_existed and not needs_update:
+        if index_existed and not stale:
             # If the index exists and doesn't need an update, read it
             with misc_cache.read_transaction(cache_filename) as f:
                 indexer.read(f)
@@ -410,6 +632,12 @@ class RepoIndex(object):
             with misc_cache.write_transaction(cache_filename) as (old, new):
                 indexer.read(old) if old else indexer.create()
 
+                for pkg_name in stale:
+                    indexer.remove('%s.%s' % (self.namespace, pkg_name))
+
+                for text in partial_indexes:
+                    indexer.merge(StringIO(text))
+
                 for pkg_name in needs_update:
                     namespaced_name = '%s.%s' % (self.namespace, pkg_name)
                     indexer.update(namespaced_name)
@@ -419,6 +647,44 @@ class RepoIndex(object):
         return indexer.index
 
 
+#: Fewer changed packages than this are indexed in the Spack process
+_parallel_index_threshold = 32
+
+
+def _index_jobs():
+    """Number of processes that index packages."""
+    return multiprocessing.cpu_count()
+
+
+def _index_packages(args):
+    """Index some packages of a repository in a worker process.
+
+    Args:
+        args (tuple): types of the indexers by name, namespace of the
+            repository and names of the packages to index
+
+    Returns:
+        (dict): maps the names of the indexers to indexes of the
+            packages, written by their ``write()`` method, or None if
+            the packages could not be indexed
+    """
+    indexer_types, namespace, pkg_names = args
+    try:
+        result = {}
+        for name, indexer_type in indexer_types.items():
+            indexer = indexer_type()
+            indexer.create()
+            for pkg_name in pkg_names:
+                indexer.update('%s.%s' % (namespace, pkg_name))
+
+            stream = StringIO()
+            indexer.write(stream)
+            result[name] = stream.getvalue()
+        return result
+    except Exception:
+        return None
+
+
 class RepoPath(object):
     """A RepoPath is a list of repos that function as one.
 
@@ -646,6 +912,10 @@ class RepoPath(object):
         """Find a class for the spec's package and return the class object."""
         return self.repo_for_pkg(pkg_name).get_pkg_class(pkg_name)
 
+    def get_pkg_descriptor(self, pkg_name):
+        """Find the metadata of a package, without loading its code."""
+        return self.repo_for_pkg(pkg_name).get_pkg_descriptor(pkg_name)
+
     @_autospec
     def dump_provenance(self, spec, path):
         """Dump provenance information for a spec to a particular path.
@@ -944,6 +1214,7 @@ class Repo(object):
             self._repo_index.add_indexer('providers', ProviderIndexer())
             self._repo_index.add_indexer('tags', TagIndexer())
             self._repo_index.add_indexer('patches', PatchIndexer())
+            self._repo_index.add_indexer('metadata', MetadataIndexer())
         return self._repo_index
 
     @property
@@ -961,6 +1232,11 @@ class Repo(object):
         """Index of patches and packages they're defined on."""
         return self.index['patches']
 
+    @property
+    def metadata_index(self):
+        """Index of the metadata declared by packages."""
+        return self.index['metadata']
+
     @_autospec
     def providers_for(self, vpkg_spec):
         providers = self.provider_index.providers_for(vpkg_spec)
@@ -1059,8 +1335,9 @@ class Repo(object):
             fullname = "%s.%s" % (self.full_namespace, pkg_name)
 
             try:
-                module = simp.load_source(fullname, file_path,
-                                          prepend=_package_prepend)
+                module = simp.load_cached_source(
+                    fullname, file_path, _package_code_cache_dir(),
+                    prepend=_package_prepend)
             except SyntaxError as e:
                 # SyntaxError strips the path from the filename so we need to
                 # manually construct the error message in order to give the
@@ -1094,6 +1371,23 @@ class Repo(object):
 
         return cls
 
+    def get_pkg_descriptor(self, pkg_name):
+        """Get the metadata of a package from the index of this repo.
+
+        This does not load the package, unless the index is out of date.
+
+        Returns:
+            (spack.package_metadata.PackageDescriptor): the metadata
+        """
+        namespace, _, pkg_name = pkg_name.rpartition('.')
+        if namespace and (namespace != self.namespace):
+            raise InvalidNamespaceError('Invalid namespace for %s repo: %s'
+                                        % (self.namespace, namespace))
+
+        if not self.exists(pkg_name) or pkg_name not in self.metadata_index:
+            raise UnknownPackageError(pkg_name, self)
+        return self.metadata_index[pkg_name]
+
     def __str__(self):
         return "[Repo '%s' at '%s']" % (self.namespace, self.root)
 
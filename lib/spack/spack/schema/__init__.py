@@ -11,13 +11,13 @@ import re
 import six
 
 import llnl.util.lang
-import spack.spec
 
 
-# jsonschema is imported lazily as it is heavy to import
-# and increases the start-up time
+# jsonschema and spack.spec are imported lazily as they are heavy to
+# import and increase the start-up time
 def _make_validator():
     import jsonschema
+    import spack.spec
     _validate_properties = jsonschema.Draft4Validator.VALIDATORS["properties"]
     _validate_pattern_properties = jsonschema.Draft4Validator.VALIDATORS[
         "patternProperties"
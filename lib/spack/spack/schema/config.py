@@ -39,7 +39,14 @@ properties = {
                 },
             },
             'source_cache': {'type': 'string'},
+            'source_cache_limit': {
+                'anyOf': [
+                    {'type': 'integer', 'minimum': 0},
+                    {'type': 'string', 'pattern': r'^\d+\s*[kKmMgGtT]?$'},
+                ],
+            },
             'misc_cache': {'type': 'string'},
+            'web_cache_ttl': {'type': 'integer', 'minimum': 0},
             'verify_ssl': {'type': 'boolean'},
             'debug': {'type': 'boolean'},
             'checksum': {'type': 'boolean'},
@@ -47,7 +54,9 @@ properties = {
             'dirty': {'type': 'boolean'},
             'build_language': {'type': 'string'},
             'build_jobs': {'type': 'integer', 'minimum': 1},
+            'concurrent_builds': {'type': 'integer', 'minimum': 1},
             'ccache': {'type': 'boolean'},
+            'concretization_cache': {'type': 'boolean'},
             'db_lock_timeout': {'type': 'integer', 'minimum': 1},
             'package_lock_timeout': {
                 'anyOf': [
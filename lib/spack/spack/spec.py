@@ -79,7 +79,6 @@ expansion when it is the first character in an id typed on the command line.
 import base64
 import sys
 import collections
-import ctypes
 import hashlib
 import itertools
 import os
@@ -113,7 +112,7 @@ from spack.util.crypto import prefix_bits
 from spack.util.executable import Executable
 from spack.util.prefix import Prefix
 from spack.util.spack_yaml import syaml_dict
-from spack.util.string import comma_or
+from spack.util.string import comma_or, intern
 from spack.variant import MultiValuedVariant, AbstractVariant
 from spack.variant import BoolValuedVariant, substitute_abstract_variants
 from spack.variant import VariantMap, UnknownVariantError
@@ -183,8 +182,8 @@ _separators = '[\\%s]' % '\\'.join(color_formats.keys())
 #: every time we call str()
 _any_version = VersionList([':'])
 
-#: Max integer helps avoid passing too large a value to cyaml.
-maxint = 2 ** (ctypes.sizeof(ctypes.c_int) * 8 - 1) - 1
+#: Dependency types that are part of the dag_hash and full_hash
+_hash_deptypes = ('link', 'run')
 
 
 def colorize_spec(spec):
@@ -215,6 +214,8 @@ class ArchSpec(object):
         RHEL6), and a target (e.g. x86_64).
     """
 
+    __slots__ = ('_platform', '_platform_os', '_target')
+
     # TODO: Formalize the specifications for architectures and then use
     # the appropriate parser here to read these specifications.
     def __init__(self, *args):
@@ -264,7 +265,7 @@ class ArchSpec(object):
             supported Spack platform before it's set to ensure all specs
             refer to valid platforms.
         """
-        value = str(value) if value is not None else None
+        value = intern(str(value)) if value is not None else None
         self._platform = value
 
     @property
@@ -294,7 +295,7 @@ class ArchSpec(object):
             spec_platform = spack.architecture.get_platform(self.platform)
             value = str(spec_platform.operating_system(value))
 
-        self._platform_os = value
+        self._platform_os = intern(value)
 
     @property
     def target(self):
@@ -323,7 +324,7 @@ class ArchSpec(object):
             spec_platform = spack.architecture.get_platform(self.platform)
             value = str(spec_platform.target(value))
 
-        self._target = value
+        self._target = intern(value)
 
     def satisfies(self, other, strict=False):
         other = self._autospec(other)
@@ -414,6 +415,8 @@ class CompilerSpec(object):
        versions that a package should be built with.  CompilerSpecs have a
        name and a version list. """
 
+    __slots__ = ('name', 'versions')
+
     def __init__(self, *args):
         nargs = len(args)
         if nargs == 1:
@@ -436,7 +439,7 @@ class CompilerSpec(object):
 
         elif nargs == 2:
             name, version = args
-            self.name = name
+            self.name = intern(name)
             self.versions = VersionList()
             self.versions.add(ver(version))
 
@@ -529,6 +532,8 @@ class DependencySpec(object):
     - deptypes: list of strings, representing dependency relationships.
     """
 
+    __slots__ = ('parent', 'spec', 'deptypes')
+
     def __init__(self, parent, spec, deptypes):
         self.parent = parent
         self.spec = spec
@@ -1279,8 +1284,7 @@ class Spec(object):
         if self._hash:
             return self._hash[:length]
         else:
-            yaml_text = syaml.dump(
-                self.to_node_dict(), default_flow_style=True, width=maxint)
+            yaml_text = syaml.dump_flow(self.to_node_dict())
             sha = hashlib.sha1(yaml_text.encode('utf-8'))
 
             b32_hash = base64.b32encode(sha.digest()).lower()
@@ -1300,9 +1304,8 @@ class Spec(object):
             raise SpecError("Spec is not concrete: " + str(self))
 
         if not self._full_hash:
-            yaml_text = syaml.dump(
-                self.to_node_dict(hash_function=lambda s: s.full_hash()),
-                default_flow_style=True, width=maxint)
+            yaml_text = syaml.dump_flow(
+                self.to_node_dict(hash_function=lambda s: s.full_hash()))
             package_hash = self.package.content_hash()
             sha = hashlib.sha1(yaml_text.encode('utf-8') + package_hash)
 
@@ -1358,7 +1361,7 @@ class Spec(object):
         if all_deps:
             deptypes = ('link', 'run', 'build')
         else:
-            deptypes = ('link', 'run')
+            deptypes = _hash_deptypes
         deps = self.dependencies_dict(deptype=deptypes)
         if deps:
             if hash_function is None:
@@ -1398,8 +1401,11 @@ class Spec(object):
         name = next(iter(node))
         node = node[name]
 
-        spec = Spec(name, full_hash=node.get('full_hash', None))
-        spec.namespace = node.get('namespace', None)
+        # The name is set directly: running the parser on it would only
+        # cost time and memory for every node that is read
+        spec = Spec(full_hash=node.get('full_hash', None))
+        spec.name = intern(name)
+        spec.namespace = intern(node.get('namespace', None))
         spec._hash = node.get('hash', None)
 
         if 'version' in node or 'versions' in node:
@@ -1415,6 +1421,7 @@ class Spec(object):
 
         if 'parameters' in node:
             for name, value in node['parameters'].items():
+                name = intern(name)
                 if name in _valid_compiler_flags:
                     spec.compiler_flags[name] = value
                 else:
@@ -1422,6 +1429,7 @@ class Spec(object):
                         name, value)
         elif 'variants' in node:
             for name, value in node['variants'].items():
+                name = intern(name)
                 spec.variants[name] = MultiValuedVariant.from_node_dict(
                     name, value
                 )
@@ -1491,7 +1499,7 @@ class Spec(object):
             else:
                 raise SpecError("Couldn't parse dependency types in spec.")
 
-            yield dep_name, dag_hash, list(deptypes)
+            yield dep_name, dag_hash, [intern(d) for d in deptypes]
 
     @staticmethod
     def from_literal(spec_dict, normal=True):
@@ -1890,6 +1898,16 @@ class Spec(object):
         if self._concrete:
             return
 
+        # Reuse the result of a previous concretization of the same spec
+        import spack.concretize
+        cache = spack.concretize.concretization_cache()
+        cache_key = cache.key(self, tests) if cache else None
+        if cache_key:
+            cached = cache.fetch(cache_key)
+            if cached is not None:
+                self._dup(cached, caches=True)
+                return
+
         changed = True
         force = False
 
@@ -1993,6 +2011,9 @@ class Spec(object):
         if matches:
             raise ConflictsInSpecError(self, matches)
 
+        if cache_key:
+            cache.store(cache_key, self)
+
     def _mark_concrete(self, value=True):
         """Mark this spec and its dependencies as concrete.
 
@@ -2761,6 +2782,19 @@ class Spec(object):
         self.external_module = other.external_module
         self.namespace = other.namespace
 
+        # If caller restricted deptypes to be copied, adjust that here.
+        # By default, just copy all deptypes
+        deptypes = ()
+        if deps:
+            deptypes = all_deptypes
+            if isinstance(deps, (tuple, list)):
+                deptypes = deps
+
+        # Hashes of concrete specs only cover link and run dependencies,
+        # so unless told otherwise they are kept when those are copied.
+        hashes = caches is None and all(
+            d in deptypes for d in _hash_deptypes)
+
         # Cached fields are results of expensive operations.
         # If we preserved the original structure, we can copy them
         # safely. If not, they need to be recomputed.
@@ -2769,12 +2803,7 @@ class Spec(object):
 
         # If we copy dependencies, preserve DAG structure in the new spec
         if deps:
-            # If caller restricted deptypes to be copied, adjust that here.
-            # By default, just copy all deptypes
-            deptypes = all_deptypes
-            if isinstance(deps, (tuple, list)):
-                deptypes = deps
-            self._dup_deps(other, deptypes, caches)
+            self._dup_deps(other, deptypes, caches, hashes)
 
         self._concrete = other._concrete
 
@@ -2789,9 +2818,13 @@ class Spec(object):
             self._normal = False
             self._full_hash = None
 
+            if hashes and other._concrete:
+                self._hash = other._hash
+                self._full_hash = other._full_hash
+
         return changed
 
-    def _dup_deps(self, other, deptypes, caches):
+    def _dup_deps(self, other, deptypes, caches, hashes=False):
         new_specs = {self.name: self}
         for dspec in other.traverse_edges(cover='edges',
                                           root=False):
@@ -2809,6 +2842,12 @@ class Spec(object):
             new_specs[dspec.parent.name]._add_dependency(
                 new_specs[dspec.spec.name], dspec.deptypes)
 
+        if hashes and not caches:
+            for spec in other.traverse(root=False):
+                if spec._concrete and spec.name in new_specs:
+                    new_specs[spec.name]._hash = spec._hash
+                    new_specs[spec.name]._full_hash = spec._full_hash
+
     def copy(self, deps=True, **kwargs):
         """Make a copy of this spec.
 
@@ -3536,8 +3575,8 @@ class SpecParser(spack.parse.Parser):
             spec = self._initial
             self._initial = None
 
-        spec.namespace = spec_namespace
-        spec.name = spec_name
+        spec.namespace = intern(spec_namespace)
+        spec.name = intern(spec_name)
 
         while self.next:
             if self.accept(AT):
@@ -3631,7 +3670,7 @@ class SpecParser(spack.parse.Parser):
         self.check_identifier()
 
         compiler = CompilerSpec.__new__(CompilerSpec)
-        compiler.name = self.token.value
+        compiler.name = intern(self.token.value)
         compiler.versions = VersionList()
         if self.accept(AT):
             vlist = self.version_list()
@@ -10,6 +10,7 @@ import errno
 import hashlib
 import tempfile
 import getpass
+import threading
 from six import string_types
 from six import iteritems
 from six.moves.urllib.parse import urljoin
@@ -487,11 +488,14 @@ class Stage(object):
         """Removes this stage directory."""
         remove_linked_tree(self.path)
 
-        # Make sure we don't end up in a removed directory
-        try:
-            os.getcwd()
-        except OSError:
-            os.chdir(os.path.dirname(self.path))
+        # Make sure we don't end up in a removed directory.  The working
+        # directory belongs to the whole process, so stages destroyed in
+        # other threads (e.g., while creating mirrors) leave it alone.
+        if threading.current_thread().name == 'MainThread':
+            try:
+                os.getcwd()
+            except OSError:
+                os.chdir(os.path.dirname(self.path))
 
         # mark as destroyed
         self.created = False
@@ -62,9 +62,9 @@ class Store(object):
         self.layout = spack.directory_layout.YamlDirectoryLayout(
             root, hash_len=hash_length, path_scheme=path_scheme)
 
-    def reindex(self):
+    def reindex(self, jobs=1, progress=False):
         """Convenience function to reindex the store DB with its own layout."""
-        return self.db.reindex(self.layout)
+        return self.db.reindex(self.layout, jobs=jobs, progress=progress)
 
 
 def _store():
@@ -6,6 +6,7 @@
 import pytest
 import spack.stage
 import spack.caches
+import spack.fetch_strategy
 import spack.main
 import spack.package
 
@@ -52,3 +53,14 @@ def test_function_calls(command_line, counters):
     assert spack.stage.purge.call_count == counters[1]
     assert spack.caches.fetch_cache.destroy.call_count == counters[2]
     assert spack.caches.misc_cache.destroy.call_count == counters[3]
+
+
+def test_cache_stats(tmpdir, monkeypatch, mock_calls_for_clean):
+    cache = spack.fetch_strategy.FsCache(str(tmpdir))
+    monkeypatch.setattr(spack.caches, 'fetch_cache', cache)
+
+    out = clean('--cache-stats')
+
+    assert 'Archives:       0 (0 paths)' in out
+    assert 'limit: none' in out
+    assert spack.stage.purge.call_count == 0
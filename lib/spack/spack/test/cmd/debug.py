@@ -28,7 +28,7 @@ def test_create_db_tarball(tmpdir, database):
         contents = tar('tzf', tarball_name, output=str)
 
         # DB file is included
-        assert 'index.json' in contents
+        assert 'index.records' in contents
 
         # spec.yamls from all installs are included
         for spec in database.query():
@@ -92,6 +92,19 @@ def test_concretize():
     assert any(x.name == 'mpileaks' for x in env_specs)
 
 
+def test_concretize_with_jobs():
+    e = ev.create('test')
+    e.add('mpileaks ^zmpi')
+    e.add('libelf')
+    e.add('dyninst')
+    e.concretize(jobs=3)
+
+    assert e.concretized_user_specs == e.user_specs
+    for uspec, h in zip(e.concretized_user_specs, e.concretized_order):
+        assert e.specs_by_hash[h].satisfies(uspec)
+    assert e.specs_by_hash[e.concretized_order[0]].satisfies('^zmpi')
+
+
 def test_env_install_all(install_mockery, mock_fetch):
     e = ev.create('test')
     e.add('cmake-client')
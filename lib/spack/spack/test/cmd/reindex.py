@@ -0,0 +1,29 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import spack.store
+from spack.main import SpackCommand
+
+reindex = SpackCommand('reindex')
+
+
+def test_reindex_reports_throughput(mutable_database, capfd):
+    with mutable_database.read_transaction():
+        expected = mutable_database.query(installed=any)
+
+    with capfd.disabled():
+        output = reindex('-j', '2')
+
+    assert 'Reindexed {0} prefixes'.format(
+        len(spack.store.layout.all_spec_files())) in output
+    with mutable_database.read_transaction():
+        assert mutable_database.query(installed=any) == expected
+
+
+def test_reindex_rejects_bad_jobs(mutable_database, capfd):
+    with capfd.disabled():
+        output = reindex('-j', '0', fail_on_error=False)
+    assert 'must be a positive integer' in output
+    assert reindex.returncode != 0
@@ -7,6 +7,7 @@ from copy import copy
 from six import iteritems
 
 import spack.spec
+import spack.version
 import spack.compilers as compilers
 from spack.compiler import _get_versioned_tuple, Compiler
 
@@ -30,6 +31,15 @@ def test_all_compilers(config):
     assert len(filtered) == 1
 
 
+def test_compiler_specs_are_not_shared(config):
+    specs = compilers.all_compiler_specs()
+    gcc = next(s for s in specs if str(s) == 'gcc@4.5.0')
+    gcc.versions = spack.version.ver('4.5.0:4.6')
+
+    assert 'gcc@4.5.0' in [str(s) for s in compilers.all_compiler_specs()]
+    assert all(str(s) != 'gcc@4.5.0:4.6' for s in compilers.find('gcc'))
+
+
 def test_version_detection_is_empty():
     no_version = lambda x: None
     compiler_check_tuple = ('/usr/bin/gcc', '', r'\d\d', no_version)
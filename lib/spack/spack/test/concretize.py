@@ -3,11 +3,19 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import os
+
 import pytest
 import llnl.util.lang
 
 import spack.architecture
+import spack.caches
+import spack.concretize
+import spack.config
+import spack.error
+import spack.package_prefs
 import spack.repo
+import spack.util.file_cache
 
 from spack.concretize import find_spec
 from spack.spec import Spec, CompilerSpec
@@ -520,3 +528,132 @@ class TestConcretize(object):
         t.concretize()
 
         assert s.dag_hash() == t.dag_hash()
+
+
+@pytest.fixture()
+def concretization_cache(mutable_config, mock_packages, tmpdir, monkeypatch):
+    """Enables the concretization cache, in a temporary misc_cache."""
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    spack.config.set('config:concretization_cache', True)
+    return spack.concretize.concretization_cache()
+
+
+@pytest.mark.parametrize('abstract', [
+    'mpileaks',
+    'mpileaks ^mpich2@1.1',
+    'mpich cppflags="-O3"',
+    'cmake-client ^cmake@3.4.3',
+    'externaltool',
+    'patch-several-dependencies',
+    'simple-inheritance~openblas',
+])
+def test_concretization_cache_reuses_specs(concretization_cache, abstract):
+    key = concretization_cache.key(Spec(abstract))
+    assert concretization_cache.fetch(key) is None
+
+    concrete = Spec(abstract).concretized()
+    cached = concretization_cache.fetch(key)
+    assert cached is not None
+
+    # A spec concretized again comes from the cache, and is the same
+    again = Spec(abstract).concretized()
+    for s in (cached, again):
+        assert s.concrete
+        assert s.dag_hash() == concrete.dag_hash()
+        assert s.to_dict(all_deps=True) == concrete.to_dict(all_deps=True)
+        assert s.tree(deptypes='all') == concrete.tree(deptypes='all')
+
+
+def test_concretization_cache_detects_changes(
+        concretization_cache, monkeypatch):
+    key = concretization_cache.key(Spec('mpileaks'))
+    Spec('mpileaks').concretized()
+    assert concretization_cache.fetch(key) is not None
+
+    # Changed preferences give another key
+    spack.config.set('packages', {'all': {'providers': {'mpi': ['zmpi']}}})
+    spack.package_prefs.PackagePrefs.clear_caches()
+    assert concretization_cache.key(Spec('mpileaks')) != key
+    assert Spec('mpileaks').concretized().satisfies('^zmpi')
+    spack.package_prefs.PackagePrefs.clear_caches()
+
+    # Changed package files make the entry stale
+    monkeypatch.setattr(spack.concretize, '_package_dir_hash',
+                        lambda path: 'changed')
+    assert concretization_cache.fetch(key) is None
+
+    # So does a change to the code of Spack, with the same version
+    monkeypatch.setattr(spack.concretize, '_spack_code_hash',
+                        lambda: 'changed')
+    assert concretization_cache.key(Spec('mpileaks')) != key
+
+
+def test_concretization_cache_is_pruned(concretization_cache, monkeypatch):
+    monkeypatch.setattr(spack.concretize, '_cache_max_entries', 3)
+    monkeypatch.setattr(spack.concretize, '_cache_pruned_entries', 2)
+    directory = concretization_cache.file_cache.cache_path('concretization')
+
+    keys = []
+    for i, abstract in enumerate(['libelf', 'libdwarf', 'mpich']):
+        keys.append(concretization_cache.key(Spec(abstract)))
+        Spec(abstract).concretized()
+        os.utime(concretization_cache.file_cache.cache_path(keys[-1]),
+                 (i, i))
+
+    # Using an entry keeps it when the cache is pruned
+    assert concretization_cache.fetch(keys[0]) is not None
+    Spec('dyninst').concretized()
+
+    assert len([n for n in os.listdir(directory) if n.endswith('.json')]) == 2
+    assert concretization_cache.fetch(keys[0]) is not None
+    assert concretization_cache.fetch(keys[1]) is None
+
+
+def test_concretization_cache_skips_hash_references(
+        concretization_cache):
+    libelf = Spec('libelf').concretized()
+    spec = Spec('libdwarf')
+    spec._add_dependency(libelf, ('build', 'link'))
+    assert concretization_cache.key(spec) is None
+
+
+def test_concretization_cache_can_be_disabled(concretization_cache):
+    spack.config.set('config:concretization_cache', False)
+    assert spack.concretize.concretization_cache() is None
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_concretize_specs_matches_serial(mock_packages, config, jobs):
+    abstract = [Spec(s) for s in (
+        'mpileaks', 'libelf', 'mpileaks ^mpich2', 'libelf', 'dyninst')]
+
+    concrete = spack.concretize.concretize_specs(abstract, jobs=jobs)
+    assert len(concrete) == len(abstract)
+    for a, c in zip(abstract, concrete):
+        assert c.concrete
+        assert not a.concrete
+        assert c.dag_hash() == a.concretized().dag_hash()
+
+    # Equal roots are concretized only once
+    assert concrete[1] is concrete[3]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_concretize_specs_raises_errors(mock_packages, config, jobs):
+    abstract = [Spec('mpileaks'), Spec('conflict%clang+foo')]
+    with pytest.raises(spack.error.SpackError) as e:
+        spack.concretize.concretize_specs(abstract, jobs=jobs)
+    assert '"%clang" conflicts with "conflict+foo"' in str(e.value)
+
+
+def test_concretize_specs_uses_cache(concretization_cache, monkeypatch):
+    Spec('mpileaks').concretized()
+
+    def fail(spec, tests):
+        raise AssertionError('%s was not taken from the cache' % spec)
+    monkeypatch.setattr(spack.concretize, '_concretized', fail)
+
+    concrete, = spack.concretize.concretize_specs([Spec('mpileaks')])
+    assert concrete.satisfies('mpileaks')
+    assert concrete.concrete
@@ -673,6 +673,59 @@ env:
             '/x/y/z', '$spack/var/spack/repos/builtin']
 
 
+def test_merged_sections_are_cached(mock_config, write_config_file):
+    write_config_file('config', config_low, 'low')
+    write_config_file('config', config_override_key, 'high')
+
+    first = mock_config.get_config('config')
+    first['install_tree'] = 'modified'
+    assert mock_config.get_config('config')['install_tree'] == 'override_key'
+    low = mock_config.get_config('config', scope='low')
+    assert low == config_low['config']
+    assert mock_config.read_stats() == {'config': (3, 1)}
+
+
+def test_values_of_merged_sections_are_copied(
+        mock_config, write_config_file):
+    write_config_file('config', {'config': {
+        'build_stage': ['/first/stage'],
+        'module_roots': {'tcl': '/tcl/modules'}}}, 'low')
+
+    mock_config.get('config:build_stage').append('/second/stage')
+    mock_config.get('config:module_roots')['lmod'] = '/lmod/modules'
+    assert mock_config.get('config:build_stage') == ['/first/stage']
+    assert mock_config.get('config:module_roots') == {'tcl': '/tcl/modules'}
+    assert mock_config.read_stats()['config'][1] == 1
+
+
+def test_merged_sections_are_invalidated(mock_config, write_config_file):
+    write_config_file('config', config_low, 'low')
+    assert mock_config.get('config:install_tree') == 'install_tree_path'
+
+    mock_config.set('config:install_tree', 'set_path', scope='high')
+    assert mock_config.get('config:install_tree') == 'set_path'
+
+    with spack.config.override('config:install_tree', 'override_path'):
+        assert mock_config.get('config:install_tree') == 'override_path'
+    assert mock_config.get('config:install_tree') == 'set_path'
+
+    mock_config.remove_scope('high')
+    assert mock_config.get('config:install_tree') == 'install_tree_path'
+    assert mock_config.read_stats()['config'][1] == 5
+
+
+def test_merged_sections_follow_file_changes(mock_config, write_config_file):
+    write_config_file('config', config_low, 'low')
+    assert mock_config.get('config:install_tree') == 'install_tree_path'
+
+    # Files that are created or modified are read again
+    write_config_file('config', config_override_key, 'high')
+    assert mock_config.get('config:install_tree') == 'override_key'
+    write_config_file('config', config_override_all, 'high')
+    assert mock_config.get('config') == {'install_tree': 'override_all'}
+    assert mock_config.read_stats()['config'] == (3, 3)
+
+
 def check_schema(name, file_contents):
     """Check a Spack YAML schema against some data"""
     f = StringIO(file_contents)
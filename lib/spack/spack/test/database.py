@@ -15,8 +15,11 @@ import pytest
 
 from llnl.util.tty.colify import colify
 
+import spack.database
+import spack.directory_layout
 import spack.repo
 import spack.store
+import spack.util.spack_json as sjson
 from spack.test.conftest import MockPackageMultiRepo
 from spack.util.executable import Executable
 
@@ -194,7 +197,7 @@ def test_default_queries(database):
 
 def test_005_db_exists(database):
     """Make sure db cache file exists after creating."""
-    index_file = os.path.join(database.root, '.spack-db', 'index.json')
+    index_file = os.path.join(database.root, '.spack-db', 'index.records')
     lock_file = os.path.join(database.root, '.spack-db', 'lock')
     assert os.path.exists(str(index_file))
     assert os.path.exists(str(lock_file))
@@ -260,6 +263,39 @@ def test_025_reindex(database):
     _check_db_sanity(database)
 
 
+def test_026_reindex_with_jobs(mutable_database, monkeypatch):
+    """Make sure a reindex with several processes gives the same DB."""
+    monkeypatch.setattr(spack.database, '_reindex_batch_size', 2)
+    with mutable_database.read_transaction():
+        expected = dict((key, (rec.installed, rec.explicit, rec.ref_count))
+                        for key, rec in mutable_database._data.items())
+
+    spack.store.store.reindex(jobs=3)
+
+    _check_db_sanity(mutable_database)
+    with mutable_database.read_transaction():
+        found = dict((key, (rec.installed, rec.explicit, rec.ref_count))
+                     for key, rec in mutable_database._data.items())
+    assert found == expected
+
+
+def test_027_reindex_with_jobs_reports_errors(mutable_database, monkeypatch):
+    monkeypatch.setattr(spack.database, '_reindex_batch_size', 2)
+    spec = mutable_database.query_one('mpileaks ^zmpi')
+    spec_file = spack.store.layout.spec_file_path(spec)
+    with open(spec_file) as f:
+        contents = f.read()
+
+    try:
+        with open(spec_file, 'w') as f:
+            f.write('not a spec')
+        with pytest.raises(spack.directory_layout.SpecReadError):
+            spack.store.store.reindex(jobs=3)
+    finally:
+        with open(spec_file, 'w') as f:
+            f.write(contents)
+
+
 def test_030_db_sanity_from_another_process(mutable_database):
     def read_and_modify():
         # check that other process can read DB
@@ -450,3 +486,161 @@ def test_regression_issue_8036(mutable_database, usr_folder_exists):
     # Now install the external package and check again the `installed` property
     s.package.do_install(fake=True)
     assert s.package.installed
+
+
+def test_records_are_built_on_demand(database):
+    spec = database.query_one('libdwarf')
+
+    db = spack.database.Database(database.root)
+    with db.read_transaction():
+        rec = db.get_record(spec)
+        assert rec.spec == spec
+
+        # Only libdwarf and its dependency have been built
+        assert sorted(db._data._records) == sorted(
+            s.dag_hash() for s in spec.traverse())
+        assert len(db._data) == len(database._data)
+
+
+def test_records_reused_until_index_changes(mutable_database):
+    db = spack.database.Database(mutable_database.root)
+    with db.read_transaction():
+        first = db.get_record('libelf').spec
+    with db.read_transaction():
+        assert db.get_record('libelf').spec is first
+
+    # Another instance rewrites the index: records are read again
+    with mutable_database.write_transaction():
+        mutable_database._index_stamp = None
+    with db.read_transaction():
+        assert db.get_record('libelf').spec is not first
+
+
+def test_write_transactions_append_to_index(mutable_database):
+    # Start from a compacted index
+    with mutable_database.write_transaction():
+        mutable_database._index_stamp = None
+
+    db = spack.database.Database(mutable_database.root)
+    with db.read_transaction():
+        libelf = db.get_record('libelf').spec
+        callpath = db.get_record('callpath ^mpich')
+        ref_count = callpath.ref_count
+
+    inode = os.stat(mutable_database._index_path).st_ino
+    with open(mutable_database._index_path) as f:
+        nlines = len(f.readlines())
+
+    mutable_database.remove('mpileaks ^mpich')
+
+    # mpileaks is removed, the ref_count of callpath and mpich changes
+    with open(mutable_database._index_path) as f:
+        lines = f.readlines()
+    assert os.stat(mutable_database._index_path).st_ino == inode
+    assert len(lines) == nlines + 4
+    assert lines[-1] == 'commit\n'
+
+    # Readers apply the new transaction to the records they have
+    with db.read_transaction():
+        assert not db.query('mpileaks ^mpich')
+        assert db.get_record('libelf').spec is libelf
+        assert db.get_record('callpath ^mpich') is callpath
+        assert callpath.ref_count == ref_count - 1
+        db._check_ref_counts()
+
+
+def test_index_is_compacted(mutable_database):
+    spec = mutable_database.query_one('mpileaks ^mpich')
+    inode = os.stat(mutable_database._index_path).st_ino
+
+    # Each cycle appends 6 records (3 records change, twice)
+    for _ in range(len(mutable_database._data) // 6 + 1):
+        mutable_database.remove(spec)
+        mutable_database.add(spec, spack.store.layout)
+
+    assert os.stat(mutable_database._index_path).st_ino != inode
+    assert mutable_database._journal_length < len(mutable_database._data)
+
+    db = spack.database.Database(mutable_database.root)
+    assert db.query(installed=any) == mutable_database.query(installed=any)
+    with db.read_transaction():
+        db._check_ref_counts()
+
+
+def test_unfinished_transaction_is_ignored(mutable_database):
+    with open(mutable_database._index_path, 'a') as f:
+        f.write('abcdef\tmpileaks\t{"spec":')
+
+    db = spack.database.Database(mutable_database.root)
+    assert db.query(installed=any) == mutable_database.query(installed=any)
+
+    # The next write replaces the unfinished transaction
+    db.remove('mpileaks ^mpich')
+    with open(db._index_path) as f:
+        assert 'abcdef' not in f.read()
+    assert not mutable_database.query('mpileaks ^mpich')
+
+
+def test_json_index_is_converted(database, tmpdir):
+    installs = dict(
+        (key, rec.to_dict()) for key, rec in database._data.items())
+    json_index = {
+        'database': {'installs': installs, 'version': '0.9.3'}
+    }
+    with tmpdir.join('index.json').open('w') as f:
+        sjson.dump(json_index, f)
+
+    db = spack.database.Database(database.root, db_dir=str(tmpdir))
+    assert db.query(installed=any) == database.query(installed=any)
+    assert tmpdir.join('index.records').check()
+
+    # The converted index can be read by a new instance
+    db = spack.database.Database(database.root, db_dir=str(tmpdir))
+    assert db.query(installed=any) == database.query(installed=any)
+    with db.read_transaction():
+        db._check_ref_counts()
+
+
+def test_query_builds_only_candidates(database):
+    db = spack.database.Database(database.root, db_dir=database._db_dir)
+    results = db.query('callpath')
+    assert len(results) == 3
+
+    # Only the records of callpath and of its dependencies are built
+    built = set(rec.spec.name for rec in db._data._records.values())
+    expected = set(node.name for spec in results for node in spec.traverse())
+    assert built == expected
+
+
+@pytest.mark.parametrize('query', [
+    'mpileaks',
+    'mpileaks ^mpich',
+    'mpileaks%gcc',
+    'mpileaks%clang',
+    '%gcc',
+    'arch=test-debian6-x86_64',
+    'callpath os=debian6',
+    'callpath target=nonexistent',
+    'mpi',
+    'nonexistent',
+])
+def test_query_matches_full_scan(database, query):
+    db = spack.database.Database(database.root, db_dir=database._db_dir)
+    with database.read_transaction():
+        expected = sorted(rec.spec for rec in database._data.values()
+                          if rec.installed and rec.spec.satisfies(query))
+    assert db.query(query) == expected
+
+
+def test_corrupt_record_is_reported(database, tmpdir):
+    with open(database._index_path) as f:
+        lines = f.readlines()
+    i = next(i for i, line in enumerate(lines[1:], 1) if '\t{' in line)
+    key, name, record = lines[i].split('\t')
+    lines[i] = '\t'.join([key, name, '{"spec": ']) + '\n'
+    with tmpdir.join('index.records').open('w') as f:
+        f.writelines(lines)
+
+    db = spack.database.Database(database.root, db_dir=str(tmpdir))
+    with pytest.raises(spack.database.CorruptDatabaseError):
+        db.query(installed=any)
@@ -0,0 +1,115 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Tests for the content addressed cache of downloaded archives."""
+import itertools
+import os
+import shutil
+
+import pytest
+
+import spack.caches
+import spack.fetch_strategy as fs
+import spack.stage
+
+
+class FileFetcher(object):
+    """Fetcher whose archive is an existing file."""
+    cachable = True
+
+    def __init__(self, path):
+        self.path = path
+
+    def archive(self, destination):
+        shutil.copyfile(self.path, destination)
+
+
+@pytest.fixture()
+def archives(tmpdir):
+    """Make archives with the given contents."""
+    def make(name, contents):
+        path = tmpdir.join('downloads', name)
+        path.write(contents, ensure=True)
+        return FileFetcher(str(path))
+    return make
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    """Make every access to the cache happen one second after the last."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(fs.time, 'time', lambda: float(next(ticks)))
+
+
+def test_identical_archives_are_stored_once(tmpdir, archives):
+    cache = fs.FsCache(str(tmpdir.join('cache')))
+    cache.store(archives('a', 'same contents'), 'foo/foo-1.0.tar.gz')
+    cache.store(archives('b', 'same contents'), 'bar/bar-2.0.tar.gz')
+
+    foo = os.stat(os.path.join(cache.root, 'foo', 'foo-1.0.tar.gz'))
+    bar = os.stat(os.path.join(cache.root, 'bar', 'bar-2.0.tar.gz'))
+    assert foo.st_ino == bar.st_ino
+
+    stats = cache.stats()
+    assert stats['archives'] == 1 and stats['paths'] == 2
+    assert stats['size'] == len('same contents')
+    assert stats['bytes_deduplicated'] == len('same contents')
+    assert stats['misses'] == 2
+
+
+def test_replacing_an_archive(tmpdir, archives):
+    cache = fs.FsCache(str(tmpdir.join('cache')))
+    cache.store(archives('a', 'old'), 'foo/foo-1.0.tar.gz')
+    cache.store(archives('b', 'new'), 'foo/foo-1.0.tar.gz')
+
+    with open(os.path.join(cache.root, 'foo', 'foo-1.0.tar.gz')) as f:
+        assert f.read() == 'new'
+    assert cache.stats()['archives'] == 1
+    objects = [f for _, _, files in os.walk(cache.objects_path)
+               for f in files]
+    assert len(objects) == 1
+
+
+def test_least_recently_used_archives_are_evicted(tmpdir, archives, clock):
+    cache = fs.FsCache(str(tmpdir.join('cache')), limit=25)
+    cache.store(archives('a', 'a' * 10), 'a/a-1.0.tar.gz')
+    cache.store(archives('b', 'b' * 10), 'b/b-1.0.tar.gz')
+
+    # Using a makes b the least recently used archive
+    cache.record_hit(os.path.join(cache.root, 'a', 'a-1.0.tar.gz'))
+    cache.store(archives('c', 'c' * 10), 'c/c-1.0.tar.gz')
+
+    for name in 'ac':
+        assert os.path.exists(os.path.join(
+            cache.root, name, name + '-1.0.tar.gz'))
+    assert not os.path.exists(os.path.join(cache.root, 'b', 'b-1.0.tar.gz'))
+
+    stats = cache.stats()
+    assert stats['size'] == 20
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 1 and stats['bytes_reused'] == 10
+
+
+def test_cache_fetcher_records_hits(tmpdir, archives, mock_stage):
+    cache = fs.FsCache(str(tmpdir.join('cache')))
+    cache.store(archives('a', 'contents'), 'foo/foo-1.0.tar.gz')
+
+    fetcher = cache.fetcher('foo/foo-1.0.tar.gz', None)
+    with spack.stage.Stage(fetcher) as stage:
+        stage.fetch()
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('size,expected', [
+    (None, 0), (0, 0), (1234, 1234), ('100', 100), ('2K', 2048),
+    ('20G', 20 * 1024 ** 3), ('1 t', 1024 ** 4),
+])
+def test_parse_size(size, expected):
+    assert spack.caches.parse_size(size) == expected
+
+
+def test_parse_bad_size():
+    with pytest.raises(ValueError):
+        spack.caches.parse_size('20 gigabytes')
@@ -0,0 +1,159 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import collections
+import os
+import threading
+import time
+
+import pytest
+
+import spack.config
+import spack.fetch_scheduler
+import spack.fetch_strategy as fs
+from spack.spec import Spec
+from spack.util.executable import which
+from spack.version import ver
+
+
+@pytest.fixture()
+def nodes(mock_packages, config):
+    spec = Spec('mpileaks').concretized()
+    return list(spec.traverse())
+
+
+@pytest.fixture()
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(spack.fetch_scheduler, 'retry_delay', 0.01)
+
+
+def test_fetch_each_package_once(nodes):
+    fetched = []
+    scheduler = spack.fetch_scheduler.FetchScheduler(nodes + nodes, jobs=4)
+    scheduler.run(lambda pkg: fetched.append(pkg.name))
+
+    assert sorted(fetched) == sorted(s.name for s in nodes)
+
+
+@pytest.mark.parametrize('jobs,per_host', [(4, 2), (4, 1), (1, 4)])
+def test_connection_limits(nodes, monkeypatch, jobs, per_host):
+    # The libraries all come from the same host
+    def shared_host(pkg):
+        return 'example.com' if pkg.name.startswith('lib') else pkg.name
+
+    monkeypatch.setattr(spack.fetch_scheduler, '_host', shared_host)
+    lock = threading.Lock()
+    active = collections.defaultdict(int)
+    most = collections.defaultdict(int)
+
+    def fetch(pkg):
+        host = shared_host(pkg)
+        with lock:
+            active[host] += 1
+            active['total'] += 1
+            most[host] = max(most[host], active[host])
+            most['total'] = max(most['total'], active['total'])
+        time.sleep(0.05)
+        with lock:
+            active[host] -= 1
+            active['total'] -= 1
+
+    spack.fetch_scheduler.FetchScheduler(nodes, jobs, per_host).run(fetch)
+
+    assert most.pop('total') <= jobs
+    assert max(most.values()) <= per_host
+
+
+def test_failed_downloads_are_retried(nodes, no_retry_delay):
+    attempts = collections.defaultdict(int)
+
+    def fetch(pkg):
+        attempts[pkg.name] += 1
+        if pkg.name == 'callpath' and attempts[pkg.name] < 3:
+            raise fs.FailedDownloadError(pkg.name, 'Connection reset')
+
+    spack.fetch_scheduler.FetchScheduler(nodes, jobs=2).run(fetch)
+
+    assert attempts['callpath'] == 3
+    assert attempts['mpileaks'] == 1
+
+
+def test_errors_are_raised_at_the_end(nodes, no_retry_delay):
+    attempts = collections.defaultdict(int)
+
+    def fetch(pkg):
+        attempts[pkg.name] += 1
+        if pkg.name == 'libelf':
+            raise fs.ChecksumError('Bad checksum for libelf')
+        if pkg.name == 'libdwarf':
+            raise fs.FailedDownloadError(pkg.name, 'Not found')
+
+    scheduler = spack.fetch_scheduler.FetchScheduler(nodes, jobs=2)
+    with pytest.raises(fs.FetchError) as e:
+        scheduler.run(fetch)
+    assert 'Failed to fetch 2 packages' in str(e.value)
+
+    # Bad checksums are not retried, other packages are still fetched
+    assert attempts['libelf'] == 1
+    assert attempts['libdwarf'] == spack.fetch_scheduler.retries + 1
+    assert attempts['mpileaks'] == 1
+
+
+@pytest.fixture()
+def git_package(mock_git_repository, mutable_mock_packages):
+    """The git-test package, fetching from a mock git repository."""
+    spec = Spec('git-test').concretized()
+    spec.package.versions[ver('git')] = \
+        mock_git_repository.checks['master'].args
+    return spec
+
+
+@pytest.mark.skipif(not which('git'), reason='requires git to be installed')
+def test_vcs_packages_are_fetched_alone(nodes, git_package):
+    lock = threading.Lock()
+    active = set()
+    alone = []
+
+    def fetch(pkg):
+        with lock:
+            active.add(pkg.name)
+            if pkg.name == 'git-test':
+                alone.append(active == set(['git-test']) and
+                             threading.current_thread().name == 'MainThread')
+        time.sleep(0.02)
+        with lock:
+            active.remove(pkg.name)
+
+    nodes.append(git_package)
+    scheduler = spack.fetch_scheduler.FetchScheduler(nodes, jobs=4)
+    assert [t.pkg.name for t in scheduler.tasks if not t.concurrent] == [
+        'git-test']
+    scheduler.run(fetch)
+
+    assert alone == [True]
+
+
+@pytest.mark.skipif(not which('git'), reason='requires git to be installed')
+def test_fetch_git_and_url_packages(git_package, mock_archive):
+    url_spec = Spec('trivial-install-test-package').concretized()
+    fetcher = fs.FetchStrategyComposite()
+    fetcher.append(fs.URLFetchStrategy(mock_archive.url))
+    url_spec.package.fetcher = fetcher
+
+    cwd = os.getcwd()
+    scheduler = spack.fetch_scheduler.FetchScheduler(
+        [git_package, url_spec], jobs=2)
+    try:
+        with spack.config.override('config:checksum', False):
+            scheduler.run()
+
+        # Fetching didn't move Spack, and both sources are where expected
+        assert os.getcwd() == cwd
+        git_stage = git_package.package.stage
+        assert os.path.isdir(os.path.join(git_stage.source_path, '.git'))
+        assert os.path.isfile(url_spec.package.stage.archive_file)
+    finally:
+        git_package.package.stage.destroy()
+        url_spec.package.stage.destroy()
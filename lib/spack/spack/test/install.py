@@ -177,6 +177,15 @@ def test_store(install_mockery, mock_fetch):
     pkg.do_install()
 
 
+def test_install_concurrent_builds(install_mockery, mock_fetch):
+    spec = Spec('mpileaks').concretized()
+    spec.package.do_install(fake=True, concurrent_builds=3)
+
+    for node in spec.traverse():
+        assert node.package.installed
+        assert spack.store.db.query_one(node) is not None
+
+
 @pytest.mark.disable_clean_stage_check
 def test_failing_build(install_mockery, mock_fetch):
     spec = Spec('failing-build').concretized()
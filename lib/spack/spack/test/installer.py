@@ -0,0 +1,136 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import multiprocessing
+import pytest
+
+import spack.config
+import spack.installer
+import spack.store
+from spack.build_environment import InstallError
+from spack.spec import Spec
+
+
+def record_install(log):
+    """Install function for the scheduler that appends to a log file."""
+    def install(spec):
+        with open(log, 'a') as f:
+            f.write(spec.name + '\n')
+    return install
+
+
+def test_scheduler_respects_dependencies(mock_packages, tmpdir):
+    spec = Spec('mpileaks').concretized()
+    nodes = list(spec.traverse(order='post'))
+    log = str(tmpdir.join('log'))
+
+    scheduler = spack.installer.BuildScheduler(nodes, concurrent_builds=3)
+    scheduler.run(record_install(log))
+
+    with open(log) as f:
+        order = [line.strip() for line in f]
+
+    assert sorted(order) == sorted(s.name for s in nodes)
+    for node in nodes:
+        for dep in node.dependencies():
+            assert order.index(dep.name) < order.index(node.name)
+
+
+def test_scheduler_ignores_nodes_not_requested(mock_packages, tmpdir):
+    spec = Spec('mpileaks').concretized()
+    nodes = [spec, spec['callpath']]
+    log = str(tmpdir.join('log'))
+
+    spack.installer.BuildScheduler(nodes, 2).run(record_install(log))
+
+    with open(log) as f:
+        assert [line.strip() for line in f] == ['callpath', 'mpileaks']
+
+
+def test_scheduler_stops_on_failure(mock_packages, tmpdir):
+    spec = Spec('mpileaks').concretized()
+    nodes = list(spec.traverse(order='post'))
+    log = str(tmpdir.join('log'))
+    install = record_install(log)
+
+    def install_or_fail(node):
+        if node.name == 'callpath':
+            raise InstallError('Intentional failure')
+        install(node)
+
+    scheduler = spack.installer.BuildScheduler(nodes, concurrent_builds=2)
+    with pytest.raises(InstallError) as e:
+        scheduler.run(install_or_fail)
+    assert 'Intentional failure' in str(e.value)
+    assert e.value.pkg.name == 'callpath'
+
+    with open(log) as f:
+        installed = [line.strip() for line in f]
+    assert 'callpath' not in installed
+    assert 'mpileaks' not in installed
+
+
+def test_scheduler_wraps_unpicklable_errors(mock_packages):
+    spec = Spec('libelf').concretized()
+
+    def install(node):
+        raise ValueError(lambda: None)
+
+    with pytest.raises(InstallError) as e:
+        spack.installer.BuildScheduler([spec], 2).run(install)
+    assert 'ValueError' in str(e.value)
+
+
+@pytest.mark.parametrize('build_jobs,concurrent,expected', [
+    (64, 4, 16),
+    (64, 1, 64),
+    (4, 8, 1),
+])
+def test_jobs_per_build(mutable_config, build_jobs, concurrent, expected):
+    spack.config.set('config:build_jobs', build_jobs)
+    assert spack.installer.jobs_per_build(concurrent) == expected
+
+
+def test_cooperative_scheduler_skips_claimed_nodes(
+        install_mockery, monkeypatch, tmpdir):
+    monkeypatch.setattr(spack.installer, '_claim_retry_interval', 0.2)
+    spec = Spec('mpileaks').concretized()
+    nodes = list(spec.traverse(order='post'))
+    log = str(tmpdir.join('log'))
+
+    # Another process claims libelf for a while
+    claimed, release = multiprocessing.Event(), multiprocessing.Event()
+
+    def hold_prefix_lock():
+        with spack.store.db.prefix_write_lock(spec['libelf']):
+            claimed.set()
+            release.wait(10)
+
+    holder = multiprocessing.Process(target=hold_prefix_lock)
+    holder.start()
+    claimed.wait(10)
+
+    install = record_install(log)
+
+    def install_and_release(node):
+        install(node)
+        if node.name == 'mpich':
+            release.set()
+
+    try:
+        scheduler = spack.installer.BuildScheduler(
+            nodes, concurrent_builds=1, cooperative=True)
+        scheduler.run(install_and_release)
+    finally:
+        release.set()
+        holder.join()
+
+    with open(log) as f:
+        order = [line.strip() for line in f]
+
+    # libelf would be first, but mpich was installed while it was claimed
+    assert sorted(order) == sorted(s.name for s in nodes)
+    assert order.index('mpich') < order.index('libelf')
+    assert not scheduler.deferred
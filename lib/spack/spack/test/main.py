@@ -0,0 +1,114 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import spack.caches
+import spack.cmd
+import spack.main
+import spack.paths
+from spack.util.file_cache import FileCache
+
+#: Script printing the Spack modules imported to run a command
+imported_modules_script = """
+import sys
+sys.path[:0] = [{external!r}, {lib!r}]
+import spack.main
+spack.main.main(sys.argv[1:])
+print(' '.join(name for name, module in sys.modules.items()
+               if module and name.startswith(('spack', 'llnl'))))
+"""
+
+#: Modules that take long to import, and that spack --version doesn't need
+heavy_modules = [
+    'spack.architecture', 'spack.cmd', 'spack.config', 'spack.environment',
+    'spack.repo', 'spack.spec', 'spack.store', 'ruamel.yaml', 'jsonschema',
+]
+
+#: Maximum number of Spack modules imported by spack --version
+version_import_budget = 20
+
+
+def imported_modules(*argv):
+    """Spack modules imported by a new interpreter to run a command."""
+    script = imported_modules_script.format(
+        external=spack.paths.external_path, lib=spack.paths.lib_path)
+    output = subprocess.check_output(
+        [sys.executable, '-c', script] + list(argv))
+    return output.decode('utf-8').strip().split('\n')[-1].split()
+
+
+def test_version_import_budget():
+    modules = imported_modules('--version')
+
+    assert not [m for m in heavy_modules if m in modules]
+    assert len(modules) <= version_import_budget, sorted(modules)
+
+
+@pytest.fixture()
+def misc_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(spack.caches, 'misc_cache', FileCache(str(tmpdir)))
+
+
+def test_help_does_not_load_commands(misc_cache, monkeypatch, capsys):
+    help_text = spack.main.make_argument_parser().format_help('long')
+
+    # Once summaries of the commands are cached, help doesn't need them
+    def get_module(cmd_name):
+        raise AssertionError('loaded command %s' % cmd_name)
+    monkeypatch.setattr(spack.cmd, 'get_module', get_module)
+
+    assert spack.main.make_argument_parser().format_help('long') == help_text
+    assert 'install' in help_text
+
+
+def test_command_summaries_are_updated(misc_cache, monkeypatch):
+    summaries = spack.main.command_summaries()
+    assert summaries['install']['section'] == 'build'
+    assert sorted(summaries) == spack.cmd.all_commands()
+
+    # Changing a command reads the summaries again
+    loaded = []
+    get_module = spack.cmd.get_module
+
+    def record_get_module(cmd_name):
+        loaded.append(cmd_name)
+        return get_module(cmd_name)
+    monkeypatch.setattr(spack.cmd, 'get_module', record_get_module)
+
+    spack.main.command_summaries()
+    assert not loaded
+
+    index_mtime = max(
+        spack.caches.misc_cache.mtime(os.path.join('commands', f))
+        for f in os.listdir(os.path.join(spack.caches.misc_cache.root,
+                                         'commands')))
+    monkeypatch.setattr(os.path, 'getmtime', lambda path: index_mtime + 1)
+    assert spack.main.command_summaries() == summaries
+    assert sorted(loaded) == spack.cmd.all_commands()
+
+
+def test_command_summaries_of_other_instances(misc_cache, tmpdir,
+                                              monkeypatch):
+    summaries = spack.main.command_summaries()
+
+    # Another Spack, with older and fewer commands, shares the misc cache
+    command_path = tmpdir.mkdir('cmd')
+    for name in ('install.py', 'list.py'):
+        path = str(command_path.join(name))
+        shutil.copy(os.path.join(spack.paths.command_path, name), path)
+        os.utime(path, (0, 0))
+    os.utime(str(command_path), (0, 0))
+    monkeypatch.setattr(spack.paths, 'command_path', str(command_path))
+    monkeypatch.setattr(spack.cmd, '_all_commands', None)
+
+    other_summaries = spack.main.command_summaries()
+    assert sorted(other_summaries) == ['install', 'list']
+    assert other_summaries['install'] == summaries['install']
@@ -9,6 +9,7 @@ import pytest
 
 import spack.repo
 import spack.mirror
+import spack.package
 import spack.util.executable
 from spack.spec import Spec
 from spack.stage import Stage
@@ -45,14 +46,14 @@ def set_up_package(name, repository, url_attr):
     pkg.versions[v][url_attr] = repository.url
 
 
-def check_mirror():
+def check_mirror(jobs=1):
     with Stage('spack-mirror-test') as stage:
         mirror_root = os.path.join(stage.path, 'test-mirror')
         # register mirror with spack config
         mirrors = {'spack-mirror-test': 'file://' + mirror_root}
         spack.config.set('mirrors', mirrors)
         with spack.config.override('config:checksum', False):
-            spack.mirror.create(mirror_root, repos)
+            spack.mirror.create(mirror_root, repos, jobs=jobs)
 
         # Stage directory exists
         assert os.path.isdir(mirror_root)
@@ -108,6 +109,17 @@ def test_git_mirror(mock_git_repository):
     repos.clear()
 
 
+@pytest.mark.skipif(
+    not which('git'), reason='requires git to be installed')
+def test_git_and_url_mirror_jobs(mock_git_repository, mock_archive):
+    set_up_package('git-test', mock_git_repository, 'git')
+    set_up_package('trivial-install-test-package', mock_archive, 'url')
+    cwd = os.getcwd()
+    check_mirror(jobs=2)
+    assert os.getcwd() == cwd
+    repos.clear()
+
+
 @pytest.mark.skipif(
     not which('svn'), reason='requires subversion to be installed')
 def test_svn_mirror(mock_svn_repository):
@@ -141,6 +153,35 @@ def test_all_mirror(
     repos.clear()
 
 
+def test_mirror_manifest(mock_archive, tmpdir, monkeypatch):
+    set_up_package('trivial-install-test-package', mock_archive, 'url')
+    mirror_root = str(tmpdir.join('test-mirror'))
+    with spack.config.override('config:checksum', False):
+        present, mirrored, error = spack.mirror.create(
+            mirror_root, repos, jobs=2)
+    assert not present and not error
+    path, = mirrored
+
+    manifest = spack.mirror.MirrorManifest(mirror_root)
+    assert list(manifest.entries) == [path]
+    assert manifest.entries[path]['size'] == os.path.getsize(
+        os.path.join(mirror_root, path))
+
+    # Unchanged archives are not fetched again
+    fetched = []
+    monkeypatch.setattr(spack.package.PackageBase, 'do_fetch',
+                        lambda pkg, *args: fetched.append(pkg.name))
+    present, mirrored, error = spack.mirror.create(mirror_root, repos)
+    assert present == [path] and not mirrored and not error
+    assert not fetched
+
+    # Changed ones are
+    os.utime(os.path.join(mirror_root, path), (0, 0))
+    present, mirrored, error = spack.mirror.create(mirror_root, repos)
+    assert fetched == ['trivial-install-test-package']
+    repos.clear()
+
+
 def test_mirror_with_url_patches(mock_packages, config, monkeypatch):
     spec = Spec('patch-several-dependencies')
     spec.concretize()
@@ -6,25 +6,37 @@
 """
 This test checks the binary packaging infrastructure
 """
+import gzip
+import io
 import os
 import stat
 import sys
 import shutil
+import hashlib
+import tarfile
 import pytest
 import argparse
+from contextlib import closing
 
 from llnl.util.filesystem import mkdirp
 
+import spack.caches
+import spack.relocate
 import spack.repo
 import spack.store
+import spack.util.compression
+import spack.util.file_cache
+import spack.util.web
 import spack.binary_distribution as bindist
 import spack.cmd.buildcache as buildcache
+import spack.util.spack_json as sjson
+import spack.util.spack_yaml as syaml
 from spack.spec import Spec
 from spack.paths import mock_gpg_keys_path
 from spack.fetch_strategy import URLFetchStrategy, FetchStrategyComposite
 from spack.util.executable import ProcessError
 from spack.relocate import needs_binary_relocation, needs_text_relocation
-from spack.relocate import strings_contains_installroot
+from spack.relocate import strings_contains_installroot, get_filetype
 from spack.relocate import get_patchelf, relocate_text, relocate_links
 from spack.relocate import substitute_rpath, get_relative_rpaths
 from spack.relocate import macho_replace_paths, macho_make_paths_relative
@@ -235,6 +247,320 @@ echo $PATH"""
     bindist._cached_specs = None
 
 
+@pytest.mark.usefixtures('install_mockery')
+def test_build_tarball_streams_prefix(mock_archive, tmpdir):
+    spec = Spec('trivial-install-test-package').concretized()
+    fake_fetchify(mock_archive.url, spec.package)
+    spec.package.do_install()
+
+    filename = os.path.join(spec.prefix, 'dummy.txt')
+    with open(filename, 'w') as f:
+        f.write(spec.prefix)
+    os.symlink(filename, os.path.join(spec.prefix, 'link_to_dummy.txt'))
+
+    outdir = str(tmpdir.join('mirror'))
+    bindist.build_tarball(spec, outdir, unsigned=True, jobs=2)
+
+    # The .spack file holds the tarball and the spec with its checksum
+    spackfile = os.path.join(bindist.build_cache_directory(outdir),
+                             bindist.tarball_path_name(spec, '.spack'))
+    with closing(tarfile.open(spackfile)) as tar:
+        assert tar.getnames() == [bindist.tarball_name(spec, '.tar.gz'),
+                                  bindist.tarball_name(spec, '.spec.yaml')]
+        tarball = tar.extractfile(tar.getnames()[0]).read()
+        spec_dict = syaml.load(tar.extractfile(tar.getnames()[1]).read())
+    checksum = spec_dict['binary_cache_checksum']['hash']
+    assert hashlib.sha256(tarball).hexdigest() == checksum
+
+    # Files come from the prefix, links and buildinfo are changed ones
+    prefix = os.path.basename(spec.prefix)
+    with closing(tarfile.open(fileobj=io.BytesIO(tarball))) as tar:
+        names = tar.getnames()
+        assert names.count(prefix + '/link_to_dummy.txt') == 1
+        assert prefix + '/.spack/spec.yaml' in names
+
+        dummy = tar.extractfile(prefix + '/dummy.txt').read()
+        assert dummy.decode('utf-8') == spec.prefix
+
+        link = tar.getmember(prefix + '/link_to_dummy.txt')
+        assert link.issym() and link.linkname.startswith('@')
+
+        buildinfo = tar.extractfile(prefix + '/.spack/binary_distribution')
+        buildinfo = syaml.load(buildinfo.read())
+        assert buildinfo['relocate_textfiles'] == ['dummy.txt']
+        assert buildinfo['relocate_offsets'] == {'dummy.txt': [0]}
+        assert buildinfo['relocate_links'] == ['link_to_dummy.txt']
+
+
+def test_write_tarball_member_header_fits_large_sizes(tmpdir, monkeypatch):
+    class LargeWriter(bindist._HashingWriter):
+        """Pretend the tarball is 8 GiB larger than it is."""
+        def __init__(self, fileobj):
+            super(LargeWriter, self).__init__(fileobj)
+            self.size = 8 * 1024 ** 3
+
+    monkeypatch.setattr(bindist, '_HashingWriter', LargeWriter)
+    prefix = tmpdir.mkdir('prefix')
+    prefix.join('file.txt').write('contents')
+    spackfile = str(tmpdir.join('test.spack'))
+    bindist.write_tarball_member(
+        spackfile, 'test.tar.gz', str(prefix), str(tmpdir), [])
+
+    # The tarball still starts right after a single header block
+    with open(spackfile, 'rb') as f:
+        f.seek(tarfile.BLOCKSIZE)
+        assert f.read(2) == b'\x1f\x8b'
+    with closing(tarfile.open(spackfile)) as tar:
+        info = tar.next()
+    assert info.offset_data == tarfile.BLOCKSIZE
+    assert info.name == 'test.tar.gz'
+    assert info.size > 8 * 1024 ** 3
+
+
+def rewrite_spec_yaml(spackfile, change):
+    """Rewrite the spec.yaml in a .spack file with a function."""
+    with closing(tarfile.open(spackfile)) as tar:
+        members = [(m, tar.extractfile(m).read()) for m in tar.getmembers()]
+    with closing(tarfile.open(spackfile, 'w')) as tar:
+        for member, data in members:
+            if member.name.endswith('.spec.yaml'):
+                spec_dict = syaml.load(data)
+                change(spec_dict)
+                data = syaml.dump(spec_dict).encode('utf-8')
+                member.size = len(data)
+            tar.addfile(member, io.BytesIO(data))
+
+
+@pytest.mark.usefixtures('install_mockery')
+@pytest.mark.parametrize('corrupt', [False, True])
+def test_extract_tarball(mock_archive, tmpdir, corrupt):
+    spec = Spec('trivial-install-test-package').concretized()
+    fake_fetchify(mock_archive.url, spec.package)
+    spec.package.do_install()
+    filename = os.path.join(spec.prefix, 'dummy.txt')
+    with open(filename, 'w') as f:
+        f.write(spec.prefix)
+    os.symlink(filename, os.path.join(spec.prefix, 'link_to_dummy.txt'))
+
+    outdir = str(tmpdir.join('mirror'))
+    bindist.build_tarball(spec, outdir, unsigned=True)
+    spackfile = os.path.join(bindist.build_cache_directory(outdir),
+                             bindist.tarball_path_name(spec, '.spack'))
+    if corrupt:
+        def change(spec_dict):
+            spec_dict['binary_cache_checksum']['hash'] = 'bad'
+        rewrite_spec_yaml(spackfile, change)
+
+    parent = os.path.dirname(spec.prefix)
+    siblings = set(os.listdir(parent))
+    if corrupt:
+        with pytest.raises(bindist.NoChecksumException):
+            bindist.extract_tarball(
+                spec, spackfile, unsigned=True, force=True)
+        assert not os.path.exists(spec.prefix)
+        assert set(os.listdir(parent)) == siblings - set(
+            [os.path.basename(spec.prefix)])
+    else:
+        bindist.extract_tarball(spec, spackfile, unsigned=True, force=True)
+        assert set(os.listdir(parent)) == siblings
+        with open(filename) as f:
+            assert f.read().strip() == spec.prefix
+        assert os.path.realpath(os.path.join(
+            spec.prefix, 'link_to_dummy.txt')) == os.path.realpath(filename)
+
+
+def tar_member(name, type=tarfile.REGTYPE, linkname=''):
+    info = tarfile.TarInfo(name)
+    info.type, info.linkname = type, linkname
+    return info
+
+
+@pytest.mark.parametrize('members', [
+    [tar_member('/abs/file.txt')],
+    [tar_member('prefix/../../file.txt')],
+    [tar_member('prefix/link', tarfile.LNKTYPE, '../outside/file.txt')],
+    [tar_member('prefix/link', tarfile.SYMTYPE, '{outside}'),
+     tar_member('prefix/link/file.txt')],
+    [tar_member('prefix/link', tarfile.SYMTYPE, '{outside}/file.txt'),
+     tar_member('prefix/link')],
+])
+def test_extract_unsafe_members(tmpdir, members):
+    outside = tmpdir.mkdir('outside')
+    outside.join('file.txt').write('unchanged')
+    stage = tmpdir.mkdir('stage')
+
+    tarball = io.BytesIO()
+    with closing(tarfile.open(fileobj=tarball, mode='w')) as tar:
+        for member in members:
+            member.linkname = member.linkname.format(outside=outside)
+            tar.addfile(member, io.BytesIO())
+    tarball.seek(0)
+
+    with closing(tarfile.open(fileobj=tarball, mode='r|')) as tar:
+        with pytest.raises(bindist.UnsafeTarballException):
+            tar.extractall(str(stage), bindist._owned_by_user(tar, str(stage)))
+    assert outside.listdir() == [outside.join('file.txt')]
+    assert outside.join('file.txt').read() == 'unchanged'
+
+
+def test_extract_links_leaving_the_prefix(tmpdir):
+    stage = tmpdir.mkdir('stage')
+    tarball = io.BytesIO()
+    with closing(tarfile.open(fileobj=tarball, mode='w')) as tar:
+        tar.addfile(tar_member('prefix', tarfile.DIRTYPE))
+        tar.addfile(tar_member('prefix/python', tarfile.SYMTYPE,
+                               '/usr/bin/python'))
+        tar.addfile(tar_member('prefix/lib', tarfile.SYMTYPE, '../lib'))
+        tar.addfile(tar_member('prefix/bin', tarfile.DIRTYPE))
+    tarball.seek(0)
+
+    # Links may point anywhere, as long as nothing is written through them
+    with closing(tarfile.open(fileobj=tarball, mode='r|')) as tar:
+        tar.extractall(str(stage), bindist._owned_by_user(tar, str(stage)))
+    assert os.readlink(str(stage.join('prefix', 'python'))) == \
+        '/usr/bin/python'
+    assert stage.join('prefix', 'bin').isdir()
+
+
+@pytest.mark.usefixtures('install_mockery')
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_extract_tarball_of_several_blocks(
+        mock_archive, tmpdir, monkeypatch, jobs):
+    monkeypatch.setattr(spack.util.compression, 'gzip_block_size', 4096)
+    spec = Spec('trivial-install-test-package').concretized()
+    fake_fetchify(mock_archive.url, spec.package)
+    spec.package.do_install()
+
+    # Random data doesn't compress, so the tarball spans many blocks
+    data = os.urandom(16 * 4096)
+    filename = os.path.join(spec.prefix, 'random.bin')
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+    outdir = str(tmpdir.join('mirror'))
+    bindist.build_tarball(spec, outdir, unsigned=True, jobs=jobs)
+    spackfile = os.path.join(bindist.build_cache_directory(outdir),
+                             bindist.tarball_path_name(spec, '.spack'))
+    os.remove(filename)
+
+    bindist.extract_tarball(spec, spackfile, unsigned=True, force=True)
+    with open(filename, 'rb') as f:
+        assert f.read() == data
+
+
+@pytest.mark.usefixtures('install_mockery', 'mutable_config')
+def test_get_specs_from_index(mock_archive, tmpdir, monkeypatch):
+    spec = Spec('trivial-install-test-package').concretized()
+    fake_fetchify(mock_archive.url, spec.package)
+    spec.package.do_install()
+
+    outdir = str(tmpdir.join('mirror'))
+    bindist.build_tarball(spec, outdir, unsigned=True, regenerate_index=True)
+    build_cache_dir = bindist.build_cache_directory(outdir)
+    specs = bindist._read_index_file(
+        os.path.join(build_cache_dir, 'index.json.gz'))
+    assert list(specs) == [bindist.tarball_name(spec, '.spec.yaml')]
+
+    spack.config.set('mirrors', {'test': 'file://' + outdir})
+    monkeypatch.setattr(bindist, '_cached_specs', None)
+
+    # spec.yaml files are not read when the index has them
+    def fail(*args, **kwargs):
+        raise AssertionError('spec.yaml read instead of the index')
+
+    monkeypatch.setattr(syaml, 'load', fail)
+    found = bindist.get_specs()
+    assert [s.dag_hash() for s in found] == [spec.dag_hash()]
+    assert found[0].concrete
+
+
+def test_fetch_index_is_cached(tmpdir, monkeypatch):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    text = '{"buildcache_index": {"version": 1, "specs": {}}}'
+    compressed = io.BytesIO()
+    with closing(gzip.GzipFile(fileobj=compressed, mode='wb')) as f:
+        f.write(text.encode('utf-8'))
+
+    requests = []
+
+    def read_from_url_if_modified(url, etag=None, last_modified=None):
+        requests.append((etag, last_modified))
+        if etag == '"v1"':
+            return None
+        return compressed.getvalue(), {'etag': '"v1"', 'last_modified': None}
+
+    monkeypatch.setattr(spack.util.web, 'read_from_url_if_modified',
+                        read_from_url_if_modified)
+
+    url = 'https://mirror.example.com/build_cache/index.json.gz'
+    assert bindist._fetch_index(url) == text
+    assert bindist._fetch_index(url) == text
+    assert bindist._fetch_index(url, force=True) == text
+    assert requests == [(None, None), ('"v1"', None), (None, None)]
+    assert bindist._read_index(text) == {}
+
+
+def test_specs_needing_rebuild(mock_packages, config, monkeypatch):
+    specs = [Spec(name).concretized()
+             for name in ('libelf', 'libdwarf', 'callpath', 'mpich')]
+    libelf, libdwarf, callpath, mpich = specs
+
+    def entry(spec, full_hash):
+        return bindist.tarball_name(spec, '.spec.yaml'), {
+            'spec': spec.to_node_dict(), 'full_hash': full_hash}
+
+    # libelf is up to date, libdwarf changed, the others are not indexed
+    text = sjson.dump({'buildcache_index': {'version': 1, 'specs': dict([
+        entry(libelf, libelf.full_hash()),
+        entry(libdwarf, 'outdated')])}})
+    urls = []
+
+    def fetch_index(url, force=False):
+        urls.append(url)
+        return text
+
+    checked = []
+
+    def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
+        checked.append(spec.name)
+        return spec is mpich
+
+    monkeypatch.setattr(bindist, '_fetch_index', fetch_index)
+    monkeypatch.setattr(bindist, 'needs_rebuild', needs_rebuild)
+
+    mirror = 'https://mirror.example.com'
+    rebuild = bindist.specs_needing_rebuild(specs, mirror, jobs=2)
+    assert rebuild == [libdwarf, mpich]
+    assert urls == [mirror + '/build_cache/index.json.gz']
+    assert sorted(checked) == ['callpath', 'mpich']
+
+    # Without an index every spec is checked on its own
+    text, checked = None, []
+    assert bindist.specs_needing_rebuild(specs, mirror) == [mpich]
+    assert sorted(checked) == sorted(s.name for s in specs)
+
+
+@pytest.mark.usefixtures('install_mockery', 'mock_fetch')
+def test_buildcache_create_jobs(tmpdir):
+    spec = Spec('mpileaks').concretized()
+    spec.package.do_install(fake=True)
+
+    parser = argparse.ArgumentParser()
+    buildcache.setup_parser(parser)
+    outdir = str(tmpdir.join('mirror'))
+    args = parser.parse_args(
+        ['create', '-u', '-a', '-j', '4', '-d', outdir, '/' + spec.dag_hash()])
+    buildcache.buildcache(parser, args)
+
+    build_cache_dir = bindist.build_cache_directory(outdir)
+    for node in spec.traverse():
+        if not node.virtual:
+            assert os.path.exists(os.path.join(
+                build_cache_dir, bindist.tarball_path_name(node, '.spack')))
+    assert os.path.exists(os.path.join(build_cache_dir, 'index.html'))
+
+
 def test_relocate_text(tmpdir):
     with tmpdir.as_cwd():
         # Validate the text path replacement
@@ -252,6 +578,56 @@ def test_relocate_text(tmpdir):
         assert(strings_contains_installroot(filename, old_dir) is False)
 
 
+@pytest.mark.parametrize('block_size', [1, 7, 22, 1024])
+def test_relocate_text_in_blocks(tmpdir, monkeypatch, block_size):
+    monkeypatch.setattr(spack.relocate, '_block_size', block_size)
+    old_dir, new_dir = '/home/spack/opt/spack', '/opt/spack'
+    text = '#!{0}/bin/sh\nPATH={0}/bin:{0}/sbin:/usr/bin\n{0}'.format(
+        old_dir)
+    filename = tmpdir.join('script.sh')
+    filename.write(text)
+    filename.chmod(0o755)
+
+    relocate_text([str(filename)], old_dir, new_dir)
+
+    assert filename.read() == text.replace(old_dir, new_dir)
+    assert filename.stat().mode & 0o777 == 0o755
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 3, 5, 6, 11, 1024])
+def test_relocate_self_overlapping_text_in_blocks(
+        tmpdir, monkeypatch, block_size):
+    monkeypatch.setattr(spack.relocate, '_block_size', block_size)
+    old_dir, new_dir = '/ab/ab', '/XY/ZW/V'
+    text = '/ab/ab/ab/ab\nb/ab/ab/ab/ab\n/ab/a/ab/ab'
+    filename = tmpdir.join('script.sh')
+    filename.write(text)
+
+    relocate_text([str(filename)], old_dir, new_dir)
+
+    assert filename.read() == text.replace(old_dir, new_dir)
+
+
+def test_relocate_text_in_place(tmpdir):
+    old_dir, new_dir = '/home/spack/opt/spack', '/home/other/opt/spack'
+    text = 'prefix={0}/foo\nlibdir={0}/foo/lib\n'.format(old_dir)
+    filename = tmpdir.join('foo.pc')
+    filename.write(text)
+    offsets = spack.relocate.find_installroot_offsets(str(filename), old_dir)
+    assert offsets == [7, 7 + len(old_dir) + 12]
+
+    inode = filename.stat().ino
+    relocate_text([str(filename)], old_dir, new_dir,
+                  {str(filename): offsets})
+    assert filename.read() == text.replace(old_dir, new_dir)
+    assert filename.stat().ino == inode
+
+    # Offsets that do not match the file make it be rewritten
+    relocate_text([str(filename)], new_dir, old_dir,
+                  {str(filename): [0]})
+    assert filename.read() == text
+
+
 def test_relocate_links(tmpdir):
     with tmpdir.as_cwd():
         old_dir = '/home/spack/opt/spack'
@@ -283,6 +659,21 @@ def test_needs_relocation():
     assert needs_binary_relocation(macho_type, os_id='Darwin')
 
 
+def test_get_filetype(tmpdir):
+    with tmpdir.as_cwd():
+        with open('script.sh', 'w') as f:
+            f.write('#!/bin/sh\n/home/spack/opt/spack/bin/foo\n')
+        with open('data.bin', 'wb') as f:
+            f.write(b'\x00\x01/home/spack/opt/spack\x00\x02')
+        os.symlink('script.sh', 'link.sh')
+
+        assert needs_text_relocation(get_filetype('script.sh'))
+        assert not needs_text_relocation(get_filetype('link.sh'))
+        assert get_filetype('data.bin') == 'data'
+        assert strings_contains_installroot('data.bin', '/home/spack')
+        assert not strings_contains_installroot('data.bin', '/usr/local')
+
+
 def test_macho_paths():
 
     out = macho_make_paths_relative('/Users/Shares/spack/pkgC/lib/libC.dylib',
@@ -3,10 +3,15 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import itertools
+import os
+
 import pytest
 
+import spack.caches
 import spack.repo
 import spack.paths
+from spack.util.file_cache import FileCache
 
 
 # Unlike the repo_path fixture defined in conftest, this has a test-level
@@ -56,3 +61,164 @@ def test_repo_pkg_with_unknown_namespace(repo_for_test):
 def test_repo_unknown_pkg(repo_for_test):
     with pytest.raises(spack.repo.UnknownPackageError):
         repo_for_test.get('builtin.mock.nonexistentpackage')
+
+
+def test_repo_pkg_descriptor(mock_packages):
+    pkg_class = spack.repo.path.get_pkg_class('mpileaks')
+    pkg = spack.repo.path.get_pkg_descriptor('builtin.mock.mpileaks')
+
+    assert pkg.fullname == pkg_class.fullname
+    assert pkg.description == pkg_class.__doc__
+    assert pkg.versions == pkg_class.versions
+    assert sorted(pkg.variants) == sorted(pkg_class.variants)
+    assert pkg.variants['shared']['default'] is True
+
+    assert sorted(pkg.dependencies) == sorted(pkg_class.dependencies)
+    for name, conditions in pkg_class.dependencies.items():
+        assert sorted(pkg.dependencies[name]) == sorted(conditions)
+        for when, dep in conditions.items():
+            assert pkg.dependencies[name][when].spec == dep.spec
+            assert pkg.dependencies[name][when].type == dep.type
+
+    assert (pkg.possible_dependencies() ==
+            spack.repo.get('mpileaks').possible_dependencies())
+
+    mpich = spack.repo.path.get_pkg_descriptor('mpich')
+    assert mpich.provided == spack.repo.path.get_pkg_class('mpich').provided
+    assert mpich.tags == ['tag1', 'tag2']
+
+
+def test_repo_pkg_descriptor_does_not_load_packages(mock_packages):
+    # Make sure the index is up to date
+    spack.repo.path.get_pkg_descriptor('mpileaks')
+
+    repo = spack.repo.RepoPath(spack.paths.mock_packages_path)
+    pkg = repo.get_pkg_descriptor('extension1')
+    assert 'extendee' in pkg.extendees
+    assert not repo.repos[0]._modules
+
+
+def test_repo_unknown_pkg_descriptor(repo_for_test):
+    with pytest.raises(spack.repo.UnknownPackageError):
+        repo_for_test.get_pkg_descriptor('nonexistentpackage')
+
+
+repo_numbers = itertools.count()
+
+package_template = '''\
+from spack import *
+
+
+class {cls}(Package):
+    """{doc}"""
+    homepage = "http://www.example.com"
+    url      = "http://www.example.com/{name}-1.0.tar.gz"
+    tags = ['{tag}']
+
+    version('1.0', '0123456789abcdef0123456789abcdef')
+'''
+
+
+@pytest.fixture()
+def indexed_repo(tmpdir, monkeypatch):
+    """Repository of many packages, indexed in a temporary cache."""
+    # Modules of packages are loaded once, so each test uses a namespace
+    namespace = 'indexed_repo%d' % next(repo_numbers)
+    root = tmpdir.join('repo')
+    root.join('repo.yaml').write(
+        'repo:\n  namespace: %s\n' % namespace, ensure=True)
+    for i in range(40):
+        name = 'pkg%d' % i
+        root.join('packages', name, 'package.py').write(
+            package_template.format(
+                cls='Pkg%d' % i, name=name, doc='Package %d.' % i,
+                tag='odd' if i % 2 else 'even'), ensure=True)
+
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        FileCache(str(tmpdir.join('cache'))))
+    monkeypatch.setattr(spack.repo.FastPackageChecker, '_paths_cache', {})
+
+    def make_repo():
+        # Repositories remember the files and modules in them, so use new
+        # ones to see changes
+        spack.repo.FastPackageChecker._paths_cache.clear()
+        repo = spack.repo.Repo(str(root))
+        monkeypatch.setattr(spack.repo, 'path', spack.repo.RepoPath(repo))
+        return repo
+
+    return root, make_repo, namespace
+
+
+@pytest.fixture()
+def updated(monkeypatch):
+    """Names of the packages updated in the tag index of this process."""
+    names = []
+    update = spack.repo.TagIndexer.update
+
+    def record_update(self, pkg_fullname):
+        names.append(pkg_fullname)
+        update(self, pkg_fullname)
+
+    monkeypatch.setattr(spack.repo.TagIndexer, 'update', record_update)
+    return names
+
+
+@pytest.mark.parametrize('threshold', [1, 1000])
+def test_repo_index_build(indexed_repo, updated, monkeypatch, threshold):
+    monkeypatch.setattr(spack.repo, '_parallel_index_threshold', threshold)
+    monkeypatch.setattr(spack.repo, '_index_jobs', lambda: 2)
+    root, make_repo, _ = indexed_repo
+    repo = make_repo()
+
+    expected = sorted('pkg%d' % i for i in range(0, 40, 2))
+    assert repo.packages_with_tags('even') == expected
+    assert repo.provider_index.providers == {}
+    assert repo.get_pkg_descriptor('pkg7').description == 'Package 7.'
+
+    # Packages are indexed in worker processes if there are enough
+    assert len(updated) == (0 if threshold == 1 else 40)
+
+
+def test_repo_index_uses_content_hashes(indexed_repo, updated):
+    root, make_repo, namespace = indexed_repo
+    make_repo().tag_index
+    del updated[:]
+
+    # Files with new modification times but the same contents, as in a
+    # fresh clone, do not need indexing
+    for path in root.join('packages').visit('package.py'):
+        os.utime(str(path), (0, 0))
+    assert 'pkg1' in make_repo().tag_index['odd']
+    assert updated == []
+
+    # Modified and removed packages do
+    path = root.join('packages', 'pkg1', 'package.py')
+    path.write(path.read().replace("'odd'", "'even'"))
+    root.join('packages', 'pkg2').remove()
+
+    repo = make_repo()
+    assert 'pkg1' in repo.tag_index['even']
+    assert updated == [namespace + '.pkg1']
+    assert 'pkg1' not in repo.tag_index['odd']
+    assert 'pkg2' not in repo.tag_index['even']
+    assert 'pkg2' not in repo.index['metadata']
+
+
+def test_repo_index_reads_only_accessed_indexes(indexed_repo, monkeypatch):
+    root, make_repo, namespace = indexed_repo
+    make_repo().tag_index
+
+    read = []
+    for name, indexer_type in (('tags', spack.repo.TagIndexer),
+                               ('metadata', spack.repo.MetadataIndexer)):
+        def record_read(self, stream, name=name, read_index=indexer_type.read):
+            read.append(name)
+            read_index(self, stream)
+        monkeypatch.setattr(indexer_type, 'read', record_read)
+
+    # Up to date indexes are read when they are used
+    repo = make_repo()
+    assert 'pkg1' in repo.tag_index['odd']
+    assert read == ['tags']
+    assert repo.get_pkg_descriptor('pkg1').description == 'Package 1.'
+    assert read == ['tags', 'metadata']
@@ -89,3 +89,34 @@ def test_yaml_aliases():
 
     # ensure no YAML aliases appear in syaml dumps.
     assert '*id' not in string
+
+
+@pytest.mark.parametrize('data', [
+    {},
+    [],
+    {'a': 1, 'b': [], 'c': None, 'd': True, 'e': 1.5},
+    {'version': '2.3', 'date': '20130729', 'dotted': '0.8.13'},
+    ['yes', 'no', 'on', 'Off', 'null', 'NULL', '~', '', '=', '<<'],
+    ['-O3 -g', 'a,b', 'x: y', "it's", '"quoted"', '#hash', '@1.0',
+     '/path/to/file', '.inf', '0x10', '1e5', '2018-01-01', 'a b'],
+    {'bar': 'x', 'foo': 'y', 'baz': {'d': 1, 'c': 2}},
+    syaml.syaml_dict([('z', 1), ('a', syaml.syaml_list(['b', 'a']))]),
+    syaml.syaml_dict([
+        ('patch-several-dependencies', syaml.syaml_dict([
+            ('version', '2.0'),
+            ('parameters', syaml.syaml_dict([('cflags', [])])),
+            ('external', {'path': '/path/to/tool', 'module': None})]))]),
+    {syaml.syaml_str('key'): syaml.syaml_str('value'), '': 'empty'},
+    {u'unicode': u'caf\xe9', u'ascii': u'text'},
+    {'long-key-' * 20: 'long value ' * 20},
+    {'multi': 'line\nstring'},
+    {'a': 'abc\n', 'abc\n': 'a'},
+    ['abc\n', {'nested': ['abc\n']}],
+    {'tuple': ('a', 'b')},
+])
+def test_dump_flow(data):
+    expected = syaml.dump(data, default_flow_style=True, width=2 ** 31 - 1)
+    assert syaml.dump_flow(data) == expected
+
+    # Again, with the scalars already known
+    assert syaml.dump_flow(data) == expected
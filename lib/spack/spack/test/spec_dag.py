@@ -6,9 +6,14 @@
 """
 These tests check Spec DAG operations using dummy packages.
 """
+import base64
+import hashlib
+import sys
+
 import pytest
 import spack.architecture
 import spack.package
+import spack.util.spack_yaml as syaml
 
 from spack.spec import Spec
 from spack.dependency import all_deptypes, Dependency, canonical_deptype
@@ -917,3 +922,47 @@ class TestSpecDag(object):
         # Can't use more than one ':' separator
         with pytest.raises(KeyError):
             Spec.from_literal({'foo': {'bar:build:link': None}})
+
+
+def old_dag_hash(spec):
+    """The dag_hash() of a spec, computed with the YAML emitter."""
+    yaml_text = syaml.dump(
+        spec.to_node_dict(hash_function=old_dag_hash),
+        default_flow_style=True, width=2 ** 31 - 1)
+    sha = hashlib.sha1(yaml_text.encode('utf-8'))
+    b32_hash = base64.b32encode(sha.digest()).lower()
+    if sys.version_info[0] >= 3:
+        b32_hash = b32_hash.decode('utf-8')
+    return b32_hash
+
+
+@pytest.mark.parametrize('spec', [
+    'mpileaks', 'mpileaks ^zmpi', 'dttop', 'multivalue_variant',
+    'externaltool', 'patch-several-dependencies', 'conflict-parent',
+])
+def test_dag_hash_is_unchanged(config, mock_packages, spec):
+    spec = Spec(spec).concretized()
+    for node in spec.traverse():
+        assert node.dag_hash() == old_dag_hash(node)
+
+
+def test_copy_keeps_hashes_of_concrete_specs(
+        config, mock_packages, monkeypatch):
+    spec = Spec('dttop').concretized()
+    hashes = dict((s.name, (s.dag_hash(), s.full_hash()))
+                  for s in spec.traverse())
+
+    def fail(*args, **kwargs):
+        raise AssertionError('hash was computed again')
+    monkeypatch.setattr(syaml, 'dump_flow', fail)
+
+    for copy in (spec.copy(), spec.copy(deps=('link', 'run')),
+                 spec.copy(deps=('build', 'link', 'run'))):
+        for node in copy.traverse():
+            assert (node.dag_hash(), node.full_hash()) == hashes[node.name]
+
+    # Without all the dependencies in the hash, it has to be recomputed
+    monkeypatch.undo()
+    copy = spec.copy(deps=('build', 'link'))
+    assert copy._hash is None
+    assert copy.dag_hash() != spec.dag_hash()
@@ -74,6 +74,28 @@ def test_yaml_subdag(config, mock_packages):
         assert spec[dep].eq_dag(yaml_spec[dep])
 
 
+def test_yaml_specs_share_immutable_data(config, mock_packages):
+    yaml = Spec('mpileaks ^mpich').concretized().to_yaml()
+    first, second = Spec.from_yaml(yaml), Spec.from_yaml(yaml)
+
+    for a, b in zip(first.traverse(), second.traverse()):
+        assert a is not b
+        assert a.name is b.name
+        assert a.namespace is b.namespace
+        assert a.version is b.version
+        assert a.compiler.name is b.compiler.name
+        assert a.architecture.target is b.architecture.target
+        for name, variant in a.variants.items():
+            assert variant.name is b.variants[name].name
+            assert name is next(n for n in b.variants if n == name)
+
+    # The small objects of a node have no per-instance dictionary
+    dependency_spec = next(iter(first._dependencies.values()))
+    for obj in (first.architecture, first.compiler, first.versions,
+                first.version, dependency_spec):
+        assert not hasattr(obj, '__dict__')
+
+
 def test_using_ordered_dict(mock_packages):
     """ Checks that dicts are ordered
 
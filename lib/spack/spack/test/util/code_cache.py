@@ -0,0 +1,118 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Test the cache of compiled module code."""
+import os
+import sys
+
+import pytest
+
+import spack.util.imp.code_cache as code_cache
+from spack.util.imp import load_cached_source
+
+
+@pytest.fixture()
+def compiled(monkeypatch):
+    """Paths of the sources compiled by the code cache."""
+    paths = []
+
+    def record_compile(source, path, *args, **kwargs):
+        paths.append(path)
+        return compile(source, path, *args, **kwargs)
+
+    monkeypatch.setattr(code_cache, 'compile', record_compile, raising=False)
+    return paths
+
+
+@pytest.fixture()
+def source(tmpdir):
+    path = tmpdir.join('mod.py')
+    path.write('value = prepended * 2\n')
+    yield str(path)
+    sys.modules.pop('code_cache_test.mod', None)
+
+
+def load(source, cache_dir, prepend='prepended = 21'):
+    return load_cached_source(
+        'code_cache_test.mod', source, cache_dir, prepend=prepend)
+
+
+def test_code_is_compiled_once(tmpdir, source, compiled):
+    cache_dir = str(tmpdir.join('cache'))
+    module = load(source, cache_dir)
+    assert module.value == 42
+    assert module.__file__ == source
+    assert sys.modules['code_cache_test.mod'] is module
+
+    # Modules are reloaded in place, like with other loaders
+    module.value = 0
+    assert load(source, cache_dir) is module
+    assert module.value == 42
+    assert compiled == [source]
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_changes_are_compiled(tmpdir, source, compiled):
+    cache_dir = str(tmpdir.join('cache'))
+    load(source, cache_dir)
+
+    # Both the prepended code and the source are part of the key
+    assert load(source, cache_dir, prepend='prepended = 1').value == 2
+    with open(source, 'a') as f:
+        f.write('value += 1\n')
+    assert load(source, cache_dir).value == 43
+
+    assert compiled == [source] * 3
+    assert len(os.listdir(cache_dir)) == 3
+
+
+def test_moved_sources_are_compiled(tmpdir, source, compiled):
+    cache_dir = str(tmpdir.join('cache'))
+    load(source, cache_dir)
+
+    # The path is part of the key, since it is in the compiled code
+    moved = str(tmpdir.mkdir('moved').join('mod.py'))
+    os.rename(source, moved)
+    assert load(moved, cache_dir).value == 42
+    assert compiled == [source, moved]
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_least_recently_used_entries_are_pruned(
+        tmpdir, source, compiled, monkeypatch):
+    monkeypatch.setattr(code_cache, '_max_entries', 3)
+    monkeypatch.setattr(code_cache, '_pruned_entries', 2)
+    cache_dir = str(tmpdir.join('cache'))
+    for i in range(3):
+        load(source, cache_dir, prepend='prepended = %d' % i)
+    for i, name in enumerate(os.listdir(cache_dir)):
+        os.utime(os.path.join(cache_dir, name), (i, i))
+
+    # Using an entry makes it the most recently used one
+    load(source, cache_dir, prepend='prepended = 0')
+    load(source, cache_dir, prepend='prepended = 3')
+    assert len(os.listdir(cache_dir)) == 2
+    assert load(source, cache_dir, prepend='prepended = 0').value == 0
+    assert len(compiled) == 4
+
+
+def test_bad_cache_entries_are_replaced(tmpdir, source, compiled):
+    cache_dir = str(tmpdir.join('cache'))
+    load(source, cache_dir)
+    entry = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    with open(entry, 'wb') as f:
+        f.write(b'N')  # None
+
+    assert load(source, cache_dir).value == 42
+    assert load(source, cache_dir).value == 42
+    assert len(compiled) == 2
+
+
+def test_failed_imports_are_not_in_sys_modules(tmpdir, source):
+    with open(source, 'w') as f:
+        f.write('raise ValueError("bad module")\n')
+    with pytest.raises(ValueError):
+        load(source, str(tmpdir.join('cache')))
+    assert 'code_cache_test.mod' not in sys.modules
@@ -0,0 +1,51 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Test Spack's compression utilities."""
+import gzip
+import io
+import os
+import tarfile
+from contextlib import closing
+
+import pytest
+
+import spack.util.compression
+from spack.util.compression import ParallelGzipWriter
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+@pytest.mark.parametrize('size', [0, 1000, 10 * 1024])
+def test_parallel_gzip_writer(monkeypatch, jobs, size):
+    monkeypatch.setattr(spack.util.compression, 'gzip_block_size', 1024)
+    data = os.urandom(size // 2) + b'spack' * (size // 10)
+
+    compressed = io.BytesIO()
+    with ParallelGzipWriter(compressed, jobs=jobs) as writer:
+        # write in pieces that don't line up with the blocks
+        for start in range(0, len(data), 300):
+            writer.write(data[start:start + 300])
+
+    with gzip.GzipFile(fileobj=io.BytesIO(compressed.getvalue())) as f:
+        assert f.read() == data
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_parallel_gzip_writer_is_one_stream(monkeypatch, jobs):
+    monkeypatch.setattr(spack.util.compression, 'gzip_block_size', 1024)
+    data = os.urandom(5 * 1024) + b'spack' * 1024
+    info = tarfile.TarInfo('data')
+    info.size = len(data)
+
+    compressed = io.BytesIO()
+    with ParallelGzipWriter(compressed, jobs=jobs) as writer:
+        with closing(tarfile.open(fileobj=writer, mode='w|')) as tar:
+            tar.addfile(info, io.BytesIO(data))
+
+    # Streaming readers stop at the end of the first gzip member
+    compressed.seek(0)
+    with closing(tarfile.open(fileobj=compressed, mode='r|*')) as tar:
+        member = tar.next()
+        assert tar.extractfile(member).read() == data
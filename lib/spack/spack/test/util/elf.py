@@ -0,0 +1,179 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Test reading and rewriting ELF files with spack.util.elf."""
+import os
+import struct
+import sys
+
+import pytest
+
+import spack.util.elf as elf
+from spack.util.executable import Executable, which
+
+# Found before other tests put Spack's compiler wrappers in PATH
+cc = which('cc')
+readelf = which('readelf')
+
+
+def make_elf(path, rpath, tag=elf.DT_RPATH, elf_class=64, byte_order='<',
+             elf_type=elf.ET_DYN, extra=()):
+    """Write a minimal dynamic ELF object with the given rpath.
+
+    ``extra`` dynamic entries are added after the rpath entry.
+    """
+    formats = elf._formats[elf_class]
+    ehsize = 52 if elf_class == 32 else 64
+    phentsize = struct.calcsize(byte_order + formats['phdr'])
+    dynentsize = struct.calcsize(byte_order + formats['dyn'])
+    base = 0x400000
+
+    strtab = b'\0libfoo.so\0' + rpath + b'\0'
+    strtab_offset = ehsize + 2 * phentsize
+    dynamic_offset = strtab_offset + len(strtab)
+    dynamic = [(elf.DT_STRTAB, base + strtab_offset),
+               (elf.DT_STRSZ, len(strtab)),
+               (tag, len(b'\0libfoo.so\0'))]
+    dynamic.extend(extra)
+    dynamic.append((elf.DT_NULL, 0))
+    size = dynamic_offset + len(dynamic) * dynentsize
+
+    def phdr(p_type, offset, filesz):
+        if elf_class == 32:
+            fields = (p_type, offset, base + offset, base + offset,
+                      filesz, filesz, 4, 8)
+        else:
+            fields = (p_type, 4, offset, base + offset, base + offset,
+                      filesz, filesz, 8)
+        return struct.pack(byte_order + formats['phdr'], *fields)
+
+    ident = elf.ELF_MAGIC + struct.pack(
+        'BBB', 1 if elf_class == 32 else 2, 1 if byte_order == '<' else 2, 1)
+    header = ident.ljust(16, b'\0') + struct.pack(
+        byte_order + formats['header'], elf_type, 62, 1, 0, ehsize, 0, 0,
+        ehsize, phentsize, 2, 0, 0, 0)
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(phdr(elf.PT_LOAD, 0, size))
+        f.write(phdr(elf.PT_DYNAMIC, dynamic_offset, size - dynamic_offset))
+        f.write(strtab)
+        for entry in dynamic:
+            f.write(struct.pack(byte_order + formats['dyn'], *entry))
+
+
+@pytest.fixture(params=[(64, '<'), (64, '>'), (32, '<'), (32, '>')])
+def elf_format(request):
+    return dict(zip(('elf_class', 'byte_order'), request.param))
+
+
+@pytest.mark.parametrize('tag', [elf.DT_RPATH, elf.DT_RUNPATH])
+def test_get_rpaths(tmpdir, elf_format, tag):
+    path = str(tmpdir.join('libfoo.so'))
+    make_elf(path, b'/spack/opt/lib:$ORIGIN/../lib', tag=tag, **elf_format)
+
+    assert elf.get_rpaths(path) == ['/spack/opt/lib', '$ORIGIN/../lib']
+
+
+def test_get_empty_rpaths(tmpdir):
+    path = str(tmpdir.join('libfoo.so'))
+    make_elf(path, b'', tag=1)  # DT_NEEDED, no rpath
+    assert elf.get_rpaths(path) == []
+
+
+@pytest.mark.parametrize('tag', [elf.DT_RPATH, elf.DT_RUNPATH])
+def test_set_rpaths(tmpdir, elf_format, tag):
+    path = str(tmpdir.join('libfoo.so'))
+    make_elf(path, b'/spack/opt/lib:/usr/lib', tag=tag, **elf_format)
+
+    assert elf.set_rpaths(path, ['/new/lib'])
+    assert elf.get_rpaths(path) == ['/new/lib']
+
+    # The rest of the old rpath is cleared and RUNPATH becomes RPATH
+    with elf.mapped(path) as data:
+        assert data.find(b'/spack/opt') == -1
+        tags = [t for t, _, _ in elf.ElfFile(data).dynamic]
+        assert elf.DT_RPATH in tags and elf.DT_RUNPATH not in tags
+
+
+def test_set_rpaths_that_do_not_fit(tmpdir):
+    path = str(tmpdir.join('libfoo.so'))
+    make_elf(path, b'/short')
+    with open(path, 'rb') as f:
+        contents = f.read()
+
+    assert not elf.set_rpaths(path, ['/a/much/longer/path'])
+    with open(path, 'rb') as f:
+        assert f.read() == contents
+
+
+def test_set_rpaths_shared_with_another_entry(tmpdir):
+    # A DT_NEEDED entry for "lib" sharing the tail of the rpath string
+    rpath = b'/spack/opt/lib'
+    needed = len(b'\0libfoo.so\0') + rpath.index(b'lib')
+    path = str(tmpdir.join('libfoo.so'))
+    make_elf(path, rpath, extra=[(1, needed)])
+    with open(path, 'rb') as f:
+        contents = f.read()
+
+    assert not elf.set_rpaths(path, ['/new/lib'])
+    with open(path, 'rb') as f:
+        assert f.read() == contents
+
+
+@pytest.mark.parametrize('contents,description', [
+    (b'', 'empty'),
+    (b'#!/bin/bash\necho hello\n', 'ASCII text'),
+    (b'caf\xc3\xa9\n', 'text'),
+    (b'\x00\x01\x02binary', 'data'),
+    (b'\x7fELF\x02', 'data'),
+    (b'\xcf\xfa\xed\xfe\x07\x00\x00\x01', 'Mach-O 64-bit'),
+    (b'\xca\xfe\xba\xbe\x00\x00\x00\x02', 'Mach-O universal binary'),
+    (b'\xca\xfe\xba\xbe\x00\x00\x00\x34', 'data'),
+])
+def test_file_type(contents, description):
+    assert elf.file_type(contents) == description
+
+
+@pytest.mark.parametrize('elf_type,description', [
+    (elf.ET_DYN, 'ELF 64-bit LSB shared object'),
+    (elf.ET_EXEC, 'ELF 64-bit LSB executable'),
+    (elf.ET_REL, 'ELF 64-bit LSB relocatable'),
+])
+def test_file_type_of_elf_files(tmpdir, elf_type, description):
+    path = str(tmpdir.join('libfoo.so'))
+    make_elf(path, b'/usr/lib', elf_type=elf_type)
+    with elf.mapped(path) as data:
+        assert elf.file_type(data) == description
+
+
+def test_not_elf(tmpdir):
+    path = tmpdir.join('script.sh')
+    path.write('#!/bin/sh\n')
+    with pytest.raises(elf.ElfParsingError):
+        elf.get_rpaths(str(path))
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'),
+                    reason='requires a compiler that makes ELF objects')
+@pytest.mark.skipif(not cc or not readelf,
+                    reason='requires cc and readelf')
+@pytest.mark.parametrize('dtags', [
+    '--disable-new-dtags', '--enable-new-dtags'])
+def test_compiled_binary(tmpdir, dtags):
+    with tmpdir.as_cwd():
+        tmpdir.join('main.c').write('int main(void) { return 0; }\n')
+        # Other tests may leave LD_RUN_PATH and the like set
+        cc('main.c', '-o', 'main',
+           '-Wl,-rpath,/spack/opt/lib:/usr/lib', '-Wl,' + dtags,
+           env={'PATH': os.defpath})
+
+        assert elf.get_rpaths('main') == ['/spack/opt/lib', '/usr/lib']
+        assert elf.set_rpaths('main', ['/opt/lib'])
+
+        dynamic = readelf('-d', 'main', output=str)
+        assert 'RUNPATH' not in dynamic
+        assert 'Library rpath: [/opt/lib]' in dynamic
+        Executable('./main')()
@@ -3,7 +3,8 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
-from spack.util.string import plural
+import spack.util.spack_yaml as syaml
+from spack.util.string import intern, plural
 
 
 def test_plural():
@@ -12,3 +13,15 @@ def test_plural():
     assert plural(2, 'thing') == '2 things'
     assert plural(1, 'thing', 'wombats') == '1 thing'
     assert plural(2, 'thing', 'wombats') == '2 wombats'
+
+
+def test_intern():
+    name = ''.join(['lib', 'elf'])
+    assert intern(name) is intern('libelf')
+
+    # Strings read from YAML are interned as plain strings
+    yaml_name = syaml.syaml_str(name)
+    assert type(intern(yaml_name)) is str
+    assert intern(yaml_name) is intern('libelf')
+
+    assert intern(None) is None
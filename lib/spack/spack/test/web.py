@@ -4,9 +4,16 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 """Tests for web.py."""
+import hashlib
 import os
 
+import llnl.util.tty as tty
+
+import spack.caches
+import spack.config
 import spack.paths
+import spack.util.file_cache
+import spack.util.web
 from spack.util.web import spider, find_versions_of_archive
 from spack.version import ver
 
@@ -141,3 +148,57 @@ def test_find_exotic_versions_of_archive_3():
     assert ver('2.0.0b2') in versions
     assert ver('3.0a1') in versions
     assert ver('4.5-rc5') in versions
+
+
+def test_spider_pages_are_cached(tmpdir, monkeypatch, mutable_config):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    site = {
+        'http://example.com/': '<a href="a/">a</a><a href="b/">b</a>',
+        'http://example.com/a/': '<a href="foo-1.0.tar.gz">foo</a>',
+        'http://example.com/b/': '<a href="foo-2.0.tar.gz">foo</a>',
+    }
+    read = []
+
+    def read_from_url(url, accept_content_type=None):
+        read.append(url)
+        return url, site[url]
+
+    monkeypatch.setattr(spack.util.web, '_read_from_url', read_from_url)
+
+    spack.config.set('config:web_cache_ttl', 600)
+    for i in range(2):
+        pages, links = spider('http://example.com/', depth=1, cache=True)
+        assert sorted(pages) == sorted(site)
+        assert 'http://example.com/b/foo-2.0.tar.gz' in links
+    assert sorted(read) == sorted(site)
+
+    # Pages are only taken from the cache when asked for
+    spider('http://example.com/', depth=1)
+    assert len(read) == 2 * len(site)
+
+    # Without a time to live, pages are always read again
+    spack.config.set('config:web_cache_ttl', 0)
+    spider('http://example.com/', depth=1, cache=True)
+    assert len(read) == 3 * len(site)
+
+
+def test_get_checksums_for_versions(tmpdir, monkeypatch):
+    monkeypatch.setattr(tty, 'get_number', lambda *args, **kwargs: 3)
+    url_dict, expected = {}, {}
+    for version in ('1.0', '1.1', '1.2'):
+        archive = tmpdir.join('foo-{0}.tar.gz'.format(version))
+        archive.write('contents of ' + version)
+        url_dict[ver(version)] = 'file://' + str(archive)
+        expected[version] = hashlib.sha256(
+            archive.read_binary()).hexdigest()
+
+    # An archive that cannot be fetched is skipped
+    url_dict[ver('1.1')] += '.missing'
+    del expected['1.1']
+
+    lines = spack.util.web.get_checksums_for_versions(url_dict, 'foo')
+
+    assert lines.splitlines() == [
+        "    version('{0}', sha256='{1}')".format(v, expected[v])
+        for v in ('1.2', '1.0')]
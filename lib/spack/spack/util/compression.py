@@ -3,9 +3,14 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import collections
 import re
 import os
+import struct
+import zlib
 from itertools import product
+from multiprocessing.pool import ThreadPool
+
 from spack.util.executable import which
 
 # Supported archive extensions.
@@ -60,3 +65,103 @@ def extension(path):
         if re.search(suffix, path):
             return t
     return None
+
+
+#: Size of the blocks a ParallelGzipWriter compresses independently
+gzip_block_size = 1024 * 1024
+
+#: Header of a gzip stream without file name or modification time
+_gzip_header = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+def _deflate_block(data, level):
+    """Compress data into raw deflate blocks that end on a byte boundary.
+
+    None of the blocks is marked as the last one, so the output of
+    several calls can be concatenated into a single deflate stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _deflate_end():
+    """An empty deflate block marked as the last one of its stream."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.flush(zlib.Z_FINISH)
+
+
+class ParallelGzipWriter(object):
+    """Write-only file object that gzips its input with several threads.
+
+    The data is cut in blocks that are compressed independently, like
+    ``pigz`` does, and written one after the other in a single gzip
+    stream with one header and one trailer.  Any gzip reader, including
+    the streaming readers of ``tarfile``, can decompress it.  zlib
+    releases the GIL while it compresses, so the threads run in
+    parallel.
+
+    Args:
+        fileobj: file object the compressed stream is written to
+        jobs (int): number of blocks compressed at the same time
+        level (int): compression level, from 1 to 9
+    """
+
+    def __init__(self, fileobj, jobs=1, level=6):
+        self.fileobj = fileobj
+        self.jobs = jobs
+        self.level = level
+
+        self._buffer = []
+        self._buffered = 0
+        self._crc = 0
+        self._size = 0
+        self._pending = collections.deque()
+        self._pool = ThreadPool(jobs) if jobs > 1 else None
+        self.fileobj.write(_gzip_header)
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        if self._buffered >= gzip_block_size:
+            self._compress_buffer()
+
+    def _compress_buffer(self):
+        block = b''.join(self._buffer)
+        self._buffer, self._buffered = [], 0
+
+        if not self._pool:
+            self.fileobj.write(_deflate_block(block, self.level))
+            return
+
+        self._pending.append(
+            self._pool.apply_async(_deflate_block, (block, self.level)))
+        # Don't keep more blocks in memory than the threads can work on
+        while len(self._pending) > 2 * self.jobs:
+            self.fileobj.write(self._pending.popleft().get())
+
+    def close(self):
+        """Compress what is left, and end the stream."""
+        try:
+            if self._buffered:
+                self._compress_buffer()
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().get())
+            self.fileobj.write(_deflate_end())
+            self.fileobj.write(struct.pack(
+                '<II', self._crc & 0xffffffff, self._size & 0xffffffff))
+        finally:
+            if self._pool:
+                self._pool.terminate()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._pool:
+            self._pool.terminate()
+            self._pool = None
@@ -0,0 +1,338 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Read and rewrite ELF files without running external tools.
+
+Relocating a prefix means looking at every file in it. Running ``file``,
+``strings`` and ``patchelf`` on each of them costs a few processes per
+file, which adds up to minutes for large packages. The functions here
+look at the files through ``mmap`` instead: they tell binaries from text,
+search for strings, and read or rewrite the ``RPATH``/``RUNPATH`` of ELF
+objects in place.
+
+Rewriting only works when the new rpath fits in the space of the old one,
+which is always the case for the placeholders and relative paths Spack
+uses in build caches. Callers fall back to ``patchelf`` otherwise.
+"""
+import contextlib
+import mmap
+import struct
+
+import six
+
+import spack.error
+
+__all__ = [
+    'ElfFile',
+    'ElfParsingError',
+    'mapped',
+    'file_type',
+    'get_rpaths',
+    'set_rpaths',
+]
+
+#: First bytes of every ELF file
+ELF_MAGIC = b'\x7fELF'
+
+#: Mach-O magic numbers (thin 32 and 64 bit, both byte orders)
+MACHO_MAGIC = {
+    b'\xfe\xed\xfa\xce': 'Mach-O',
+    b'\xce\xfa\xed\xfe': 'Mach-O',
+    b'\xfe\xed\xfa\xcf': 'Mach-O 64-bit',
+    b'\xcf\xfa\xed\xfe': 'Mach-O 64-bit',
+}
+
+#: Magic number of Mach-O universal binaries (shared with Java classes)
+MACHO_FAT_MAGIC = b'\xca\xfe\xba\xbe'
+
+#: Number of leading bytes looked at to decide whether a file is text
+text_sample_size = 1024 * 1024
+
+#: Bytes that may appear in text files, as in the ``file`` command
+_text_chars = bytes(bytearray(
+    [7, 8, 9, 10, 12, 13, 27] + list(range(0x20, 0x7f)) +
+    list(range(0x80, 0x100))))
+
+# e_type values
+ET_REL, ET_EXEC, ET_DYN, ET_CORE = 1, 2, 3, 4
+
+_elf_types = {
+    ET_REL: 'relocatable',
+    ET_EXEC: 'executable',
+    ET_DYN: 'shared object',
+    ET_CORE: 'core file',
+}
+
+# p_type values
+PT_LOAD, PT_DYNAMIC = 1, 2
+
+# d_tag values
+DT_NULL, DT_STRTAB, DT_STRSZ, DT_RPATH, DT_RUNPATH = 0, 5, 10, 15, 29
+
+#: d_tag values whose d_val is an offset into the dynamic string table
+#: (DT_NEEDED, DT_SONAME, DT_RPATH, DT_RUNPATH, DT_CONFIG, DT_DEPAUDIT,
+#: DT_AUDIT, DT_AUXILIARY and DT_FILTER)
+_string_tags = frozenset([1, 14, DT_RPATH, DT_RUNPATH, 0x6ffffefa,
+                          0x6ffffefb, 0x6ffffefc, 0x7ffffffd, 0x7fffffff])
+
+#: struct formats of the parts of the file we read, by ELF class
+_formats = {
+    32: {
+        'header': 'HHIIIIIHHHHHH',
+        'phdr': 'IIIIIIII',
+        'dyn': 'iI',
+    },
+    64: {
+        'header': 'HHIQQQIHHHHHH',
+        'phdr': 'IIQQQQQQ',
+        'dyn': 'qQ',
+    },
+}
+
+
+class ElfParsingError(spack.error.SpackError):
+    """Raised when a file is not an ELF file Spack can understand."""
+
+
+@contextlib.contextmanager
+def mapped(path, write=False):
+    """Map the contents of a file in memory.
+
+    Empty files cannot be mapped, so they are given as empty bytes.
+
+    Args:
+        path (str): path of the file
+        write (bool): if True, changes to the map are written to the file
+    """
+    with open(path, 'r+b' if write else 'rb') as f:
+        f.seek(0, 2)
+        if not f.tell():
+            yield b''
+            return
+
+        access = mmap.ACCESS_WRITE if write else mmap.ACCESS_READ
+        data = mmap.mmap(f.fileno(), 0, access=access)
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+def file_type(data):
+    """Describe the contents of a file the way ``file -b`` would.
+
+    Only the parts of the description Spack looks at are produced: the
+    kind of ELF or Mach-O object, ``text`` or ``data``.
+
+    Args:
+        data: contents of the file, as bytes or an mmap
+    """
+    if not len(data):
+        return 'empty'
+
+    magic = data[:4]
+    if magic == ELF_MAGIC:
+        try:
+            return ElfFile(data).description
+        except ElfParsingError:
+            return 'data'
+
+    if magic in MACHO_MAGIC:
+        return MACHO_MAGIC[magic]
+
+    # Java class files share the magic number of universal binaries, but
+    # have a version number where the number of architectures would be
+    if magic == MACHO_FAT_MAGIC and len(data) >= 8:
+        nfat_arch, = struct.unpack('>I', data[4:8])
+        if 0 < nfat_arch < 20:
+            return 'Mach-O universal binary'
+
+    sample = data[:text_sample_size]
+    if sample.translate(None, _text_chars):
+        return 'data'
+    if max(bytearray(sample)) < 0x80:
+        return 'ASCII text'
+    return 'text'
+
+
+class ElfFile(object):
+    """The parts of an ELF file needed to read and change its rpath.
+
+    Args:
+        data: contents of the file, as bytes or an mmap
+
+    Raises:
+        ElfParsingError: if the file is not an ELF file or is malformed
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+        if len(data) < 16 or data[:4] != ELF_MAGIC:
+            raise ElfParsingError('not an ELF file')
+
+        ident = bytearray(data[4:6])
+        self.elf_class = {1: 32, 2: 64}.get(ident[0])
+        self.byte_order = {1: '<', 2: '>'}.get(ident[1])
+        if not self.elf_class or not self.byte_order:
+            raise ElfParsingError('unknown ELF class or data encoding')
+
+        formats = _formats[self.elf_class]
+        (self.type, _, _, _, phoff, _, _, _,
+         phentsize, phnum, _, _, _) = self._unpack(formats['header'], 16)
+
+        phdrs = [self._unpack(formats['phdr'], phoff + i * phentsize)
+                 for i in range(phnum)]
+        if self.elf_class == 32:
+            # p_flags comes last in 32-bit program headers
+            phdrs = [(p[0], p[6], p[1], p[2], p[3], p[4], p[5], p[7])
+                     for p in phdrs]
+
+        #: (p_vaddr, p_offset, p_filesz) of loaded segments
+        self._segments = [(p[3], p[2], p[5]) for p in phdrs if p[0] == PT_LOAD]
+
+        #: dynamic entries, as (d_tag, d_val, offset of entry in the file)
+        self.dynamic = []
+        for p in phdrs:
+            if p[0] == PT_DYNAMIC:
+                self.dynamic = self._read_dynamic(p[2], p[5])
+                break
+
+        tags = dict((tag, val) for tag, val, _ in self.dynamic)
+        self._strtab = None
+        if DT_STRTAB in tags:
+            self._strtab = (self._file_offset(tags[DT_STRTAB]),
+                            tags.get(DT_STRSZ, 0))
+
+    @property
+    def description(self):
+        return 'ELF %d-bit %s %s' % (
+            self.elf_class, 'LSB' if self.byte_order == '<' else 'MSB',
+            _elf_types.get(self.type, 'unknown type'))
+
+    def _unpack(self, fmt, offset):
+        fmt = self.byte_order + fmt
+        end = offset + struct.calcsize(fmt)
+        if offset < 0 or end > len(self.data):
+            raise ElfParsingError('truncated ELF file')
+        return struct.unpack(fmt, self.data[offset:end])
+
+    def _read_dynamic(self, offset, size):
+        fmt = _formats[self.elf_class]['dyn']
+        entsize = struct.calcsize(self.byte_order + fmt)
+        entries = []
+        for entry in range(offset, offset + size - entsize + 1, entsize):
+            tag, val = self._unpack(fmt, entry)
+            if tag == DT_NULL:
+                break
+            entries.append((tag, val, entry))
+        return entries
+
+    def _file_offset(self, address):
+        for vaddr, offset, filesz in self._segments:
+            if vaddr <= address < vaddr + filesz:
+                return address - vaddr + offset
+        raise ElfParsingError('address %#x is not in the file' % address)
+
+    def _string(self, index):
+        """Offset and length of a string in the dynamic string table."""
+        if self._strtab is None:
+            raise ElfParsingError('no dynamic string table')
+        start, size = self._strtab
+        offset = start + index
+        end = self.data.find(b'\0', offset, start + size)
+        if index >= size or end < 0:
+            raise ElfParsingError('string is outside the string table')
+        return offset, end - offset
+
+    def _rpath_entries(self):
+        return [(tag, val, entry) for tag, val, entry in self.dynamic
+                if tag in (DT_RPATH, DT_RUNPATH)]
+
+    @property
+    def rpath(self):
+        """The RUNPATH of the file if it has one, else its RPATH.
+
+        This is what ``patchelf --print-rpath`` shows. The rpath is a list
+        of directories, which is empty if the file has neither entry.
+        """
+        entries = dict((tag, val) for tag, val, _ in self._rpath_entries())
+        index = entries.get(DT_RUNPATH, entries.get(DT_RPATH))
+        if index is None:
+            return []
+
+        offset, length = self._string(index)
+        rpath = self.data[offset:offset + length]
+        if six.PY3:
+            try:
+                rpath = rpath.decode('utf-8')
+            except UnicodeDecodeError:
+                raise ElfParsingError('rpath is not valid UTF-8')
+        return rpath.split(':') if rpath else []
+
+    def set_rpath(self, rpaths):
+        """Overwrite the rpath in place, if there is room for it.
+
+        Like ``patchelf --force-rpath``, a RUNPATH entry is turned into an
+        RPATH. The space left after the new rpath is cleared, so the old
+        one cannot be found in the file anymore.
+
+        Linkers may share the tail of a string between entries, so the
+        rpath is left alone if another entry's string starts inside it.
+
+        Returns:
+            True if the file was changed, False if there is not enough
+            room for the new rpath, the file has no (or both) entries, or
+            part of the old rpath is also used by another entry.
+        """
+        entries = self._rpath_entries()
+        if len(entries) != 1:
+            return False
+        tag, index, entry = entries[0]
+
+        new_rpath = ':'.join(rpaths)
+        if not isinstance(new_rpath, bytes):
+            new_rpath = new_rpath.encode('utf-8')
+
+        offset, length = self._string(index)
+        if len(new_rpath) > length:
+            return False
+
+        start = self._strtab[0]
+        for other_tag, val, other_entry in self.dynamic:
+            if (other_tag in _string_tags and other_entry != entry and
+                    offset <= start + val < offset + length):
+                return False
+
+        self.data[offset:offset + length] = new_rpath.ljust(length, b'\0')
+        if tag == DT_RUNPATH:
+            fmt = self.byte_order + _formats[self.elf_class]['dyn']
+            self.data[entry:entry + struct.calcsize(fmt)] = struct.pack(
+                fmt, DT_RPATH, index)
+        return True
+
+
+def get_rpaths(path):
+    """Return the rpath of an ELF file as a list of directories.
+
+    Raises:
+        ElfParsingError: if the file is not an ELF file or is malformed
+    """
+    with mapped(path) as data:
+        return ElfFile(data).rpath
+
+
+def set_rpaths(path, rpaths):
+    """Replace the rpath of an ELF file in place.
+
+    Returns:
+        True if the file was changed, False if the new rpath cannot be
+        written in place and ``patchelf`` has to be used instead.
+
+    Raises:
+        ElfParsingError: if the file is not an ELF file or is malformed
+    """
+    with mapped(path, write=True) as data:
+        return ElfFile(data).set_rpath(rpaths)
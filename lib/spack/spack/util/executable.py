@@ -87,6 +87,8 @@ class Executable(object):
             input: Where to read stdin from
             output: Where to send stdout
             error: Where to send stderr
+            cwd (str): Directory to run the executable in, instead of the
+                current working directory
 
         Accepted values for input, output, and error:
 
@@ -124,6 +126,7 @@ class Executable(object):
         input  = kwargs.pop('input',  None)
         output = kwargs.pop('output', None)
         error  = kwargs.pop('error',  None)
+        cwd    = kwargs.pop('cwd',    None)
 
         if input is str:
             raise ValueError('Cannot use `str` as input stream.')
@@ -163,7 +166,8 @@ class Executable(object):
                 stdin=istream,
                 stderr=estream,
                 stdout=ostream,
-                env=env)
+                env=env,
+                cwd=cwd)
             out, err = proc.communicate()
 
             result = None
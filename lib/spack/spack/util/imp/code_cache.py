@@ -0,0 +1,138 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Imports that keep the compiled code of modules in a cache directory.
+
+Python caches the bytecode of modules next to their source, and checks it
+against the modification time of the source.  That does not work for
+modules with code prepended to them, and Spack repositories are not
+always writable, so package modules were compiled again by every Spack
+command that loaded them.
+
+Here compiled code is stored in a directory of our choosing, in files
+named after a hash of the code that was compiled, of its path and of the
+version of the interpreter, so entries never need to be invalidated.
+Entries that are used are touched, and the least recently used ones are
+removed when there are more than ``_max_entries``.  For Spack packages
+the directory is in the ``misc_cache``, which ``spack clean -m`` purges.
+"""
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from types import CodeType, ModuleType
+
+#: Number of entries a cache directory is pruned to when it grows past
+#: ``_max_entries``; the least recently used ones are removed
+_max_entries = 10000
+_pruned_entries = 7500
+
+
+def _code_path(cache_dir, path, source):
+    """Path of the compiled code of the source of a file in a cache
+    directory."""
+    sha = hashlib.sha1(sys.version.encode())
+    # the path is recorded in the code, e.g. for tracebacks
+    sha.update(path.encode('utf-8') + b'\0')
+    sha.update(source)
+    return os.path.join(cache_dir, sha.hexdigest())
+
+
+def _read_code(code_path):
+    """Read compiled code from a cache, or return None if it's not there."""
+    try:
+        with open(code_path, 'rb') as f:
+            code = marshal.load(f)
+        os.utime(code_path, None)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    return code if isinstance(code, CodeType) else None
+
+
+def _prune(cache_dir):
+    """Remove the least recently used entries of a cache if there are
+    more than ``_max_entries``."""
+    try:
+        names = [n for n in os.listdir(cache_dir) if not n.startswith('.')]
+    except OSError:
+        return
+    if len(names) <= _max_entries:
+        return
+
+    def mtime(name):
+        try:
+            return os.path.getmtime(os.path.join(cache_dir, name))
+        except OSError:
+            return 0
+
+    names.sort(key=mtime)
+    for name in names[:len(names) - _pruned_entries]:
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+
+
+def _write_code(code_path, code):
+    """Write compiled code to a cache, if possible.
+
+    Entries are written to a temporary file and renamed, so that other
+    processes never read an entry that is only partly written.
+    """
+    cache_dir = os.path.dirname(code_path)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(code, f)
+        os.rename(tmp, code_path)
+    except (IOError, OSError):
+        return
+    _prune(cache_dir)
+
+
+def load_cached_source(full_name, path, cache_dir, prepend=None):
+    """Import a Python module from source, using cached compiled code.
+
+    Load the source file and add it to ``sys.modules``.
+
+    Args:
+        full_name (str): full name of the module to be loaded
+        path (str): path to the file that should be loaded
+        cache_dir (str): directory where compiled code is cached
+        prepend (str, optional): some optional code to prepend to the
+            loaded module; e.g., can be used to inject import statements
+
+    Returns:
+        (ModuleType): the loaded module
+    """
+    with open(path, 'rb') as f:
+        source = f.read()
+    if prepend is not None:
+        source = prepend.encode() + b'\n' + source
+
+    code_path = _code_path(cache_dir, path, source)
+    code = _read_code(code_path)
+    if code is None:
+        code = compile(source, path, 'exec', dont_inherit=True)
+        _write_code(code_path, code)
+
+    # Like other loaders, reload modules that were already imported
+    module = sys.modules.get(full_name)
+    is_new = module is None
+    if is_new:
+        module = ModuleType(full_name)
+        sys.modules[full_name] = module
+    module.__file__ = path
+    module.__package__ = full_name.rpartition('.')[0]
+    try:
+        exec(code, module.__dict__)
+    except BaseException:
+        if is_new:
+            del sys.modules[full_name]
+        raise
+    return module
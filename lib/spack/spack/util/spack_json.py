@@ -26,6 +26,9 @@ def load(stream):
     else:
         load = json.load
 
+    # Strings only need converting from unicode in Python 2
+    if sys.version_info[0] >= 3:
+        return load(stream)
     return _strify(load(stream, object_hook=_strify), ignore_dicts=True)
 
 
@@ -12,6 +12,9 @@
   default unorderd dict.
 
 """
+import ctypes
+import re
+
 from ordereddict_backport import OrderedDict
 from six import string_types, StringIO
 
@@ -25,7 +28,7 @@ from llnl.util.tty.color import colorize, clen, cextra
 import spack.error
 
 # Only export load and dump
-__all__ = ['load', 'dump', 'SpackYAMLError']
+__all__ = ['load', 'dump', 'dump_flow', 'SpackYAMLError']
 
 # Make new classes so we can add custom attributes.
 # Also, use OrderedDict instead of just dict.
@@ -359,6 +362,114 @@ def dump_annotated(data, stream=None, *args, **kwargs):
         return getvalue()
 
 
+#: Lines written by dump_flow() are never wrapped.  The width is the max
+#: C int, to avoid passing too large a value to cyaml.
+_flow_width = 2 ** (ctypes.sizeof(ctypes.c_int) * 8 - 1) - 1
+
+#: Strings that YAML always writes as they are in flow style: they have no
+#: special characters, and don't read back as a boolean or null.  This is
+#: anchored with ``\Z``, as ``$`` also matches before a trailing newline.
+_plain_flow_scalar = re.compile(r'[a-z][a-z0-9_]*\Z')
+_not_plain_flow_scalars = set(
+    ['yes', 'no', 'true', 'false', 'on', 'off', 'null'])
+
+#: How other scalars are written, found by dumping them the first time
+_flow_scalars = {}
+_flow_keys = {}
+_flow_cache_size = 10000
+_flow_scalar_types = string_types + (int, float)
+
+
+class _NotFlowable(Exception):
+    """Raised by dump_flow() when it has to let the YAML emitter do it."""
+
+
+def dump_flow(data):
+    """Returns ``data`` as a single line of flow style YAML.
+
+    The text is the same as ``dump(data, default_flow_style=True)`` with
+    an unlimited width, but it is built directly instead of running the
+    YAML emitter on the whole document, which is much faster.  This is
+    what spec hashes are computed from.  Data that can't be written on a
+    single line, or that has types other than dictionaries, lists and
+    scalars, is handed to the emitter.
+    """
+    out = []
+    try:
+        _write_flow(data, out)
+    except _NotFlowable:
+        return dump(data, default_flow_style=True, width=_flow_width)
+    out.append('\n')
+    return ''.join(out)
+
+
+def _write_flow(data, out):
+    data_type = type(data)
+    if data_type is syaml_dict or data_type is dict:
+        items = list(data.items())
+        if data_type is dict:
+            # The dumper only keeps the order of syaml_dicts
+            items.sort()
+        out.append('{')
+        for i, (key, value) in enumerate(items):
+            if i:
+                out.append(', ')
+            out.append(_flow_key(key))
+            out.append(': ')
+            _write_flow(value, out)
+        out.append('}')
+
+    elif data_type is list or data_type is syaml_list:
+        out.append('[')
+        for i, value in enumerate(data):
+            if i:
+                out.append(', ')
+            _write_flow(value, out)
+        out.append(']')
+
+    else:
+        out.append(_flow_scalar(data))
+
+
+def _flow_scalar(value):
+    if (type(value) is str and _plain_flow_scalar.match(value) and
+            value not in _not_plain_flow_scalars):
+        return value
+    return _dumped_flow_scalar(
+        _flow_scalars, value, [value], '[', ']\n')
+
+
+def _flow_key(key):
+    if (type(key) is str and len(key) < 128 and
+            _plain_flow_scalar.match(key) and
+            key not in _not_plain_flow_scalars):
+        return key
+    return _dumped_flow_scalar(
+        _flow_keys, key, {key: None}, '{', ': null}\n')
+
+
+def _dumped_flow_scalar(cache, value, document, start, end):
+    """Dumps a document with the scalar alone, and returns the scalar's
+    part of the text."""
+    if not (value is None or isinstance(value, _flow_scalar_types)):
+        raise _NotFlowable()
+
+    key = (type(value), value)
+    text = cache.get(key)
+    if text is None:
+        text = dump(document, default_flow_style=True, width=_flow_width)
+        if not (text.startswith(start) and text.endswith(end)):
+            raise _NotFlowable()
+        text = text[len(start):-len(end)]
+        if '\n' in text or text.startswith('?'):
+            raise _NotFlowable()
+
+        if len(cache) >= _flow_cache_size:
+            cache.clear()
+        cache[key] = text
+    return text
+
+
 class SpackYAMLError(spack.error.SpackError):
     """Raised when there are issues with YAML parsing."""
     def __init__(self, msg, yaml_error):
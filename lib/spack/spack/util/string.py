@@ -3,6 +3,8 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import six
+
 
 def comma_list(sequence, article=''):
     if type(sequence) != list:
@@ -55,3 +57,17 @@ def plural(n, singular, plural=None, show_n=True):
         return "%s%s" % (number, plural)
     else:
         return "%s%ss" % (number, singular)
+
+
+def intern(string):
+    """Returns the interned copy of ``string``.
+
+    Equal strings that are interned are the same object, so the many
+    copies of a package name, compiler or target read from spec files
+    don't each take their own memory. Subclasses of ``str``, like the
+    strings read from YAML, are interned as plain strings. Anything that
+    is not a ``str`` is returned unchanged.
+    """
+    if isinstance(string, str):
+        return six.moves.intern(str(string))
+    return string
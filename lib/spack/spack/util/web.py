@@ -7,15 +7,17 @@ from __future__ import print_function
 
 import re
 import os
+import socket
 import ssl
 import sys
+import time
 import traceback
 import hashlib
+from multiprocessing.pool import ThreadPool
 
 from six.moves.urllib.request import urlopen, Request
-from six.moves.urllib.error import URLError
+from six.moves.urllib.error import URLError, HTTPError
 from six.moves.urllib.parse import urljoin
-import multiprocessing.pool
 
 try:
     # Python 2 had these in the HTMLParser package.
@@ -30,18 +32,30 @@ except ImportError:
 
 import llnl.util.tty as tty
 
+import spack.caches
 import spack.config
 import spack.cmd
 import spack.url
 import spack.stage
 import spack.error
+import spack.fetch_strategy
 import spack.util.crypto
+import spack.util.spack_json as sjson
 from spack.util.compression import ALLOWED_ARCHIVE_TYPES
 
 
 # Timeout in seconds for web requests
 _timeout = 10
 
+#: Maximum number of pages the spider reads at the same time
+_spider_jobs = 16
+
+#: Maximum number of archives downloaded at the same time to checksum them
+_checksum_jobs = 4
+
+#: Size of the blocks in which archives are read to checksum them
+_chunk_size = 1024 * 1024
+
 
 class LinkParser(HTMLParser):
     """This parser just takes an HTML page and strips out the hrefs on the
@@ -58,35 +72,8 @@ class LinkParser(HTMLParser):
                     self.links.append(val)
 
 
-class NonDaemonProcess(multiprocessing.Process):
-    """Process tha allows sub-processes, so pools can have sub-pools."""
-    @property
-    def daemon(self):
-        return False
-
-    @daemon.setter
-    def daemon(self, value):
-        pass
-
-
-if sys.version_info[0] < 3:
-    class NonDaemonPool(multiprocessing.pool.Pool):
-        """Pool that uses non-daemon processes"""
-        Process = NonDaemonProcess
-else:
-
-    class NonDaemonContext(type(multiprocessing.get_context())):
-        Process = NonDaemonProcess
-
-    class NonDaemonPool(multiprocessing.pool.Pool):
-        """Pool that uses non-daemon processes"""
-
-        def __init__(self, *args, **kwargs):
-            kwargs['context'] = NonDaemonContext()
-            super(NonDaemonPool, self).__init__(*args, **kwargs)
-
-
-def _read_from_url(url, accept_content_type=None):
+def _ssl_context():
+    """SSL context to open URLs with, following config:verify_ssl."""
     context = None
     verify_ssl = spack.config.get('config:verify_ssl')
     pyver = sys.version_info
@@ -101,30 +88,32 @@ def _read_from_url(url, accept_content_type=None):
         context = ssl.create_default_context()
     else:
         context = ssl._create_unverified_context()
+    return context
 
+
+def _read_from_url(url, accept_content_type=None):
+    context = _ssl_context()
     req = Request(url)
+    response = _urlopen(req, timeout=_timeout, context=context)
 
     if accept_content_type:
-        # Make a HEAD request first to check the content type.  This lets
-        # us ignore tarballs and gigantic files.
-        # It would be nice to do this with the HTTP Accept header to avoid
-        # one round-trip.  However, most servers seem to ignore the header
-        # if you ask for a tarball with Accept: text/html.
-        req.get_method = lambda: "HEAD"
-        resp = _urlopen(req, timeout=_timeout, context=context)
-
-        if "Content-type" not in resp.headers:
+        # Check the content type before reading the body.  This lets us
+        # ignore tarballs and gigantic files without an extra HEAD request.
+        # It would be nice to do this with the HTTP Accept header instead.
+        # However, most servers seem to ignore the header if you ask for a
+        # tarball with Accept: text/html.
+        content_type = response.headers.get("Content-type")
+        if not content_type:
             tty.debug("ignoring page " + url)
+            response.close()
             return None, None
 
-        if not resp.headers["Content-type"].startswith(accept_content_type):
+        if not content_type.startswith(accept_content_type):
             tty.debug("ignoring page " + url + " with content type " +
-                      resp.headers["Content-type"])
+                      content_type)
+            response.close()
             return None, None
 
-    # Do the real GET request when we know it's just HTML.
-    req.get_method = lambda: "GET"
-    response = _urlopen(req, timeout=_timeout, context=context)
     response_url = response.geturl()
 
     # Read the page and and stick it in the map we'll return
@@ -138,89 +127,138 @@ def read_from_url(url, accept_content_type=None):
     return contents
 
 
-def _spider(url, visited, root, depth, max_depth, raise_on_error):
-    """Fetches URL and any pages it links to up to max_depth.
+def read_from_url_if_modified(url, etag=None, last_modified=None):
+    """Read a URL unless it is the same as a copy we already have.
 
-       depth should initially be zero, and max_depth is the max depth of
-       links to follow from the root.
+    The ``ETag`` and ``Last-Modified`` headers of the response that gave
+    that copy are sent back to the server, which answers "not modified"
+    if the resource did not change.
 
-       Prints out a warning only if the root can't be fetched; it ignores
-       errors with pages that the root links to.
+    Args:
+        url (str): URL to read
+        etag (str): ``ETag`` of our copy, if any
+        last_modified (str): ``Last-Modified`` date of our copy, if any
 
-       Returns a tuple of:
-       - pages: dict of pages visited (URL) mapped to their full text.
-       - links: set of links encountered while visiting the pages.
-    """
-    pages = {}     # dict from page URL -> text content.
-    links = set()  # set of all links seen on visited pages.
+    Returns:
+        None if the resource was not modified, else a tuple of its
+        contents as bytes and a dict with the ``etag`` and
+        ``last_modified`` to send next time.
 
-    # root may end with index.html -- chop that off.
-    if root.endswith('/index.html'):
-        root = re.sub('/index.html$', '', root)
+    Raises:
+        URLError: if the URL cannot be read
+    """
+    req = Request(url)
+    if etag:
+        req.add_header('If-None-Match', etag)
+    if last_modified:
+        req.add_header('If-Modified-Since', last_modified)
 
     try:
-        response_url, page = _read_from_url(url, 'text/html')
+        response = _urlopen(req, timeout=_timeout, context=_ssl_context())
+    except HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
 
-        if not response_url or not page:
-            return pages, links
+    headers = response.info()
+    return response.read(), {
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+    }
 
-        pages[response_url] = page
 
-        # Parse out the links in the page
-        link_parser = LinkParser()
-        subcalls = []
-        link_parser.feed(page)
+def _page_cache_key(url):
+    return os.path.join(
+        'web', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
 
-        while link_parser.links:
-            raw_link = link_parser.links.pop()
-            abs_link = urljoin(response_url, raw_link.strip())
 
-            links.add(abs_link)
+def _cached_page(url):
+    """The response URL and text of a page read less than
+    ``config:web_cache_ttl`` seconds ago, or None.
 
-            # Skip stuff that looks like an archive
-            if any(raw_link.endswith(suf) for suf in ALLOWED_ARCHIVE_TYPES):
-                continue
+    Pages that were ignored because of their content type are cached
+    as ``(None, None)``.  Local files are never cached.
+    """
+    ttl = spack.config.get('config:web_cache_ttl', 0)
+    if not ttl or url.startswith('file://'):
+        return None
 
-            # Skip things outside the root directory
-            if not abs_link.startswith(root):
-                continue
+    cache = spack.caches.misc_cache
+    key = _page_cache_key(url)
+    if not cache.init_entry(key) or time.time() - cache.mtime(key) > ttl:
+        return None
 
-            # Skip already-visited links
-            if abs_link in visited:
-                continue
+    with cache.read_transaction(key) as f:
+        try:
+            data = sjson.load(f)
+            return data['url'], data['page']
+        except (ValueError, KeyError, TypeError):
+            return None
 
-            # If we're not at max depth, follow links.
-            if depth < max_depth:
-                subcalls.append((abs_link, visited, root,
-                                 depth + 1, max_depth, raise_on_error))
-                visited.add(abs_link)
 
-        if subcalls:
-            pool = NonDaemonPool(processes=len(subcalls))
-            try:
-                results = pool.map(_spider_wrapper, subcalls)
+def _cache_page(url, response_url, page):
+    if not spack.config.get('config:web_cache_ttl', 0):
+        return
+    if url.startswith('file://'):
+        return
+
+    cache = spack.caches.misc_cache
+    key = _page_cache_key(url)
+    cache.init_entry(key)
+    with cache.write_transaction(key) as (old, new):
+        sjson.dump({'url': response_url, 'page': page}, new)
+
+
+def _read_page(url):
+    """Read an HTML page, and return it with the error that occurred."""
+    try:
+        return _read_from_url(url, 'text/html'), None
+    except Exception as e:
+        return (None, None), e
 
-                for sub_pages, sub_links in results:
-                    pages.update(sub_pages)
-                    links.update(sub_links)
 
-            finally:
-                pool.terminate()
-                pool.join()
+def _read_pages(urls, pool, cache):
+    """Read HTML pages concurrently from the web, or from the cache if
+    cache is true.
 
-    except URLError as e:
-        tty.debug(e)
+    Returns:
+        (list): a tuple ``((response_url, page), error)`` for each URL
+    """
+    if cache:
+        results = [(_cached_page(url), None) for url in urls]
+    else:
+        results = [(None, None)] * len(urls)
+    missing = [i for i, (page, _) in enumerate(results) if page is None]
+
+    if len(missing) > 1:
+        read = pool.map(_read_page, [urls[i] for i in missing])
+    else:
+        read = [_read_page(urls[i]) for i in missing]
 
-        if hasattr(e, 'reason') and isinstance(e.reason, ssl.SSLError):
+    for i, result in zip(missing, read):
+        results[i] = result
+        page, error = result
+        if cache and error is None:
+            _cache_page(urls[i], *page)
+    return results
+
+
+def _report_error(url, error, raise_on_error):
+    """Report an error that occurred while reading a page."""
+    if isinstance(error, URLError):
+        tty.debug(error)
+
+        if (hasattr(error, 'reason') and
+                isinstance(error.reason, ssl.SSLError)):
             tty.warn("Spack was unable to fetch url list due to a certificate "
                      "verification problem. You can try running spack -k, "
                      "which will not check SSL certificates. Use this at your "
                      "own risk.")
 
         if raise_on_error:
-            raise NoNetworkConnectionError(str(e), url)
+            raise NoNetworkConnectionError(str(error), url)
 
-    except HTMLParseError as e:
+    elif isinstance(error, HTMLParseError):
         # This error indicates that Python's HTML parser sucks.
         msg = "Got an error parsing HTML."
 
@@ -228,19 +266,102 @@ def _spider(url, visited, root, depth, max_depth, raise_on_error):
         if sys.version_info[:3] < (2, 7, 3):
             msg += " Use Python 2.7.3 or newer for better HTML parsing."
 
-        tty.warn(msg, url, "HTMLParseError: " + str(e))
+        tty.warn(msg, url, "HTMLParseError: " + str(error))
 
-    except Exception as e:
+    else:
         # Other types of errors are completely ignored, except in debug mode.
-        tty.debug("Error in _spider: %s:%s" % (type(e), e),
-                  traceback.format_exc())
+        tty.debug("Error in _spider: %s:%s" % (type(error), error),
+                  "".join(traceback.format_exception_only(
+                      type(error), error)))
 
-    return pages, links
 
+def _spider(root_urls, max_depth, raise_on_error, cache=False):
+    """Fetches root URLs and any pages they link to up to max_depth.
+
+       max_depth is the max depth of links to follow from the roots.
+       The pages of each depth are read concurrently by a pool of
+       threads.  If cache is true, recently read pages come from the
+       ``misc_cache``.
+
+       Errors are reported for each page; they are only raised if
+       raise_on_error is true and a page cannot be read.
+
+       Returns a tuple of:
+       - pages: dict of pages visited (URL) mapped to their full text.
+       - links: set of links encountered while visiting the pages.
+    """
+    pages = {}     # dict from page URL -> text content.
+    links = set()  # set of all links seen on visited pages.
+
+    # Pages to read at the current depth, with the root they come from
+    frontier = []
+    visited = set()
+    for root in root_urls:
+        if root not in visited:
+            visited.add(root)
+            # root may end with index.html -- chop that off.
+            frontier.append((root, re.sub('/index.html$', '', root)))
 
-def _spider_wrapper(args):
-    """Wrapper for using spider with multiprocessing."""
-    return _spider(*args)
+    pool = None
+    try:
+        depth = 0
+        while frontier:
+            if pool is None and len(frontier) > 1:
+                pool = ThreadPool(_spider_jobs)
+
+            results = _read_pages(
+                [url for url, _ in frontier], pool, cache)
+            next_frontier = []
+            for (url, root), ((response_url, page), error) in zip(
+                    frontier, results):
+                if error is not None:
+                    _report_error(url, error, raise_on_error)
+                    continue
+
+                if not response_url or not page:
+                    continue
+
+                pages[response_url] = page
+
+                # Parse out the links in the page
+                link_parser = LinkParser()
+                try:
+                    link_parser.feed(page)
+                except HTMLParseError as e:
+                    _report_error(url, e, raise_on_error)
+
+                for raw_link in link_parser.links:
+                    abs_link = urljoin(response_url, raw_link.strip())
+
+                    links.add(abs_link)
+
+                    # Skip stuff that looks like an archive
+                    if any(raw_link.endswith(suf)
+                           for suf in ALLOWED_ARCHIVE_TYPES):
+                        continue
+
+                    # Skip things outside the root directory
+                    if not abs_link.startswith(root):
+                        continue
+
+                    # Skip already-visited links
+                    if abs_link in visited:
+                        continue
+
+                    # If we're not at max depth, follow links.
+                    if depth < max_depth:
+                        next_frontier.append((abs_link, root))
+                        visited.add(abs_link)
+
+            frontier = next_frontier
+            depth += 1
+
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return pages, links
 
 
 def _urlopen(*args, **kwargs):
@@ -252,17 +373,23 @@ def _urlopen(*args, **kwargs):
     return urlopen(*args, **kwargs)
 
 
-def spider(root_url, depth=0):
-    """Gets web pages from a root URL.
+def spider(root_urls, depth=0, cache=False):
+    """Gets web pages from a root URL, or from a list of them.
 
        If depth is specified (e.g., depth=2), then this will also follow
-       up to <depth> levels of links from the root.
+       up to <depth> levels of links from the roots.
 
-       This will spawn processes to fetch the children, for much improved
+       The pages are read by a pool of threads, for much improved
        performance over a sequential fetch.
 
+       If cache is true, pages read less than ``config:web_cache_ttl``
+       seconds ago are taken from the ``misc_cache`` instead.  Only use
+       it for pages that may be a little out of date.
+
     """
-    pages, links = _spider(root_url, set(), root_url, 0, depth, False)
+    if not isinstance(root_urls, (list, tuple, set)):
+        root_urls = [root_urls]
+    pages, links = _spider(sorted(root_urls), depth, False, cache)
     return pages, links
 
 
@@ -304,12 +431,7 @@ def find_versions_of_archive(archive_urls, list_url=None, list_depth=0):
     list_urls.update(additional_list_urls)
 
     # Grab some web pages to scrape.
-    pages = {}
-    links = set()
-    for lurl in list_urls:
-        pg, lnk = spider(lurl, depth=list_depth)
-        pages.update(pg)
-        links.update(lnk)
+    pages, links = spider(list_urls, depth=list_depth, cache=True)
 
     # Scrape them for archive URLs
     regexes = []
@@ -400,27 +522,39 @@ def get_checksums_for_versions(
     urls = [url_dict[v] for v in versions]
 
     tty.msg("Downloading...")
-    version_hashes = []
-    i = 0
-    for url, version in zip(urls, versions):
+    hashes = [None] * len(urls)
+    remaining = list(range(len(urls)))
+
+    # The first archive that can be fetched is staged and given to
+    # first_stage_function.  Unless the stages are kept, the others are
+    # checksummed while they are downloaded, without writing them to disk.
+    while first_stage_function and remaining:
+        i = remaining.pop(0)
+        hashes[i] = _checksum_archive(
+            urls[i], keep_stage, first_stage_function)
+        if hashes[i]:
+            break
+
+    if len(remaining) > 1:
+        # Progress bars of concurrent downloads would overwrite each other
+        show_progress = spack.fetch_strategy.show_progress
+        spack.fetch_strategy.show_progress = False
+        pool = ThreadPool(min(_checksum_jobs, len(remaining)))
         try:
-            with spack.stage.Stage(url, keep=keep_stage) as stage:
-                # Fetch the archive
-                stage.fetch()
-                if i == 0 and first_stage_function:
-                    # Only run first_stage_function the first time,
-                    # no need to run it every time
-                    first_stage_function(stage, url)
-
-                # Checksum the archive and add it to the list
-                version_hashes.append((version, spack.util.crypto.checksum(
-                    hashlib.sha256, stage.archive_file)))
-                i += 1
-        except spack.stage.FailedDownloadError:
-            tty.msg("Failed to fetch {0}".format(url))
-        except Exception as e:
-            tty.msg("Something failed on {0}, skipping.".format(url),
-                    "  ({0})".format(e))
+            results = pool.map(
+                lambda i: _checksum_archive(urls[i], keep_stage),
+                remaining)
+        finally:
+            pool.terminate()
+            pool.join()
+            spack.fetch_strategy.show_progress = show_progress
+    else:
+        results = [_checksum_archive(urls[i], keep_stage) for i in remaining]
+
+    for i, result in zip(remaining, results):
+        hashes[i] = result
+
+    version_hashes = [(v, h) for v, h in zip(versions, hashes) if h]
 
     if not version_hashes:
         tty.die("Could not fetch any versions for {0}".format(name))
@@ -441,6 +575,43 @@ def get_checksums_for_versions(
     return version_lines
 
 
+def _checksum_url(url):
+    """sha256 of the file at a URL, computed while it is downloaded."""
+    hasher = hashlib.sha256()
+    response = _urlopen(Request(url), timeout=_timeout, context=_ssl_context())
+    try:
+        for chunk in iter(lambda: response.read(_chunk_size), b''):
+            hasher.update(chunk)
+    finally:
+        response.close()
+    return hasher.hexdigest()
+
+
+def _checksum_archive(url, keep_stage=False, first_stage_function=None):
+    """sha256 of the archive at a URL, or None if it cannot be fetched.
+
+    The archive is only staged if it is kept or given to
+    first_stage_function.
+    """
+    try:
+        if not (keep_stage or first_stage_function):
+            return _checksum_url(url)
+
+        with spack.stage.Stage(url, keep=keep_stage) as stage:
+            # Fetch the archive
+            stage.fetch()
+            if first_stage_function:
+                first_stage_function(stage, url)
+
+            return spack.util.crypto.checksum(
+                hashlib.sha256, stage.archive_file)
+    except (spack.stage.FailedDownloadError, URLError, socket.error):
+        tty.msg("Failed to fetch {0}".format(url))
+    except Exception as e:
+        tty.msg("Something failed on {0}, skipping.".format(url),
+                "  ({0})".format(e))
+
+
 class SpackWebError(spack.error.SpackError):
     """Superclass for Spack web spidering errors."""
 
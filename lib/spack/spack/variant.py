@@ -18,6 +18,7 @@ import llnl.util.lang as lang
 
 import spack.directives
 import spack.error as error
+from spack.util.string import intern
 
 try:
     from collections.abc import Sequence
@@ -223,10 +224,11 @@ class AbstractVariant(object):
     @staticmethod
     def from_node_dict(name, value):
         """Reconstruct a variant from a node dict."""
+        name = intern(name)
         if isinstance(value, list):
             # read multi-value variants in and be faithful to the YAML
             mvar = MultiValuedVariant(name, ())
-            mvar._value = tuple(value)
+            mvar._value = tuple(intern(v) for v in value)
             mvar._original_value = mvar._value
             return mvar
 
@@ -385,7 +387,7 @@ class SingleValuedVariant(MultiValuedVariant):
         # Then check if there's only a single value
         if len(self._value) != 1:
             raise MultipleValuesInExclusiveVariantError(self, None)
-        self._value = str(self._value[0])
+        self._value = intern(str(self._value[0]))
 
     def __str__(self):
         return '{0}={1}'.format(self.name, self.value)
@@ -38,6 +38,10 @@ __all__ = ['Version', 'VersionRange', 'VersionList', 'ver']
 # Valid version characters
 VALID_VERSION = r'[A-Za-z0-9_.-]'
 
+#: Versions are immutable, so all the specs with the same version string
+#: share one Version object, parsed only once.
+_versions = {}
+
 
 def int_if_int(string):
     """Convert a string to int if possible.  Otherwise, return a string."""
@@ -92,6 +96,8 @@ def coerced(method):
 class Version(object):
     """Class to represent versions"""
 
+    __slots__ = ('string', 'version', 'separators')
+
     def __init__(self, string):
         string = str(string)
 
@@ -404,6 +410,8 @@ class Version(object):
 
 class VersionRange(object):
 
+    __slots__ = ('start', 'end')
+
     def __init__(self, start, end):
         if isinstance(start, string_types):
             start = Version(start)
@@ -607,6 +615,8 @@ class VersionRange(object):
 class VersionList(object):
     """Sorted, non-redundant list of Versions and VersionRanges."""
 
+    __slots__ = ('versions',)
+
     def __init__(self, vlist=None):
         self.versions = []
         if vlist is not None:
@@ -842,7 +852,10 @@ def _string_to_version(string):
         return VersionRange(start, end)
 
     else:
-        return Version(string)
+        version = _versions.get(string)
+        if version is None:
+            version = _versions[string] = Version(string)
+        return version
 
 
 def ver(obj):
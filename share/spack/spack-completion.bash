@@ -174,7 +174,7 @@ function _spack_buildcache_create {
     if $list_options
     then
         compgen -W "-h --help -r --rel -f --force -u --unsigned -a --allow-root
-                    -k --key -d --directory" -- "$cur"
+                    -k --key -d --directory -j --jobs" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -227,7 +227,8 @@ function _spack_clean {
     if $list_options
     then
         compgen -W "-h --help -s --stage -d --downloads
-                    -m --misc-cache -p --python-cache -a --all" -- "$cur"
+                    -m --misc-cache -p --python-cache -a --all
+                    --cache-stats" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -300,7 +301,7 @@ function _spack_compilers {
 }
 
 function _spack_concretize {
-    compgen -W "-h --help -f --force" -- "$cur"
+    compgen -W "-h --help -f --force --no-cache -j --jobs" -- "$cur"
 }
 
 function _spack_config {
@@ -511,7 +512,7 @@ function _spack_fetch {
     if $list_options
     then
         compgen -W "-h --help -n --no-checksum -m --missing
-                    -D --dependencies" -- "$cur"
+                    -D --dependencies -j --jobs" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -634,6 +635,7 @@ function _spack_install {
     if $list_options
     then
         compgen -W "-h --help --only -j --jobs -I --install-status
+                    --jobs-per-build --concurrent-builds --cooperative
                     --overwrite --keep-prefix --keep-stage --dont-restage
                     --use-cache --no-cache --show-log-on-error --source
                     -n --no-checksum -v --verbose --fake --only-concrete
@@ -719,7 +721,8 @@ function _spack_mirror_create {
     if $list_options
     then
         compgen -W "-h --help -d --directory -f --file
-                    -D --dependencies -n --versions-per-spec" -- "$cur"
+                    -D --dependencies -n --versions-per-spec
+                    -j --jobs" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -988,7 +991,7 @@ function _spack_python {
 }
 
 function _spack_reindex {
-    compgen -W "-h --help" -- "$cur"
+    compgen -W "-h --help -j --jobs" -- "$cur"
 }
 
 function _spack_remove {